@@ -0,0 +1,547 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Headless benchmarks of PyRysunek.
+#
+# OpenGL, GLU and GLUT are replaced by a recording backend before any other
+# module of PyRysunek is imported, so no display is needed. The backend
+# does nothing but count the calls made to it and the vertices submitted,
+# which are reported along with the timings.
+#
+# Usage:
+#   python benchmark.py [--sizes 100,1000,10000,100000]
+#                       [--output benchmark.json] [--baseline FILE]
+#                       [--tolerance 0.25] [--save-baseline]
+#
+# Scenes of up to a million objects can be generated, but drawing them all
+# in immediate mode takes minutes, so the largest size has to be asked for
+# with --sizes.
+#
+# Results are written as JSON: a "results" object maps the name of every
+# measurement, such as "select/10000", to an object with its "seconds" and
+# any counts. With --baseline, the results are compared with those of an
+# earlier run, and measurements which got slower by more than `tolerance`
+# (or which make a different number of GL calls) are reported as
+# regressions, making the exit status 1. With --save-baseline, the results
+# are also written to the baseline file.
+
+import ctypes
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import types
+from timeit import default_timer
+
+# Modules whose use of OpenGL has to be covered by the recording backend.
+GL_USERS = ("buttons.py", "drawables.py", "overlay.py", "renderer.py", "rysunek.py",
+            "tessellation.py", "toolbar.py", "tools.py")
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+SELECT_QUERIES = 200
+HIT_TEST_QUERIES = 200
+STROKE_LENGTHS = (100, 10000, 100000)
+# Size of the window used for culling benchmarks.
+WINDOW = (800, 500)
+
+_gl_name = re.compile(r"\b(?:gl|glu|glut)[A-Z]\w*|\b(?:GL|GLU|GLUT)_[A-Z0-9_]+")
+
+
+class RecordingGL(object):
+
+    """Stand-in for OpenGL, GLU and GLUT which records what it is asked to do.
+
+    `calls` maps function names to the number of times they were called, and
+    `vertices` counts the vertices submitted in immediate mode or through
+    `glDrawArrays` and `glMultiDrawArrays`, those of display lists being
+    counted when the lists are called. `uploaded` counts the bytes given to
+    buffer objects. Timer callbacks given to `glutTimerFunc` are kept in
+    `timers` until `run_timers` calls them.
+
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.vertices = 0
+        self.uploaded = 0
+        self.timers = []
+        self._textures = 0
+        self._buffers = 0
+        # Vertices of every display list, and the one being compiled.
+        self._lists = {}
+        self._compiling = None
+
+    def reset(self):
+        """Forget the calls counted so far."""
+        self.calls.clear()
+        self.vertices = 0
+        self.uploaded = 0
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.itervalues())
+
+    def function(self, name):
+        """Return a recording stand-in for the GL function `name`."""
+        calls = self.calls
+        if name.startswith("glVertex") and name != "glVertexPointer":
+            def function(*args):
+                calls[name] = calls.get(name, 0) + 1
+                self._submit(1)
+        elif name == "glDrawArrays":
+            def function(mode, first, count):
+                calls[name] = calls.get(name, 0) + 1
+                self._submit(count)
+        elif name == "glMultiDrawArrays":
+            def function(mode, firsts, counts, drawcount):
+                calls[name] = calls.get(name, 0) + 1
+                self._submit(sum(counts[:drawcount]))
+        elif name == "glBufferData":
+            def function(target, size, data, usage):
+                calls[name] = calls.get(name, 0) + 1
+                self.uploaded += size
+        elif name == "glBufferSubData":
+            def function(target, offset, size, data):
+                calls[name] = calls.get(name, 0) + 1
+                self.uploaded += size
+        elif name == "glGenBuffers":
+            def function(count):
+                calls[name] = calls.get(name, 0) + 1
+                self._buffers += 1
+                return self._buffers
+        elif name == "glGenLists":
+            def function(count):
+                calls[name] = calls.get(name, 0) + 1
+                first = len(self._lists) + 1
+                for i in xrange(count):
+                    self._lists[first + i] = 0
+                return first
+        elif name == "glNewList":
+            def function(list, mode):
+                calls[name] = calls.get(name, 0) + 1
+                self._lists[list] = 0
+                self._compiling = list
+        elif name == "glEndList":
+            def function():
+                calls[name] = calls.get(name, 0) + 1
+                self._compiling = None
+        elif name == "glCallList":
+            def function(list):
+                calls[name] = calls.get(name, 0) + 1
+                self.vertices += self._lists.get(list, 0)
+        elif name == "glGenTextures":
+            def function(count):
+                calls[name] = calls.get(name, 0) + 1
+                self._textures += 1
+                return self._textures
+        elif name == "glutTimerFunc":
+            def function(milliseconds, callback, value):
+                calls[name] = calls.get(name, 0) + 1
+                self.timers.append((callback, value))
+        else:
+            def function(*args):
+                calls[name] = calls.get(name, 0) + 1
+        function.__name__ = name
+        return function
+
+    def _submit(self, count):
+        """Count vertices, into the display list being compiled if any."""
+        if self._compiling is None:
+            self.vertices += count
+        else:
+            self._lists[self._compiling] += count
+
+    def run_timers(self):
+        """Call the pending timer callbacks, and those they schedule, right away."""
+        while self.timers:
+            callback, value = self.timers.pop(0)
+            callback(value)
+
+    def install(self, directory):
+        """Make `OpenGL.GL`, `OpenGL.GLU` and `OpenGL.GLUT` import this backend.
+
+        The names to provide are taken from the modules in `GL_USERS`, found
+        in `directory`.
+
+        """
+        names = set()
+        for filename in GL_USERS:
+            source = open(os.path.join(directory, filename)).read()
+            names.update(_gl_name.findall(source))
+
+        package = types.ModuleType("OpenGL")
+        package.__path__ = []
+        modules = {}
+        for module_name in ("GL", "GLU", "GLUT"):
+            module = types.ModuleType("OpenGL." + module_name)
+            modules[module_name] = module
+            setattr(package, module_name, module)
+            sys.modules[module.__name__] = module
+        sys.modules["OpenGL"] = package
+        modules["GL"].GLfloat = ctypes.c_float
+        modules["GL"].GLdouble = ctypes.c_double
+
+        for value, name in enumerate(sorted(names)):
+            module_name = name.split("_")[0].upper() if "_" in name else \
+                          re.match("[a-z]+", name).group().upper()
+            if name[0].isupper():
+                # Constants get distinct values, like the real ones.
+                setattr(modules[module_name], name, value + 1)
+            else:
+                setattr(modules[module_name], name, self.function(name))
+
+
+def measure(function, repeat=1):
+    """Return the best time, in seconds, of `repeat` calls to `function`."""
+    best = None
+    for i in xrange(repeat):
+        start = default_timer()
+        function()
+        elapsed = default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def make_scene(count, seed=0):
+    """Return `count` finished drawables scattered over a square whose area
+    grows with `count`, about a third of each kind.
+    """
+    from drawables import Rectangle, Ellipse, FreeForm
+
+    rng = random.Random(seed)
+    side = 100.0 * count ** 0.5
+    colors = [(rng.random(), rng.random(), rng.random(), 1.0) for i in xrange(8)]
+    scene = []
+    for i in xrange(count):
+        x, y = rng.uniform(0, side), rng.uniform(0, side)
+        fill, line = rng.choice(colors), rng.choice(colors)
+        kind = i % 3
+        if kind == 2:
+            obj = FreeForm(fill, line, (x, y))
+            for j in xrange(rng.randint(10, 60)):
+                x += rng.uniform(-4, 6)
+                y += rng.uniform(-5, 5)
+                obj.construct(x, y)
+        else:
+            cls = Rectangle if kind == 0 else Ellipse
+            obj = cls(fill, line, (x, y),
+                      (x + rng.uniform(5, 80), y + rng.uniform(5, 80)))
+        obj.finish()
+        scene.append(obj)
+    return scene, side
+
+
+def make_stroke(length, seed=0):
+    """Return a finished FreeForm of about `length` points, and some query points."""
+    from drawables import FreeForm
+
+    rng = random.Random(seed)
+    stroke = FreeForm((0, 0, 0, 1), (0, 0, 0, 1), (0, 0),
+                      simplify_tolerance=0, min_sample_distance=0)
+    x = y = 0.0
+    for i in xrange(length - 1):
+        x += rng.uniform(-1, 3)
+        y += rng.uniform(-2, 2)
+        stroke.construct(x, y)
+    stroke.finish()
+    x1, y1, x2, y2 = stroke.bounding_box
+    queries = [(rng.uniform(x1, x2), rng.uniform(y1, y2)) for i in xrange(HIT_TEST_QUERIES)]
+    return stroke, queries
+
+
+def bench_scene(gl, count, results, workdir):
+    """Run the benchmarks which depend on the number of objects."""
+    import rysunek
+    from config import Config, default
+    from drawables import Drawable
+    from viewport import Viewport
+
+    scene, side = make_scene(count)
+    rng = random.Random(count)
+
+    objects = [None]
+    def build():
+        objects[0] = rysunek.ObjectList(scene)
+        # Objects only get into the spatial index when first needed.
+        objects[0]._flush_pending()
+    results["index/%s" % count] = {"seconds": measure(build)}
+    objects = objects[0]
+
+    points = [(rng.uniform(0, side), rng.uniform(0, side)) for i in xrange(SELECT_QUERIES)]
+    def select():
+        for x, y in points:
+            objects.select(x, y)
+    results["select/%s" % count] = {
+        "seconds": measure(select, 3) / len(points), "queries": len(points)}
+    objects.select_none()
+
+    def draw(display_list=False):
+        for obj in objects:
+            obj.draw(display_list=display_list)
+    gl.reset()
+    seconds = measure(draw)
+    results["draw/%s" % count] = {
+        "seconds": seconds, "objects": len(objects),
+        "gl_calls": gl.total_calls, "vertices": gl.vertices}
+
+    try:
+        gl.reset()
+        seconds = measure(lambda: draw(True))
+        results["draw_compile_lists/%s" % count] = {
+            "seconds": seconds, "gl_calls": gl.total_calls, "vertices": gl.vertices}
+        gl.reset()
+        seconds = measure(lambda: draw(True))
+        results["draw_lists/%s" % count] = {
+            "seconds": seconds, "gl_calls": gl.total_calls, "vertices": gl.vertices}
+    finally:
+        for obj in objects:
+            obj.release()
+        Drawable.delete_released_lists()
+
+    view = Viewport(*WINDOW)
+    view.origin = view.to_world(side / 2, side / 2)
+    visible = [None]
+    def draw_visible():
+        visible[0] = objects.visible(view.visible_rect)
+        for obj in visible[0]:
+            obj.draw()
+    gl.reset()
+    seconds = measure(draw_visible)
+    results["draw_visible/%s" % count] = {
+        "seconds": seconds, "objects": len(visible[0]),
+        "gl_calls": gl.total_calls, "vertices": gl.vertices}
+
+    try:
+        from renderer import BatchRenderer
+        renderer = BatchRenderer()
+    except ImportError:
+        renderer = None
+    if renderer is not None:
+        gl.reset()
+        seconds = measure(lambda: renderer.draw(objects))
+        results["batch_pack/%s" % count] = {
+            "seconds": seconds, "gl_calls": gl.total_calls, "vertices": gl.vertices,
+            "uploaded": gl.uploaded}
+        gl.reset()
+        seconds = measure(lambda: renderer.draw(objects))
+        results["batch_draw/%s" % count] = {
+            "seconds": seconds, "gl_calls": gl.total_calls, "vertices": gl.vertices,
+            "uploaded": gl.uploaded}
+        def edit():
+            objects[0].move((0, 0), (1, 1))
+            renderer.draw(objects)
+        gl.reset()
+        seconds = measure(edit)
+        results["batch_edit/%s" % count] = {
+            "seconds": seconds, "gl_calls": gl.total_calls, "vertices": gl.vertices,
+            "uploaded": gl.uploaded}
+
+    config = Config(default, temp_file=os.path.join(workdir, "bench.ryk"),
+                    autosave=False, auto_load_on_start=False, batch_rendering=False)
+    app = rysunek.App(config)
+    app.context.objects = objects
+    results["save/%s" % count] = {"seconds": measure(app.save)}
+    def load():
+        app.load()
+        gl.run_timers()
+    results["load/%s" % count] = {"seconds": measure(load)}
+    if len(app.context.objects) != count:
+        raise AssertionError("loaded %s objects out of %s" % (len(app.context.objects), count))
+
+
+def bench_hit_tests(results):
+    """Time hit-tests against free forms of increasing length."""
+    for length in STROKE_LENGTHS:
+        stroke, queries = make_stroke(length)
+        hits = [0]
+        def hit_test():
+            hits[0] = 0
+            for point in queries:
+                if point in stroke:
+                    hits[0] += 1
+        results["hit_test/%s" % length] = {
+            "seconds": measure(hit_test, 3) / len(queries), "hits": hits[0]}
+
+
+def bench_geometry(results):
+    """Time operations on all the points of a stroke, with a Point each
+    ("points_*") and with a PointArray ("point_array_*").
+    """
+    from geometry import Point, PointArray
+
+    for length in STROKE_LENGTHS:
+        stroke, queries = make_stroke(length)
+        points = list(stroke.points)
+        packed = PointArray(stroke.coordinates).copy()
+        vector, query = Point(1.5, -2.5), Point(*queries[0])
+
+        def segment_distances():
+            distances = []
+            for p1, p2 in zip(points, points[1:]):
+                d = p2 - p1
+                length2 = d.x * d.x + d.y * d.y
+                u = 0.0 if not length2 else min(max(
+                    ((query.x - p1.x) * d.x + (query.y - p1.y) * d.y) / length2, 0.0), 1.0)
+                distances.append((p1 + d * u - query).hypot)
+            return distances
+
+        operations = (
+            ("translate", lambda: [p + vector for p in points],
+                          lambda: packed.translate(vector)),
+            ("scale", lambda: [Point(p.x * vector.x, p.y * vector.y) for p in points],
+                      lambda: packed.scale(vector)),
+            ("centroid", lambda: reduce(Point.__add__, points) / float(len(points)),
+                         lambda: packed.centroid),
+            ("bounding_box", lambda: (min(p.x for p in points), min(p.y for p in points),
+                                      max(p.x for p in points), max(p.y for p in points)),
+                             lambda: packed.bounding_box),
+            ("hypot", lambda: [(p - query).hypot for p in points],
+                      lambda: packed.hypot(query)),
+            ("segment_distances", segment_distances,
+                                  lambda: packed.segment_distances(query)),
+        )
+        for name, per_point, vectorized in operations:
+            results["points_%s/%s" % (name, length)] = {"seconds": measure(per_point, 3)}
+            results["point_array_%s/%s" % (name, length)] = {"seconds": measure(vectorized, 3)}
+
+
+def bench_store(count, results):
+    """Time the columnar SceneStore on the rectangles and ellipses of a scene."""
+    from StringIO import StringIO
+    from scene import SceneStore
+    from viewport import Viewport
+
+    scene, side = make_scene(count)
+    shapes = [obj for obj in scene if hasattr(obj, "corner1")]
+    rng = random.Random(count)
+
+    store = [None]
+    def build():
+        store[0] = SceneStore(len(shapes))
+        store[0].extend(shapes)
+    results["store_build/%s" % count] = {"seconds": measure(build), "objects": len(shapes)}
+    store = store[0]
+    results["store_boxes/%s" % count] = {
+        "seconds": measure(store.bounding_boxes), "bytes": store.nbytes}
+
+    points = [(rng.uniform(0, side), rng.uniform(0, side)) for i in xrange(SELECT_QUERIES)]
+    def hit_test():
+        for x, y in points:
+            store.hit_test(x, y)
+    results["store_hit_test/%s" % count] = {
+        "seconds": measure(hit_test, 3) / len(points), "queries": len(points)}
+
+    view = Viewport(*WINDOW)
+    view.origin = view.to_world(side / 2, side / 2)
+    visible = [None]
+    def query():
+        visible[0] = store.query_rect(view.visible_rect)
+    results["store_visible/%s" % count] = {"seconds": measure(query, 3), "objects": len(visible[0])}
+    results["store_write/%s" % count] = {"seconds": measure(lambda: store.write(StringIO()))}
+
+
+def run(sizes, workdir):
+    """Run all benchmarks with the recording backend and return the report."""
+    gl = RecordingGL()
+    gl.install(os.path.dirname(os.path.abspath(__file__)))
+    import rysunek
+    # Keep debugging output out of the measurements.
+    rysunek.DEBUG = False
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    results = {}
+    for count in sizes:
+        print >> sys.stderr, "Benchmarking %s objects..." % count
+        bench_scene(gl, count, results, workdir)
+        if numpy is not None:
+            bench_store(count, results)
+    print >> sys.stderr, "Benchmarking hit-tests..."
+    bench_hit_tests(results)
+    print >> sys.stderr, "Benchmarking point operations..."
+    bench_geometry(results)
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": numpy.__version__ if numpy else None,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=0.25):
+    """Return a list of (name, message) regressions of `results` compared
+    with `baseline`, both being the "results" of a report.
+
+    A measurement regresses when it takes more than 1 + `tolerance` times as
+    long as in the baseline, or when it makes a different number of GL calls.
+
+    """
+    regressions = []
+    for name in sorted(baseline):
+        if name not in results:
+            continue
+        old, new = baseline[name], results[name]
+        if old.get("seconds") and new["seconds"] > old["seconds"] * (1 + tolerance):
+            regressions.append((name, "%.3g s instead of %.3g s (%+.0f%%)" % (
+                new["seconds"], old["seconds"],
+                100.0 * (new["seconds"] / old["seconds"] - 1))))
+        if "gl_calls" in old and new.get("gl_calls") != old["gl_calls"]:
+            regressions.append((name, "%s GL calls instead of %s" % (
+                new.get("gl_calls"), old["gl_calls"])))
+    return regressions
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the PyRysunek benchmarks without a display.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma separated numbers of objects (default: %(default)s)")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="where to write the results (default: %(default)s)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown relative to the baseline (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="also write the results to the baseline file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    workdir = tempfile.mkdtemp(prefix="rysunek-bench-")
+    try:
+        report = run(sizes, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = open(args.output, "w")
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.close()
+    for name in sorted(report["results"]):
+        print >> sys.stderr, "%-22s %.6f s" % (name, report["results"][name]["seconds"])
+
+    status = 0
+    if args.baseline and args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+    elif args.baseline:
+        baseline = json.load(open(args.baseline))
+        regressions = compare(report["results"], baseline["results"], args.tolerance)
+        for name, message in regressions:
+            print >> sys.stderr, "REGRESSION %s: %s" % (name, message)
+        if regressions:
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
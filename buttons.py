@@ -1,118 +1,230 @@
-# -*- coding: utf-8 -*-
-
-try:
-    import Image
-except ImportError:
-    print "A required library is not available: Python Imaging Library (PIL)"
-    raise
-from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
-
-from tools import *
-
-
-class Button(object):
-
-    """Represent a graphic button."""
-
-    def  __init__(self, x, y, size, color):
-        self.x = x
-        self.y = y
-        self.size = size
-        self.color = color
-        self.selected = False
-
-    def __contains__(self, (x, y)):
-        return ((self.x <= x < self.x + self.size) and
-                (self.y <= y < self.y + self.size))
-
-    def __repr__(self):
-        return "%s(x=%s, y=%s, size=%s)" % (self.__class__.__name__, self.x, self.y, self.size)
-
-    def draw(self):
-        """Draw itself using OpenGL primitives."""
-        glColor4fv(self.color)
-        glRectf(self.x, self.y, self.x + self.size, self.y + self.size)
-
-
-class IconicButton(Button):
-
-    """Represent a button with a nice icon.
-
-    Requires PIL.
-
-    """
-
-    icon_name = None # Must be defined on subclass
-
-    def  __init__(self, x, y, size, color):
-        super(IconicButton, self).__init__(x, y, size, color)
-
-        # Load an image file as a 2D texture using PIL
-        icon_path = "icons/%dx%d/%s.png" % (self.size, self.size, self.icon_name)
-        try:
-            im = Image.open(icon_path)
-            self.icon_width = im.size[0]
-            self.icon_height = im.size[1]
-            self.icon_image = im.tostring("raw", "RGBA", 0, -1)
-        except IOError:
-            print "PyRysunek was unable to load an icon from %s" % icon_path
-            raise
-
-    def draw(self):
-        """Draw itself using OpenGL primitives."""
-        glEnable(GL_TEXTURE_2D)
-        gluBuild2DMipmaps(
-            GL_TEXTURE_2D, 3, self.icon_width, self.icon_height,
-            GL_RGBA, GL_UNSIGNED_BYTE, self.icon_image
-        )
-
-        if self.selected:
-            color = self.color
-        else:
-            color = (1.0, 1.0, 1.0, 1.0)
-        glColor4fv(color)
-        glBegin(GL_QUADS)
-        glTexCoord2f(0, 0)
-        glVertex2f(self.x, self.y + self.size)
-        glTexCoord2f(1, 0)
-        glVertex2f(self.x + self.size, self.y + self.size)
-        glTexCoord2f(1, 1)
-        glVertex2f(self.x + self.size, self.y)
-        glTexCoord2f(0, 1)
-        glVertex2f(self.x, self.y)
-        glEnd()
-        glDisable(GL_TEXTURE_2D)
-
-
-class SelectionButton(IconicButton, SelectionTool):
-    icon_name = "tool-pointer"
-
-
-class RectangleButton(IconicButton, RectangleTool):
-    icon_name = "draw-rectangle"
-
-
-class EllipseButton(IconicButton, EllipseTool):
-    icon_name = "draw-ellipse"
-
-
-class FreeFormButton(IconicButton, FreeFormTool):
-    icon_name = "draw-freehand"
-
-
-class ResizeButton(IconicButton, ResizeTool):
-    icon_name = "transform-scale-horizontal"
-
-
-class MoveButton(IconicButton, MoveTool):
-    icon_name = "transform-move-horizontal"
-
-
-class DeleteButton(IconicButton, DeleteTool):
-    icon_name = "draw-eraser-delete-objects"
-
-
-class SetColorButton(Button):
-    pass
+# -*- coding: utf-8 -*-
+
+try:
+    import Image
+except ImportError:
+    print "A required library is not available: Python Imaging Library (PIL)"
+    raise
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+from OpenGL.GLU import *
+
+from tools import *
+
+
+class Button(object):
+
+    """Represent a graphic button."""
+
+    def  __init__(self, x, y, size, color):
+        self.x = x
+        self.y = y
+        self.size = size
+        self.color = color
+        self.selected = False
+
+    def __contains__(self, (x, y)):
+        return ((self.x <= x < self.x + self.size) and
+                (self.y <= y < self.y + self.size))
+
+    def __repr__(self):
+        return "%s(x=%s, y=%s, size=%s)" % (self.__class__.__name__, self.x, self.y, self.size)
+
+    def draw(self):
+        """Draw itself using OpenGL primitives."""
+        glColor4fv(self.color)
+        glRectf(self.x, self.y, self.x + self.size, self.y + self.size)
+
+
+def _power_of_two(n):
+    """Return the smallest power of two which is at least `n`."""
+    power = 1
+    while power < n:
+        power *= 2
+    return power
+
+
+class IconAtlas(object):
+
+    """A set of same-sized icons packed side by side into a single texture.
+
+    Icons are decoded once, when they are added. The texture is uploaded the
+    first time the atlas is bound, and again only if new icons were added
+    since then.
+
+    Each icon sits in a cell one pixel wider on every side, the border
+    repeating the edge pixels of the icon, so that filtering never blends
+    neighbouring icons. The texture is padded to power-of-two dimensions and
+    has no mipmaps, icons being drawn at their own size.
+
+    Use `IconAtlas.for_size` to share one atlas among all icons of a size.
+
+    Requires PIL.
+
+    """
+
+    _atlases = {}
+
+    @classmethod
+    def for_size(cls, size):
+        """Return the shared atlas for icons of `size` x `size` pixels."""
+        if size not in cls._atlases:
+            cls._atlases[size] = cls(size)
+        return cls._atlases[size]
+
+    def __init__(self, size):
+        self.size = size
+        self._icons = []
+        self._images = {}
+        self._texture = None
+        self._dirty = False
+
+    def __repr__(self):
+        return "%s(size=%s, icons=%s)" % (self.__class__.__name__, self.size, self._icons)
+
+    def add(self, icon_name):
+        """Decode an icon and reserve a slot for it. Adding it twice is a no-op."""
+        if icon_name in self._images:
+            return
+        icon_path = "icons/%dx%d/%s.png" % (self.size, self.size, icon_name)
+        try:
+            im = Image.open(icon_path)
+            im.load()
+        except IOError:
+            print "PyRysunek was unable to load an icon from %s" % icon_path
+            raise
+        self._images[icon_name] = im.convert("RGBA")
+        self._icons.append(icon_name)
+        self._dirty = True
+
+    @property
+    def texture_size(self):
+        """The (width, height) of the texture holding the icons added so far."""
+        cell = self.size + 2
+        return _power_of_two(cell * len(self._icons)), _power_of_two(cell)
+
+    def tex_coords(self, icon_name):
+        """Return the (u1, v1, u2, v2) texture coordinates of an icon."""
+        width, height = map(float, self.texture_size)
+        u1 = (self._icons.index(icon_name) * (self.size + 2) + 1) / width
+        # The atlas is uploaded bottom row first, its cells lying at the bottom.
+        v1 = 1 / height
+        return u1, v1, u1 + self.size / width, v1 + self.size / height
+
+    def _pack(self):
+        """Return an image of all icons in their cells."""
+        width, height = self.texture_size
+        atlas = Image.new("RGBA", (width, height))
+        top = height - self.size - 2
+        for i, icon_name in enumerate(self._icons):
+            left = i * (self.size + 2)
+            image = self._images[icon_name]
+            # Shifted copies fill the border with the edge pixels, the last
+            # one puts the icon itself in the middle of its cell.
+            for dx, dy in ((0, 0), (2, 0), (0, 2), (2, 2), (1, 0), (1, 2), (0, 1), (2, 1), (1, 1)):
+                atlas.paste(image, (left + dx, top + dy))
+        return atlas
+
+    def _upload(self):
+        """Pack all icons into one image and upload it as texture."""
+        width, height = self.texture_size
+        data = self._pack().tostring("raw", "RGBA", 0, -1)
+
+        if self._texture is None:
+            self._texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self._texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(
+            GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0,
+            GL_RGBA, GL_UNSIGNED_BYTE, data
+        )
+        self._dirty = False
+
+    def bind(self):
+        """Enable texturing with this atlas, uploading it if needed."""
+        glEnable(GL_TEXTURE_2D)
+        if self._dirty or self._texture is None:
+            self._upload()
+        else:
+            glBindTexture(GL_TEXTURE_2D, self._texture)
+
+    def unbind(self):
+        """Disable texturing."""
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+
+class IconicButton(Button):
+
+    """Represent a button with a nice icon.
+
+    The icon lives in the `IconAtlas` shared by all icons of the same size.
+    Requires PIL.
+
+    """
+
+    icon_name = None # Must be defined on subclass
+
+    def  __init__(self, x, y, size, color):
+        super(IconicButton, self).__init__(x, y, size, color)
+        self.icon_atlas = IconAtlas.for_size(self.size)
+        self.icon_atlas.add(self.icon_name)
+
+    def draw(self):
+        """Draw itself using OpenGL primitives."""
+        self.icon_atlas.bind()
+        self.draw_icon()
+        self.icon_atlas.unbind()
+
+    def draw_icon(self):
+        """Draw the icon, assuming that `icon_atlas` is already bound."""
+        u1, v1, u2, v2 = self.icon_atlas.tex_coords(self.icon_name)
+
+        if self.selected:
+            color = self.color
+        else:
+            color = (1.0, 1.0, 1.0, 1.0)
+        glColor4fv(color)
+        glBegin(GL_QUADS)
+        glTexCoord2f(u1, v1)
+        glVertex2f(self.x, self.y + self.size)
+        glTexCoord2f(u2, v1)
+        glVertex2f(self.x + self.size, self.y + self.size)
+        glTexCoord2f(u2, v2)
+        glVertex2f(self.x + self.size, self.y)
+        glTexCoord2f(u1, v2)
+        glVertex2f(self.x, self.y)
+        glEnd()
+
+
+class SelectionButton(IconicButton, SelectionTool):
+    icon_name = "tool-pointer"
+
+
+class RectangleButton(IconicButton, RectangleTool):
+    icon_name = "draw-rectangle"
+
+
+class EllipseButton(IconicButton, EllipseTool):
+    icon_name = "draw-ellipse"
+
+
+class FreeFormButton(IconicButton, FreeFormTool):
+    icon_name = "draw-freehand"
+
+
+class ResizeButton(IconicButton, ResizeTool):
+    icon_name = "transform-scale-horizontal"
+
+
+class MoveButton(IconicButton, MoveTool):
+    icon_name = "transform-move-horizontal"
+
+
+class DeleteButton(IconicButton, DeleteTool):
+    icon_name = "draw-eraser-delete-objects"
+
+
+class SetColorButton(Button):
+    pass
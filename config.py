@@ -1,44 +1,67 @@
-# -*- coding: utf-8 -*-
-
-# Default configuration for PyRysunek
-__version__ = (0, 1)
-DEBUG = True
-
-
-class Config(dict):
-    def __getattr__(self, attr):
-        return self.__getitem__(attr)
-
-
-default = Config(
-    bg_color = (1.0, 1.0, 1.0, 1.0),
-    window_size = (800, 500),
-    window_position = (150, 50),
-    window_title = "PyRysunek - v%s" % ".".join(map(str, __version__)),
-    toolbar = Config(
-        position = (0, 0), # top-left coordinate
-        icon_size = 32,
-        padding = 5,
-        color = (0.90625, 0.90625, 0.890625, 1.0),
-        selection_color = (0.82, 0.82, 0.95, 1.0),
-        color_picker = Config(
-            default_fill_color = (0.0, 0.0, 0.0, 1.0),
-            default_line_color = (1.0, 1.0, 0.0, 1.0),
-            colors = (
-                (0.0, 0.0, 0.0, 1.0),
-
-                (1.0, 0.0, 0.0, 1.0),
-                (0.0, 1.0, 0.0, 1.0),
-                (0.0, 0.0, 1.0, 1.0),
-
-                (1.0, 1.0, 1.0, 1.0),
-
-                (1.0, 1.0, 0.0, 1.0),
-                (0.0, 1.0, 1.0, 1.0),
-                (1.0, 0.0, 1.0, 1.0),
-            ),
-        ),
-    ),
-    temp_file = "tmp.ryk",
-    auto_load_on_start = True,
-)
+# -*- coding: utf-8 -*-
+
+# Default configuration for PyRysunek
+__version__ = (0, 1)
+DEBUG = True
+
+
+class Config(dict):
+    def __getattr__(self, attr):
+        return self.__getitem__(attr)
+
+
+default = Config(
+    bg_color = (1.0, 1.0, 1.0, 1.0),
+    window_size = (800, 500),
+    window_position = (150, 50),
+    window_title = "PyRysunek - v%s" % ".".join(map(str, __version__)),
+    target_fps = 60,
+    toolbar = Config(
+        position = (0, 0), # top-left coordinate
+        icon_size = 32,
+        padding = 5,
+        color = (0.90625, 0.90625, 0.890625, 1.0),
+        selection_color = (0.82, 0.82, 0.95, 1.0),
+        color_picker = Config(
+            default_fill_color = (0.0, 0.0, 0.0, 1.0),
+            default_line_color = (1.0, 1.0, 0.0, 1.0),
+            colors = (
+                (0.0, 0.0, 0.0, 1.0),
+
+                (1.0, 0.0, 0.0, 1.0),
+                (0.0, 1.0, 0.0, 1.0),
+                (0.0, 0.0, 1.0, 1.0),
+
+                (1.0, 1.0, 1.0, 1.0),
+
+                (1.0, 1.0, 0.0, 1.0),
+                (0.0, 1.0, 1.0, 1.0),
+                (1.0, 0.0, 1.0, 1.0),
+            ),
+        ),
+    ),
+    free_form = Config(
+        simplify_tolerance = 0.5, # 0 keeps every sample
+        min_sample_distance = 1.0,
+        draw_error = 1.0, # pixels between a stroke and the points drawn
+        drag_draw_error = 4.0, # the same while dragging
+    ),
+    view = Config(
+        zoom_step = 1.25, # zoom factor of a mouse wheel step
+        min_zoom = 1.0 / 64,
+        max_zoom = 64.0,
+    ),
+    undo_budget = 16 * 1024 * 1024, # bytes kept by the undo history
+    index_cell_size = 128,
+    batch_rendering = False, # requires NumPy
+    display_lists = True, # for finished objects, when not batch rendering
+    temp_file = "tmp.ryk",
+    compress_documents = True,
+    autosave = True,
+    journal_file = "tmp.ryk.journal",
+    journal_compact_every = 1000, # journal entries between checkpoints
+    auto_load_on_start = True,
+    load_batch_size = 2000, # objects handed over at once when loading
+    svg_file = "tmp.svg", # written by Ctrl+e
+    stats_file = None, # where to dump performance counters on exit
+)
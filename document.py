@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+# Reading and writing of PyRysunek documents (*.ryk).
+#
+# A document is a header followed by a stream of records:
+#
+#   header   "RYK\0", version (uint16), flags (uint16), quantum (uint32)
+#   records  tag (uint8) followed by a tag specific payload
+#
+# All fixed-size numbers are little-endian. If bit 0 of flags is set, the
+# whole record stream is compressed with zlib. `quantum` is the number of
+# free form coordinate units per pixel (see FREE_FORM below).
+#
+# Integers in payloads are unsigned LEB128 varints; signed integers are
+# zigzag encoded first. Colors are referenced by their index in a palette
+# which is built while reading: every COLOR record appends one entry.
+#
+#   END        (0) end of the document
+#   COLOR      (1) r, g, b, a as float64
+#   RECTANGLE  (2) fill color index, line color index, flags (uint8),
+#   ELLIPSE    (3)   translation x, y, resize x, y, corner1 x, y,
+#                    corner2 x, y as float64
+#   FREE_FORM  (4) fill color index, line color index, flags (uint8),
+#                  translation x, y, resize x, y as float64, number of
+#                  points, then every coordinate multiplied by `quantum`,
+#                  rounded, and stored as a signed difference from the
+#                  same coordinate of the previous point (the first point
+#                  is relative to 0, 0)
+#
+# Bit 0 of the drawable flags tells whether it is finished.
+#
+# Files which do not start with the magic string are taken to be legacy
+# pickled object lists and are read by `read_legacy`, which only accepts
+# the classes a legacy document is made of.
+
+import copy_reg
+import cPickle as pickle
+import os
+import struct
+import threading
+import zlib
+from array import array
+from Queue import Queue, Empty
+
+from drawables import Rectangle, Ellipse, FreeForm
+from geometry import Point
+
+MAGIC = "RYK\0"
+VERSION = 1
+FLAG_COMPRESSED = 1
+DEFAULT_QUANTUM = 64
+
+END, COLOR, RECTANGLE, ELLIPSE, FREE_FORM = range(5)
+FINISHED = 1
+
+_header = struct.Struct("<4sHHI")
+_color = struct.Struct("<4d")
+_vectors = struct.Struct("<4d")
+_corners = struct.Struct("<4d")
+
+# Size of the chunks read from and written to files.
+CHUNK_SIZE = 64 * 1024
+
+
+class DocumentError(IOError):
+    """Raised when a document is malformed or uses an unsupported version."""
+
+
+def _encode_varint(value, out):
+    """Append `value` (a non-negative integer) to the bytearray `out`."""
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _zigzag(value):
+    return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def _unzigzag(value):
+    return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+class _Writer(object):
+
+    """Buffer records and hand them to a file, compressing if asked to."""
+
+    def __init__(self, fileobj, compress):
+        self.fileobj = fileobj
+        self.compressor = zlib.compressobj() if compress else None
+        self.buffer = bytearray()
+
+    def flush(self, final=False):
+        data = str(self.buffer)
+        del self.buffer[:]
+        if self.compressor:
+            data = self.compressor.compress(data)
+            if final:
+                data += self.compressor.flush()
+        self.fileobj.write(data)
+
+    def maybe_flush(self):
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+
+
+class _Reader(object):
+
+    """Read bytes from a file, decompressing if needed, a chunk at a time."""
+
+    def __init__(self, fileobj, compressed):
+        self.fileobj = fileobj
+        self.decompressor = zlib.decompressobj() if compressed else None
+        self.buffer = ""
+        self.position = 0
+
+    def _fill(self, size):
+        chunks = [self.buffer[self.position:]]
+        available = len(chunks[0])
+        while available < size:
+            data = self.fileobj.read(CHUNK_SIZE)
+            if not data:
+                if self.decompressor:
+                    try:
+                        data = self.decompressor.flush()
+                    except zlib.error, error:
+                        raise DocumentError("corrupt document: %s" % error)
+                    self.decompressor = None
+                if not data:
+                    raise DocumentError("unexpected end of document")
+            elif self.decompressor:
+                try:
+                    data = self.decompressor.decompress(data)
+                except zlib.error, error:
+                    raise DocumentError("corrupt document: %s" % error)
+            chunks.append(data)
+            available += len(data)
+        self.buffer = "".join(chunks)
+        self.position = 0
+
+    def read(self, size):
+        if self.position + size > len(self.buffer):
+            self._fill(size)
+        data = self.buffer[self.position:self.position + size]
+        self.position += size
+        return data
+
+    def byte(self):
+        return ord(self.read(1))
+
+    def varint(self):
+        result = shift = 0
+        while True:
+            if self.position >= len(self.buffer):
+                self._fill(1)
+            byte = ord(self.buffer[self.position])
+            self.position += 1
+            result |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return result
+            shift += 7
+
+
+def write_document(objects, fileobj, compress=True, quantum=DEFAULT_QUANTUM):
+    """Write the drawables in `objects` to `fileobj`, one record at a time.
+
+    `objects` may be any iterable, so that documents can be written without
+    holding all of their drawables at once.
+
+    """
+    fileobj.write(_header.pack(MAGIC, VERSION, FLAG_COMPRESSED if compress else 0, quantum))
+    writer = _Writer(fileobj, compress)
+    out = writer.buffer
+    palette = {}
+
+    def color_index(color):
+        color = tuple(color)
+        if color not in palette:
+            palette[color] = len(palette)
+            out.append(COLOR)
+            out.extend(_color.pack(*color))
+        return palette[color]
+
+    for obj in objects:
+        fill, line = color_index(obj.fill_color), color_index(obj.line_color)
+        if isinstance(obj, FreeForm):
+            tag = FREE_FORM
+        elif isinstance(obj, Ellipse):
+            tag = ELLIPSE
+        elif isinstance(obj, Rectangle):
+            tag = RECTANGLE
+        else:
+            raise DocumentError("cannot write %r" % (obj,))
+
+        out.append(tag)
+        _encode_varint(fill, out)
+        _encode_varint(line, out)
+        out.append(FINISHED if obj.finished else 0)
+        out.extend(_vectors.pack(*(obj.translation_vector & obj.resize_vector)))
+        if tag == FREE_FORM:
+            coordinates = obj.coordinates
+            _encode_varint(len(coordinates) // 2, out)
+            previous_x = previous_y = 0
+            for i in xrange(0, len(coordinates), 2):
+                x = int(round(coordinates[i] * quantum))
+                y = int(round(coordinates[i + 1] * quantum))
+                _encode_varint(_zigzag(x - previous_x), out)
+                _encode_varint(_zigzag(y - previous_y), out)
+                previous_x, previous_y = x, y
+        else:
+            out.extend(_corners.pack(*(obj.corner1 & obj.corner2)))
+        writer.maybe_flush()
+
+    out.append(END)
+    writer.flush(final=True)
+
+
+def iter_document(fileobj):
+    """Yield the drawables stored in a document, as they are read.
+
+    Raise DocumentError if `fileobj` is not a readable document.
+
+    """
+    header = fileobj.read(_header.size)
+    if len(header) < _header.size or not header.startswith(MAGIC):
+        raise DocumentError("not a PyRysunek document")
+    magic, version, flags, quantum = _header.unpack(header)
+    if version > VERSION:
+        raise DocumentError("unsupported document version %s" % version)
+    if not quantum:
+        raise DocumentError("invalid quantum %s" % quantum)
+    reader = _Reader(fileobj, flags & FLAG_COMPRESSED)
+    try:
+        for obj in _read_records(reader, float(quantum)):
+            yield obj
+    except (struct.error, ValueError, OverflowError), error:
+        raise DocumentError("corrupt document: %s" % error)
+
+
+def _read_records(reader, quantum):
+    """Yield the drawables in the records read by `reader`."""
+    palette = []
+    while True:
+        tag = reader.byte()
+        if tag == END:
+            return
+        if tag == COLOR:
+            palette.append(_color.unpack(reader.read(_color.size)))
+            continue
+        if tag not in (RECTANGLE, ELLIPSE, FREE_FORM):
+            raise DocumentError("unknown record type %s" % tag)
+
+        try:
+            fill, line = palette[reader.varint()], palette[reader.varint()]
+        except IndexError:
+            raise DocumentError("undefined color")
+        flags = reader.byte()
+        t_x, t_y, r_x, r_y = _vectors.unpack(reader.read(_vectors.size))
+
+        if tag == FREE_FORM:
+            count = reader.varint()
+            if count < 1:
+                raise DocumentError("free form without points")
+            coordinates = array('d')
+            x = y = 0
+            for i in xrange(count):
+                x += _unzigzag(reader.varint())
+                y += _unzigzag(reader.varint())
+                coordinates.append(x / quantum)
+                coordinates.append(y / quantum)
+            obj = FreeForm(fill, line, (0, 0))
+            obj.coordinates = coordinates
+        else:
+            x1, y1, x2, y2 = _corners.unpack(reader.read(_corners.size))
+            cls = Rectangle if tag == RECTANGLE else Ellipse
+            obj = cls(fill, line, (x1, y1), (x2, y2))
+
+        obj.translation_vector = Point(t_x, t_y)
+        obj.resize_vector = Point(r_x, r_y)
+        obj._finished = bool(flags & FINISHED)
+        yield obj
+
+
+class _LegacyObjectList(list):
+
+    """Stand-in for the ObjectList class found in legacy pickles."""
+
+    def __setstate__(self, state):
+        pass
+
+
+_legacy_globals = {
+    ("copy_reg", "_reconstructor"): copy_reg._reconstructor,
+    ("__builtin__", "object"): object,
+    ("__builtin__", "list"): list,
+    ("__builtin__", "tuple"): tuple,
+    ("array", "array"): array,
+    ("geometry", "Point"): Point,
+    ("drawables", "Rectangle"): Rectangle,
+    ("drawables", "Ellipse"): Ellipse,
+    ("drawables", "FreeForm"): FreeForm,
+    ("rysunek", "ObjectList"): _LegacyObjectList,
+    ("__main__", "ObjectList"): _LegacyObjectList,
+}
+
+
+def _find_legacy_global(module, name):
+    """Only let legacy pickles refer to the classes a drawing is made of."""
+    if (module, name) not in _legacy_globals:
+        raise pickle.UnpicklingError("%s.%s is not allowed in a document" % (module, name))
+    return _legacy_globals[module, name]
+
+
+def read_legacy(fileobj):
+    """Return the drawables of a document pickled by older versions."""
+    unpickler = pickle.Unpickler(fileobj)
+    unpickler.find_global = _find_legacy_global
+    try:
+        objects = unpickler.load()
+    except (pickle.UnpicklingError, EOFError, ValueError, TypeError, AttributeError), error:
+        raise DocumentError("not a PyRysunek document: %s" % error)
+    if not isinstance(objects, list):
+        raise DocumentError("not a PyRysunek document")
+    return list(objects)
+
+
+def iter_any_document(fileobj):
+    """Yield the drawables of a document, or of a legacy pickled document.
+
+    `fileobj` must be seekable when it holds a legacy document.
+
+    """
+    start = fileobj.tell()
+    if fileobj.read(len(MAGIC)) == MAGIC:
+        fileobj.seek(start)
+        return iter_document(fileobj)
+    fileobj.seek(start)
+    return iter(read_legacy(fileobj))
+
+
+class DocumentLoader(object):
+
+    """Read a document in a background thread, handing drawables over in batches.
+
+    Call `next_batch` from the main thread until `done` becomes true. Then
+    `error` tells whether the whole document could be read.
+
+    """
+
+    def __init__(self, path, batch_size=1000, finished_only=False):
+        """Start loading the document at `path`.
+
+        Raise IOError if it cannot be opened.
+
+        Optional arguments:
+        batch_size -- number of drawables handed over at once
+        finished_only -- whether to skip drawables under construction
+        """
+        self.fileobj = open(path, "rb")
+        self.size = float(os.path.getsize(path) or 1)
+        self.batch_size = batch_size
+        self.finished_only = finished_only
+        self.progress = 0.0
+        self.done = False
+        self.error = None
+        self._batches = Queue()
+        self._thread = threading.Thread(target=self._run, name="loader")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        """Body of the background loader thread."""
+        try:
+            batch = []
+            for obj in iter_any_document(self.fileobj):
+                if self.finished_only and not obj.finished:
+                    continue
+                batch.append(obj)
+                if len(batch) >= self.batch_size:
+                    self._batches.put(batch)
+                    batch = []
+                    self.progress = min(self.fileobj.tell() / self.size, 1.0)
+            if batch:
+                self._batches.put(batch)
+        except Exception, error:
+            # Anything can go wrong with a damaged file; the main thread
+            # must hear about it rather than take a partial drawing.
+            self.error = error
+        finally:
+            self.fileobj.close()
+            self.progress = 1.0
+            # Tell the main thread that there is nothing more to come.
+            self._batches.put(None)
+
+    def next_batch(self):
+        """Return the next list of drawables, or None if none is ready yet."""
+        if self.done:
+            return None
+        try:
+            batch = self._batches.get_nowait()
+        except Empty:
+            return None
+        if batch is None:
+            self.done = True
+        return batch
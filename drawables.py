@@ -1,450 +1,818 @@
-# -*- coding: utf-8 -*-
-
-from OpenGL.GL import *
-from OpenGL.GLUT import *
-from OpenGL.GLU import *
-
-from geometry import Point
-
-
-class Drawable(object):
-
-    """Represent a drawable OpenGL object.
-
-    This class is intended to be subclassed.
-    Subclasses must implement these methods/properties:
-        normalize(self)
-        @property centroid
-        __contains__(self, (x, y))
-        draw_construction_guides(self)
-        draw_fill(self)
-        draw_outline(self)
-        draw_selection_overlay(self)
-        construct(self, x, y)
-
-    These methods/properties are provided and may be used as-is by subclasses:
-        denormalized(self, point)
-        @property highlight_color
-        draw(self)
-        draw_small_disk(self, point)
-        draw_rectangle_outline(self, corner, opposite_corner)
-        finish(self)
-        @property finished
-        move(self, from_point, to_point)
-        resize(self, from_point, to_point)
-
-    """
-
-    def __init__(self, fill_color, line_color):
-        """You should not instantiate the class Drawable directly."""
-        self.fill_color = fill_color
-        self.line_color = line_color
-        self._finished = False
-        self.selected = False
-        self.translation_vector = Point(0, 0)
-        self.resize_vector = Point(1, 1)
-
-    def __repr__(self):
-        return "%s()" % (self.__class__.__name__,)
-
-    def __contains__(self, (x, y)):
-        """Return whether (x, y) is inside this drawable."""
-        raise NotImplementedError
-
-    @property
-    def centroid(self):
-        """Return current centroid of this object."""
-        raise NotImplementedError
-
-    def normalize(self):
-        """"Normalize control points of this object.
-
-        All of the control points will be translated so that the object's
-        centroid lies in the center of the coordinate system (0, 0).
-
-        """
-        raise NotImplementedError
-
-    def denormalized(self, point):
-        """"Return denormalized coordinates for `point`.
-
-        The denormalized coordinates are computed by applying the
-        `resize_vector` and `translation_vector`.
-
-        """
-        x, y = point
-
-        # Take into account `resize_vector`.
-        x *= self.resize_vector.x
-        y *= self.resize_vector.y
-        denormalized_point = Point(x, y)
-
-        # Take into account `translation_vector`.
-        denormalized_point += self.translation_vector
-
-        return denormalized_point
-
-    @property
-    def highlight_color(self):
-        """Return a 4-value highlight color tuple."""
-        # Average fill color and line color.
-        combined_color = map(lambda (x, y): (x + y) / 2.0,
-                             zip(self.fill_color, self.line_color))
-        # Invert combined color.
-        r, g, b, a = combined_color
-        highlight_color = (1 - r, 1 - g, 1 - b, a)
-        return highlight_color
-
-    def draw_construction_guides(self):
-        """Draw elements specific to drawable interactive creation."""
-        raise NotImplementedError
-
-    def draw_fill(self):
-        """Draw main drawable object."""
-        raise NotImplementedError
-
-    def draw_outline(self):
-        """Draw outline of main drawable object."""
-        raise NotImplementedError
-
-    def draw_selection_overlay(self):
-        """Draw elements specific to drawable selection."""
-        raise NotImplementedError
-
-    def draw(self):
-        """Draw this drawable as a whole.
-
-        This method interact with `draw_construction_guides`, `draw_fill`,
-        `draw_outline` and `draw_selection_overlay` to draw itself.
-        It ensures that the OpenGL transformation matrix will be untouched.
-        It set the colors of the construction guides and selection overlay
-        to the `highlight_color`, and the main element to its `fill_color`
-        and `line_color`.
-
-        """
-        glPushMatrix()
-
-        if not self.finished:
-            glColor4fv(self.highlight_color)
-            self.draw_construction_guides()
-
-        glTranslatef(self.translation_vector.x, self.translation_vector.y, 0.0)
-        glScale(self.resize_vector.x, self.resize_vector.y, 1.0)
-
-        glPushMatrix()
-        glColor4fv(self.line_color)
-        # Draw outline first so that it is possible to simulate the outline
-        # effect by drawing overlapping filled objects.
-        self.draw_outline()
-        glPopMatrix()
-        glPushMatrix()
-        glColor4fv(self.fill_color)
-        self.draw_fill()
-        glPopMatrix()
-
-        if self.selected:
-            glColor4fv(self.highlight_color)
-            self.draw_selection_overlay()
-
-        glPopMatrix()
-
-    def draw_small_disk(self, point):
-        """Helper method to draw a small disk centered in the given point."""
-        glPushMatrix()
-        glTranslatef(point.x, point.y, 0)
-        gluDisk(gluNewQuadric(), 0, 3, 32, 32)
-        glPopMatrix()
-
-    def draw_rectangle_outline(self, corner, opposite_corner, radial_reduction):
-        """Helper method to draw a rectangle outline given two opposite corners."""
-        x1, y1, x2, y2 = corner & opposite_corner
-
-        # Make sure x1 <= x2 and y1 <= y2.
-        x1, x2 = sorted((x1, x2))
-        y1, y2 = sorted((y1, y2))
-
-        # Contract boundaries by `radial_reduction`.
-        #x1 += radial_reduction
-        x2 -= radial_reduction
-        #y1 += radial_reduction
-        y2 -= radial_reduction
-
-        glBegin(GL_LINE_LOOP)
-        glVertex2f(x1, y2)
-        glVertex2f(x2, y2)
-        glVertex2f(x2, y1)
-        glVertex2f(x1, y1)
-        glEnd()
-
-    def construct(self, x, y):
-        """Construct this object given mouse position (x, y)."""
-        raise NotImplementedError
-
-    def finish(self):
-        """Finish construction of this object.
-
-        Once called, this object won't respond to calls to `construct` anymore.
-        Also, all of its control points will be normalized.
-
-        """
-        self._finished = True
-        self.normalize()
-
-    @property
-    def finished(self):
-        return self._finished
-
-    def move(self, from_point, to_point):
-        """Move this object relative to two points.
-
-        This method can be called from external code, so that `from_point` and
-        `to_point` need NOT to be Point instances. (x, y) tuples work as well.
-
-        """
-        # Make sure we can treat coordinates as Point instances.
-        from_point, to_point = map(Point._make, (from_point, to_point))
-
-        # Update translation vector.
-        self.translation_vector += to_point - from_point
-
-    def resize(self, from_point, to_point):
-        """Resize this object relative to two points.
-
-        This method can be called from external code, so that `from_point` and
-        `to_point` need NOT to be Point instances. (x, y) tuples work as well.
-
-        """
-        # Make sure we can treat coordinates as Point instances.
-        from_point, to_point = map(Point._make, (from_point, to_point))
-
-        scale_x, scale_y = self.resize_vector
-        from_vector = from_point - self.translation_vector
-        to_vector = to_point - self.translation_vector
-
-        # Avoid division by zero.
-        from_vector += Point(0.001, 0.001)
-
-        # Update scale.
-        scale_x *= to_vector.x / from_vector.x
-        scale_y *= to_vector.y / from_vector.y
-
-        self.resize_vector = Point(scale_x, scale_y)
-
-
-class Rectangle(Drawable):
-    def __init__(self, fill_color, line_color, corner1, corner2):
-        super(Rectangle, self).__init__(fill_color, line_color)
-        self.corner1, self.corner2 = map(Point._make, (corner1, corner2))
-
-    def __contains__(self, (x, y)):
-        corner1 = self.denormalized(self.corner1)
-        corner2 = self.denormalized(self.corner2)
-
-        # Check whether (x, y) is inside the boundaries.
-        x_is_in_boundary = sorted((corner1.x, x, corner2.x))[1] == x
-        y_is_in_boundary = sorted((corner1.y, y, corner2.y))[1] == y
-        return x_is_in_boundary and y_is_in_boundary
-
-    @property
-    def centroid(self):
-        return (self.corner1 + self.corner2) / 2.0
-
-    def normalize(self):
-        centroid = self.centroid
-        self.translation_vector += centroid
-        self.corner1 -= centroid
-        self.corner2 -= centroid
-
-    def draw_construction_guides(self):
-        # Draw guides in the first and last corners.
-        self.draw_small_disk(self.corner1)
-        self.draw_small_disk(self.corner2)
-
-    def _draw_rectangle(self, radial_reduction):
-        x1, y1, x2, y2 = self.corner1 & self.corner2
-
-        # Make sure x1 <= x2 and y1 <= y2.
-        x1, x2 = sorted((x1, x2))
-        y1, y2 = sorted((y1, y2))
-
-        # Contract boundaries by `radial_reduction`.
-        x1 += radial_reduction
-        x2 -= radial_reduction
-        y1 += radial_reduction
-        y2 -= radial_reduction
-
-        # Draw rectangle.
-        glRectf(x1, y1, x2, y2)
-
-    def draw_fill(self):
-        self._draw_rectangle(1.0)
-
-    def draw_outline(self):
-        self._draw_rectangle(0.0)
-
-    def draw_selection_overlay(self):
-        self.draw_rectangle_outline(self.corner1, self.corner2, -1.0)
-
-    def construct(self, x, y):
-        # Update the second corner position.
-        if not self.finished:
-            self.corner2 = Point(x, y)
-
-
-class Ellipse(Drawable):
-    def __init__(self, fill_color, line_color, corner1, corner2):
-        super(Ellipse, self).__init__(fill_color, line_color)
-        self.corner1, self.corner2 = map(Point._make, (corner1, corner2))
-
-    def __contains__(self, (x, y)):
-        corner1 = self.denormalized(self.corner1)
-        corner2 = self.denormalized(self.corner2)
-
-        # Compute ellipse parameters.
-        a, b = (corner1 - corner2) / 2.0
-
-        # Compute coordinates of the center.
-        xc, yc = (corner1 + corner2) / 2.0
-
-        # Compute ellipse function with 2 decimal digits precision.
-        fx = round((((x - xc) ** 2.0) / (a ** 2.0)) +
-                   (((y - yc) ** 2.0) / (b ** 2.0)) - 1, 2)
-
-        # (x, y) is inside of the ellipse if fx < 0, or in the border if fx == 0
-        return fx <= 0.01
-
-    @property
-    def centroid(self):
-        return (self.corner1 + self.corner2) / 2.0
-
-    def normalize(self):
-        centroid = self.centroid
-        self.translation_vector += centroid
-        self.corner1 -= centroid
-        self.corner2 -= centroid
-
-    def draw_construction_guides(self):
-        # Draw guides in the first and last corners.
-        self.draw_small_disk(self.corner1)
-        self.draw_small_disk(self.corner2)
-
-    def _draw_ellipse(self, radial_reduction):
-        # Compute radius from the x coordinate.
-        radius = abs(self.corner1.x - self.corner2.x) / 2.0 - radial_reduction
-
-        # Center the ellipse on its centroid.
-        tr_x, tr_y = self.centroid
-        glTranslatef(tr_x, tr_y, 0.0)
-
-        # Scale to transform disk into ellipse.
-        d_x, d_y = map(lambda x: float(abs(x)), (self.corner1 - self.corner2))
-        # Avoid division by zero.
-        d_x = d_x or 1.0
-        glScale(1.0, d_y / d_x, 1.0)
-
-        # Draw filled disk/ellipse.
-        gluDisk(gluNewQuadric(), 0.0, radius, int(d_x / 2.0), int(d_y / 2.0))
-
-    def draw_fill(self):
-        self._draw_ellipse(1.0)
-
-    def draw_outline(self):
-        self._draw_ellipse(0.0)
-
-    def draw_selection_overlay(self):
-        self.draw_rectangle_outline(self.corner1, self.corner2, -1.0)
-
-    def construct(self, x, y):
-        # Update the second corner position.
-        if not self.finished:
-            self.corner2 = Point(x, y)
-
-
-class FreeForm(Drawable):
-    def __init__(self, fill_color, line_color, start):
-        super(FreeForm, self).__init__(fill_color, line_color)
-        self.points = [Point._make(start)]
-
-    def __contains__(self, (x, y)):
-        """Test whether (x, y) is close enough to this free form.
-
-        In other words, that the minimum distance between (x, y) and one of the
-        line segments of this free form is smaller than a threshold.
-
-        """
-        threshold = 3
-        q = Point(x, y)
-        # Iterate over all pairs of sequential points.
-        for p1, p2 in zip(self.points, self.points[1:]):
-            p1 = self.denormalized(p1)
-            p2 = self.denormalized(p2)
-
-            if p1 == p2:
-                # If the points are coincident, then compute distance point-to-point.
-                distance = (q - p1).hypot
-            else:
-                # Based on:
-                # http://local.wasp.uwa.edu.au/~pbourke/geometry/pointline/
-                u = (
-                    ((x - p1.x) * (p2.x - p1.x) + (y - p1.y)  * (p2.y - p1.y)) /
-                    ((p2 - p1).hypot ** 2.0)
-                )
-                if 0 <= u <= 1:
-                    # If the coeficient u is in the range 0..1, then the projection
-                    # of q into the line defined by p1 and p2 lies inside the line
-                    # segment defined by p1 and p2.
-                    p = Point(p1.x + u * (p2.x - p1.x),
-                              p1.y + u * (p2.y - p1.y))
-                    distance = (p - q).hypot
-                else:
-                    # In this case, the minimum distance is that of q to p1 or p2.
-                    distance = min((p1 - q).hypot, (p2 - q).hypot)
-
-            if distance <= threshold:
-                return True
-        return False
-
-    @property
-    def centroid(self):
-        return sum(self.points, Point(0, 0)) / float(len(self.points))
-
-    def normalize(self):
-        centroid = self.centroid
-        self.translation_vector += centroid
-        for i in xrange(len(self.points)):
-            self.points[i] -= centroid
-
-    def __repr__(self):
-        if len(self.points) > 6:
-            first_points = map(str, self.points[:3])
-            last_points = map(str, self.points[-3:])
-            repr_points = "[%s, ..., %s]" % tuple(map(", ".join, (first_points, last_points)))
-        else:
-            repr_points = str(self.points)
-        return "%s(points=%s)" % (self.__class__.__name__, repr_points)
-
-    def draw_construction_guides(self):
-        # Draw guides in the first and last points.
-        self.draw_small_disk(self.points[0])
-        self.draw_small_disk(self.points[-1])
-
-    def draw_fill(self):
-        pass
-
-    def draw_outline(self):
-        glBegin(GL_LINE_STRIP)
-        for point in self.points:
-            glVertex2f(*point)
-        glEnd()
-
-    def draw_selection_overlay(self):
-        top_left = Point(min(p.x for p in self.points),
-                         min(p.y for p in self.points))
-        bottom_right = Point(max(p.x for p in self.points),
-                             max(p.y for p in self.points))
-        self.draw_rectangle_outline(top_left, bottom_right, -1.0)
-
-    def construct(self, x, y):
-        # Add new points to the FreeForm.
-        if not self.finished:
-            self.points.append(Point(x, y))
+# -*- coding: utf-8 -*-
+
+from array import array
+from collections import namedtuple
+from math import hypot
+
+from OpenGL.GL import *
+
+from geometry import Point, PointArray, PointView, polyline_near, simplify_polyline, polyline_pyramid
+import tessellation
+
+# Display lists given up by drawables, deleted by `Drawable.delete_released_lists`
+# in the thread which owns the GL context.
+_released_lists = []
+
+
+class Detail(namedtuple("Detail", "pixel_scale max_error")):
+
+    """How finely drawables are drawn.
+
+    `pixel_scale` is the number of pixels per world unit in the current view,
+    and `max_error` the distance in pixels by which free forms may be
+    simplified (see `FreeForm.drawn_coordinates`).
+
+    """
+
+    __slots__ = ()
+
+
+# Unzoomed, with free forms drawn within a pixel.
+DEFAULT_DETAIL = Detail(1.0, 1.0)
+
+
+class Drawable(object):
+
+    """Represent a drawable OpenGL object.
+
+    This class is intended to be subclassed.
+    Subclasses must implement these methods/properties:
+        normalize(self)
+        @property centroid
+        @property local_bounding_box
+        __contains__(self, (x, y))
+        draw_construction_guides(self, detail)
+        draw_fill(self, detail)
+        draw_outline(self, detail)
+        draw_selection_overlay(self)
+        construct(self, x, y)
+
+    These methods/properties are provided and may be used as-is by subclasses:
+        denormalized(self, point)
+        localized(self, point)
+        @property highlight_color
+        draw(self, detail=DEFAULT_DETAIL, display_list=False)
+        draw_small_disk(self, point, pixel_scale)
+        draw_rectangle_outline(self, corner, opposite_corner)
+        @property bounding_box
+        hit_margin(self, (x1, y1, x2, y2))
+        changed(self, transform_only=False)
+        @property revision
+        display_list_key(self, detail=DEFAULT_DETAIL)
+        release(self)
+        finish(self)
+        @property finished
+        move(self, from_point, to_point)
+        resize(self, from_point, to_point, center=None)
+
+    """
+
+    # Incremented whenever the geometry or colors change. Class attribute so
+    # that objects pickled before it existed still have it.
+    _revision = 0
+    # World-space bounding box, valid while `_revision` does not change.
+    _bounding_box = None
+    _bounding_box_revision = None
+    # Incremented when the shape changes in local space, that is unless only
+    # `translation_vector` or `resize_vector` do.
+    _shape_revision = 0
+    # Display list holding the outline and fill in local space, valid while
+    # `display_list_key` does not change (see `draw`).
+    _display_list = None
+    _display_list_key = None
+
+    def __init__(self, fill_color, line_color):
+        """You should not instantiate the class Drawable directly."""
+        self.fill_color = fill_color
+        self.line_color = line_color
+        self._finished = False
+        self.selected = False
+        self.translation_vector = Point(0, 0)
+        self.resize_vector = Point(1, 1)
+
+    def __repr__(self):
+        return "%s()" % (self.__class__.__name__,)
+
+    def __getstate__(self):
+        """Leave display lists out of pickles."""
+        state = self.__dict__.copy()
+        state.pop("_display_list", None)
+        state.pop("_display_list_key", None)
+        return state
+
+    def __contains__(self, (x, y)):
+        """Return whether (x, y) is inside this drawable."""
+        raise NotImplementedError
+
+    @property
+    def centroid(self):
+        """Return current centroid of this object."""
+        raise NotImplementedError
+
+    @property
+    def local_bounding_box(self):
+        """Return the (x1, y1, x2, y2) box enclosing the control points,
+        before `resize_vector` and `translation_vector` are applied.
+        """
+        raise NotImplementedError
+
+    @property
+    def bounding_box(self):
+        """Return the world-space (x1, y1, x2, y2) box enclosing every point
+        for which `__contains__` may be true.
+
+        It is derived from `local_bounding_box` and cached until this object
+        changes.
+
+        """
+        if self._bounding_box_revision != self._revision:
+            x1, y1, x2, y2 = self.local_bounding_box
+            x1, y1 = self.denormalized((x1, y1))
+            x2, y2 = self.denormalized((x2, y2))
+            x1, x2 = sorted((x1, x2))
+            y1, y2 = sorted((y1, y2))
+            self._bounding_box = self.hit_margin((x1, y1, x2, y2))
+            self._bounding_box_revision = self._revision
+        return self._bounding_box
+
+    def hit_margin(self, (x1, y1, x2, y2)):
+        """Grow a world-space box by how far from the object `__contains__`
+        may still be true.
+        """
+        return (x1, y1, x2, y2)
+
+    def normalize(self):
+        """"Normalize control points of this object.
+
+        All of the control points will be translated so that the object's
+        centroid lies in the center of the coordinate system (0, 0).
+
+        """
+        raise NotImplementedError
+
+    def denormalized(self, point):
+        """"Return denormalized coordinates for `point`.
+
+        The denormalized coordinates are computed by applying the
+        `resize_vector` and `translation_vector`.
+
+        """
+        x, y = point
+
+        # Take into account `resize_vector`.
+        x *= self.resize_vector.x
+        y *= self.resize_vector.y
+        denormalized_point = Point(x, y)
+
+        # Take into account `translation_vector`.
+        denormalized_point += self.translation_vector
+
+        return denormalized_point
+
+    def localized(self, (x, y)):
+        """Return the local coordinates of the world-space point (x, y), the
+        inverse of `denormalized`.
+
+        Axes which `resize_vector` squashes to nothing have no inverse and
+        raise ZeroDivisionError.
+
+        """
+        return Point((x - self.translation_vector.x) / float(self.resize_vector.x),
+                     (y - self.translation_vector.y) / float(self.resize_vector.y))
+
+    def _in_local_box(self, (x, y)):
+        """Return whether the world-space point (x, y) is inside
+        `local_bounding_box` once transformed, testing it in local space.
+        """
+        x1, y1, x2, y2 = self.local_bounding_box
+        return (_in_range(x, x1, x2, self.resize_vector.x, self.translation_vector.x) and
+                _in_range(y, y1, y2, self.resize_vector.y, self.translation_vector.y))
+
+    @property
+    def highlight_color(self):
+        """Return a 4-value highlight color tuple."""
+        # Average fill color and line color.
+        combined_color = map(lambda (x, y): (x + y) / 2.0,
+                             zip(self.fill_color, self.line_color))
+        # Invert combined color.
+        r, g, b, a = combined_color
+        highlight_color = (1 - r, 1 - g, 1 - b, a)
+        return highlight_color
+
+    def draw_construction_guides(self, detail):
+        """Draw elements specific to drawable interactive creation."""
+        raise NotImplementedError
+
+    def draw_fill(self, detail):
+        """Draw main drawable object."""
+        raise NotImplementedError
+
+    def draw_outline(self, detail):
+        """Draw outline of main drawable object."""
+        raise NotImplementedError
+
+    def draw_selection_overlay(self):
+        """Draw elements specific to drawable selection."""
+        raise NotImplementedError
+
+    def draw(self, detail=DEFAULT_DETAIL, display_list=False):
+        """Draw this drawable as a whole.
+
+        This method interact with `draw_construction_guides`, `draw_fill`,
+        `draw_outline` and `draw_selection_overlay` to draw itself.
+        It ensures that the OpenGL transformation matrix will be untouched.
+        It set the colors of the construction guides and selection overlay
+        to the `highlight_color`, and the main element to its `fill_color`
+        and `line_color`.
+
+        `detail` tells how finely to draw for the current view. If
+        `display_list` is true, a finished drawable is drawn from a display
+        list, compiled on first use.
+
+        """
+        glPushMatrix()
+
+        if not self.finished:
+            glColor4fv(self.highlight_color)
+            self.draw_construction_guides(detail)
+
+        glTranslatef(self.translation_vector.x, self.translation_vector.y, 0.0)
+        glScale(self.resize_vector.x, self.resize_vector.y, 1.0)
+
+        if self.finished and display_list:
+            self._call_display_list(detail)
+        else:
+            self._draw_shape(detail)
+
+        if self.selected:
+            glColor4fv(self.highlight_color)
+            self.draw_selection_overlay()
+
+        glPopMatrix()
+
+    def _draw_shape(self, detail):
+        """Draw the outline and the fill in local space."""
+        glPushMatrix()
+        glColor4fv(self.line_color)
+        # Draw outline first so that it is possible to simulate the outline
+        # effect by drawing overlapping filled objects.
+        self.draw_outline(detail)
+        glPopMatrix()
+        glPushMatrix()
+        glColor4fv(self.fill_color)
+        self.draw_fill(detail)
+        glPopMatrix()
+
+    def _call_display_list(self, detail):
+        """Draw the shape from its display list, compiling it if needed."""
+        key = self.display_list_key(detail)
+        if self._display_list is None or self._display_list_key != key:
+            if self._display_list is None:
+                self._display_list = glGenLists(1)
+            glNewList(self._display_list, GL_COMPILE)
+            self._draw_shape(detail)
+            glEndList()
+            self._display_list_key = key
+        glCallList(self._display_list)
+
+    def display_list_key(self, detail=DEFAULT_DETAIL):
+        """Return what the display list of this object depends on: its shape
+        in local space, its colors, and in subclasses the level of detail.
+        """
+        return (self._shape_revision, tuple(self.fill_color), tuple(self.line_color))
+
+    def release(self):
+        """Give up the display list of this object, e.g. once it is deleted.
+
+        It may be called from any thread. The list is actually deleted by the
+        next call to `delete_released_lists`.
+
+        """
+        if self._display_list is not None:
+            _released_lists.append(self._display_list)
+            self._display_list = self._display_list_key = None
+
+    @staticmethod
+    def delete_released_lists():
+        """Delete the display lists given up by `release`."""
+        while _released_lists:
+            glDeleteLists(_released_lists.pop(), 1)
+
+    def draw_selection(self):
+        """Draw only the selection overlay, in world coordinates."""
+        glPushMatrix()
+        glTranslatef(self.translation_vector.x, self.translation_vector.y, 0.0)
+        glScale(self.resize_vector.x, self.resize_vector.y, 1.0)
+        glColor4fv(self.highlight_color)
+        self.draw_selection_overlay()
+        glPopMatrix()
+
+    def draw_small_disk(self, point, pixel_scale):
+        """Helper method to draw a small disk centered in the given point."""
+        glPushMatrix()
+        glTranslatef(point.x, point.y, 0)
+        # Keep the same size on screen whatever the zoom.
+        radius = 3.0 / pixel_scale
+        tessellation.draw_disk(radius, radius, 3)
+        glPopMatrix()
+
+    def draw_rectangle_outline(self, corner, opposite_corner, radial_reduction):
+        """Helper method to draw a rectangle outline given two opposite corners."""
+        x1, y1, x2, y2 = corner & opposite_corner
+
+        # Make sure x1 <= x2 and y1 <= y2.
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+
+        # Contract boundaries by `radial_reduction`.
+        #x1 += radial_reduction
+        x2 -= radial_reduction
+        #y1 += radial_reduction
+        y2 -= radial_reduction
+
+        glBegin(GL_LINE_LOOP)
+        glVertex2f(x1, y2)
+        glVertex2f(x2, y2)
+        glVertex2f(x2, y1)
+        glVertex2f(x1, y1)
+        glEnd()
+
+    def construct(self, x, y):
+        """Construct this object given mouse position (x, y)."""
+        raise NotImplementedError
+
+    def finish(self):
+        """Finish construction of this object.
+
+        Once called, this object won't respond to calls to `construct` anymore.
+        Also, all of its control points will be normalized.
+
+        """
+        self._finished = True
+        self.normalize()
+        self.changed()
+
+    @property
+    def finished(self):
+        return self._finished
+
+    def changed(self, transform_only=False):
+        """Mark this object as modified so that cached renderings are refreshed.
+
+        Pass `transform_only` when only `translation_vector` or
+        `resize_vector` changed, which does not call for a new display list.
+
+        """
+        self._revision += 1
+        if not transform_only:
+            self._shape_revision += 1
+
+    @property
+    def revision(self):
+        """Return a number which changes whenever this object is modified."""
+        return self._revision
+
+    def move(self, from_point, to_point):
+        """Move this object relative to two points.
+
+        This method can be called from external code, so that `from_point` and
+        `to_point` need NOT to be Point instances. (x, y) tuples work as well.
+
+        """
+        # Make sure we can treat coordinates as Point instances.
+        from_point, to_point = map(Point._make, (from_point, to_point))
+
+        # Update translation vector.
+        self.translation_vector += to_point - from_point
+        self.changed(transform_only=True)
+
+    def resize(self, from_point, to_point, center=None):
+        """Resize this object relative to two points.
+
+        The object is scaled about `center` by how much farther from it
+        `to_point` is than `from_point`, along each axis: its scale is
+        multiplied by that factor, and its position moves away from or
+        towards `center`. `center` defaults to `translation_vector`, so
+        that the object stays in place; objects resized together share one.
+
+        This method can be called from external code, so that `from_point` and
+        `to_point` need NOT to be Point instances. (x, y) tuples work as well.
+
+        """
+        # Make sure we can treat coordinates as Point instances.
+        from_point, to_point = map(Point._make, (from_point, to_point))
+        if center is None:
+            center = self.translation_vector
+
+        scale_x, scale_y = self.resize_vector
+        from_vector = from_point - center
+        to_vector = to_point - center
+
+        # Avoid division by zero.
+        from_vector += Point(0.001, 0.001)
+
+        # Update scale and position.
+        factor_x = to_vector.x / from_vector.x
+        factor_y = to_vector.y / from_vector.y
+        offset = self.translation_vector - center
+
+        self.resize_vector = Point(scale_x * factor_x, scale_y * factor_y)
+        self.translation_vector = Point(center.x + offset.x * factor_x,
+                                        center.y + offset.y * factor_y)
+        self.changed(transform_only=True)
+
+
+def _in_range(value, low, high, scale, offset):
+    """Return whether `value` is in [low, high] once scaled and offset."""
+    if not scale:
+        # The whole range is squashed onto `offset`.
+        return value == offset
+    return low <= (value - offset) / float(scale) <= high
+
+
+class Rectangle(Drawable):
+    def __init__(self, fill_color, line_color, corner1, corner2):
+        super(Rectangle, self).__init__(fill_color, line_color)
+        self.corner1, self.corner2 = map(Point._make, (corner1, corner2))
+
+    def __contains__(self, point):
+        return self._in_local_box(point)
+
+    @property
+    def local_bounding_box(self):
+        x1, y1, x2, y2 = self.corner1 & self.corner2
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        return (x1, y1, x2, y2)
+
+    @property
+    def centroid(self):
+        return (self.corner1 + self.corner2) / 2.0
+
+    def normalize(self):
+        centroid = self.centroid
+        self.translation_vector += centroid
+        self.corner1 -= centroid
+        self.corner2 -= centroid
+
+    def draw_construction_guides(self, detail):
+        # Draw guides in the first and last corners.
+        self.draw_small_disk(self.corner1, detail.pixel_scale)
+        self.draw_small_disk(self.corner2, detail.pixel_scale)
+
+    def _draw_rectangle(self, radial_reduction):
+        x1, y1, x2, y2 = self.corner1 & self.corner2
+
+        # Make sure x1 <= x2 and y1 <= y2.
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+
+        # Contract boundaries by `radial_reduction`.
+        x1 += radial_reduction
+        x2 -= radial_reduction
+        y1 += radial_reduction
+        y2 -= radial_reduction
+
+        # Draw rectangle.
+        glRectf(x1, y1, x2, y2)
+
+    def draw_fill(self, detail):
+        self._draw_rectangle(1.0)
+
+    def draw_outline(self, detail):
+        self._draw_rectangle(0.0)
+
+    def draw_selection_overlay(self):
+        self.draw_rectangle_outline(self.corner1, self.corner2, -1.0)
+
+    def construct(self, x, y):
+        # Update the second corner position.
+        if not self.finished:
+            self.corner2 = Point(x, y)
+            self.changed()
+
+
+class Ellipse(Drawable):
+    def __init__(self, fill_color, line_color, corner1, corner2):
+        super(Ellipse, self).__init__(fill_color, line_color)
+        self.corner1, self.corner2 = map(Point._make, (corner1, corner2))
+
+    def __contains__(self, (x, y)):
+        # Compute ellipse parameters, in local space.
+        a, b = (self.corner1 - self.corner2) / 2.0
+        if not (a * self.resize_vector.x and b * self.resize_vector.y):
+            # A flat ellipse is a segment or a point: hit it like its box.
+            return self._in_local_box((x, y))
+
+        # Compute coordinates of the center.
+        xc, yc = self.centroid
+        x, y = self.localized((x, y))
+
+        # Compute ellipse function with 2 decimal digits precision. It is
+        # the same in local space and in world space.
+        fx = round((((x - xc) ** 2.0) / (a ** 2.0)) +
+                   (((y - yc) ** 2.0) / (b ** 2.0)) - 1, 2)
+
+        # (x, y) is inside of the ellipse if fx < 0, or in the border if fx == 0
+        return fx <= 0.01
+
+    @property
+    def local_bounding_box(self):
+        x1, y1, x2, y2 = self.corner1 & self.corner2
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        return (x1, y1, x2, y2)
+
+    def hit_margin(self, (x1, y1, x2, y2)):
+        # `__contains__` accepts points slightly beyond the border (see the
+        # rounding of fx), up to ~0.75% of each semi-axis.
+        margin_x = (x2 - x1) * 0.005 + 0.001
+        margin_y = (y2 - y1) * 0.005 + 0.001
+        return (x1 - margin_x, y1 - margin_y, x2 + margin_x, y2 + margin_y)
+
+    @property
+    def centroid(self):
+        return (self.corner1 + self.corner2) / 2.0
+
+    def normalize(self):
+        centroid = self.centroid
+        self.translation_vector += centroid
+        self.corner1 -= centroid
+        self.corner2 -= centroid
+
+    def draw_construction_guides(self, detail):
+        # Draw guides in the first and last corners.
+        self.draw_small_disk(self.corner1, detail.pixel_scale)
+        self.draw_small_disk(self.corner2, detail.pixel_scale)
+
+    def _radii(self, radial_reduction, pixel_scale):
+        """Return the radii of the drawn ellipse and its largest radius on screen."""
+        # Compute radius from the x coordinate.
+        radius = abs(self.corner1.x - self.corner2.x) / 2.0 - radial_reduction
+
+        # Scale to transform disk into ellipse.
+        d_x, d_y = map(lambda x: float(abs(x)), (self.corner1 - self.corner2))
+        # Avoid division by zero.
+        d_x = d_x or 1.0
+        radius_y = radius * d_y / d_x
+
+        on_screen_radius = max(abs(radius * self.resize_vector.x),
+                               abs(radius_y * self.resize_vector.y)) * pixel_scale
+        return radius, radius_y, on_screen_radius
+
+    def _draw_ellipse(self, radial_reduction, pixel_scale):
+        radius, radius_y, on_screen_radius = self._radii(radial_reduction, pixel_scale)
+
+        # Center the ellipse on its centroid.
+        tr_x, tr_y = self.centroid
+        glTranslatef(tr_x, tr_y, 0.0)
+
+        # Draw filled disk/ellipse, tessellated according to its size on screen.
+        tessellation.draw_disk(radius, radius_y, on_screen_radius)
+
+    def display_list_key(self, detail=DEFAULT_DETAIL):
+        # The tessellation depends on the size on screen.
+        return super(Ellipse, self).display_list_key(detail) + (
+            tessellation.segments_for(self._radii(0.0, detail.pixel_scale)[2]),
+            tessellation.segments_for(self._radii(1.0, detail.pixel_scale)[2]))
+
+    def draw_fill(self, detail):
+        self._draw_ellipse(1.0, detail.pixel_scale)
+
+    def draw_outline(self, detail):
+        self._draw_ellipse(0.0, detail.pixel_scale)
+
+    def draw_selection_overlay(self):
+        self.draw_rectangle_outline(self.corner1, self.corner2, -1.0)
+
+    def construct(self, x, y):
+        # Update the second corner position.
+        if not self.finished:
+            self.corner2 = Point(x, y)
+            self.changed()
+
+
+class FreeForm(Drawable):
+
+    """A free hand stroke.
+
+    Its points are stored as packed x, y coordinates in `coordinates`, an
+    `array('d')`. The `points` property gives a lazy view of them as Points.
+    Their extent and sums are kept up to date as points are added, to
+    answer `local_bounding_box` and `centroid` without scanning them.
+
+    Finished strokes are drawn from a pyramid of simplified versions of
+    themselves (see `drawn_coordinates`), so that long strokes which are
+    small on screen only send a few points to OpenGL.
+
+    """
+
+    # Maximum distance from the stroke at which a point is still contained.
+    threshold = 3
+    # Maximum distance between the stroke and the samples dropped when
+    # simplifying it on `finish`. Zero disables simplification.
+    simplify_tolerance = 0.5
+    # Samples closer than this to the last kept one are dropped by `construct`.
+    # Zero keeps every sample.
+    min_sample_distance = 1.0
+
+    # Number of samples given to this object (see `simplification_stats`).
+    _sample_count = 0
+    # Last sample dropped by `construct`, kept until a farther one arrives.
+    _dropped_sample = None
+    # [min x, min y, max x, max y] and [sum of x, sum of y] of the points, or
+    # None when they have to be computed again.
+    _extent = None
+    _sums = None
+    # Levels of detail from `polyline_pyramid`, or None until needed.
+    _pyramid = None
+
+    def __init__(self, fill_color, line_color, start,
+                 simplify_tolerance=None, min_sample_distance=None, threshold=None):
+        """Start a stroke at `start`.
+
+        `simplify_tolerance`, `min_sample_distance` and `threshold` replace
+        the defaults of the class for this stroke.
+
+        """
+        super(FreeForm, self).__init__(fill_color, line_color)
+        if threshold is not None:
+            self.threshold = threshold
+        if simplify_tolerance is not None:
+            self.simplify_tolerance = simplify_tolerance
+        if min_sample_distance is not None:
+            self.min_sample_distance = min_sample_distance
+        self.coordinates = array('d', Point._make(start))
+        self._sample_count = 1
+
+    def _get_coordinates(self):
+        return self._coordinates
+    def _set_coordinates(self, coordinates):
+        self._coordinates = coordinates
+        self._extent = self._sums = None
+        self._pyramid = None
+        self.changed()
+    coordinates = property(_get_coordinates, _set_coordinates)
+
+    def __getstate__(self):
+        """Leave the levels of detail out of pickles."""
+        state = super(FreeForm, self).__getstate__()
+        state.pop("_pyramid", None)
+        return state
+
+    def __setstate__(self, state):
+        """Convert objects pickled when points were stored as a list."""
+        if "points" in state:
+            points = state.pop("points")
+            state["_coordinates"] = array('d', (c for point in points for c in point))
+        if "coordinates" in state:
+            state["_coordinates"] = state.pop("coordinates")
+        self.__dict__.update(state)
+
+    @property
+    def points(self):
+        return PointView(self.coordinates)
+
+    def drawn_coordinates(self, detail=DEFAULT_DETAIL):
+        """Return the coarsest level of detail of this stroke which is within
+        `detail.max_error` pixels of it at `detail.pixel_scale`.
+
+        Strokes under construction are always drawn in full.
+
+        """
+        coordinates = self._coordinates
+        if not self.finished:
+            return coordinates
+        if self._pyramid is None:
+            self._pyramid = polyline_pyramid(coordinates)
+        scale = detail.pixel_scale * max(abs(self.resize_vector.x), abs(self.resize_vector.y))
+        for error, simplified in self._pyramid:
+            if error * scale > detail.max_error:
+                break
+            coordinates = simplified
+        return coordinates
+
+    def display_list_key(self, detail=DEFAULT_DETAIL):
+        # Levels of detail only ever have fewer points than finer ones.
+        return super(FreeForm, self).display_list_key(detail) + (
+            len(self.drawn_coordinates(detail)),)
+
+    def __contains__(self, (x, y)):
+        """Test whether (x, y) is close enough to this free form.
+
+        In other words, that the minimum distance between (x, y) and one of the
+        line segments of this free form is smaller than a threshold, in world
+        space. (x, y) is transformed into local space once, rather than every
+        point into world space.
+
+        """
+        return polyline_near(self.coordinates, x, y, self.threshold,
+                             self.resize_vector, self.translation_vector)
+
+    def _summarize(self):
+        """Compute the extent and the sums of the coordinates from scratch."""
+        xs = self._coordinates[0::2]
+        ys = self._coordinates[1::2]
+        self._extent = [min(xs), min(ys), max(xs), max(ys)]
+        self._sums = [sum(xs), sum(ys)]
+
+    @property
+    def local_bounding_box(self):
+        if self._extent is None:
+            self._summarize()
+        return tuple(self._extent)
+
+    def hit_margin(self, (x1, y1, x2, y2)):
+        threshold = self.threshold
+        return (x1 - threshold, y1 - threshold, x2 + threshold, y2 + threshold)
+
+    @property
+    def centroid(self):
+        if self._sums is None:
+            self._summarize()
+        count = float(len(self._coordinates) // 2)
+        return Point(self._sums[0] / count, self._sums[1] / count)
+
+    def normalize(self):
+        centroid = self.centroid
+        self.translation_vector += centroid
+        PointArray(self._coordinates).translate(centroid * -1)
+        if self._extent is not None:
+            x1, y1, x2, y2 = self._extent
+            self._extent = [x1 - centroid.x, y1 - centroid.y,
+                            x2 - centroid.x, y2 - centroid.y]
+        self._sums = None
+        self._pyramid = None
+
+    def __repr__(self):
+        points = self.points
+        if len(points) > 6:
+            first_points = map(str, points[:3])
+            last_points = map(str, points[-3:])
+            repr_points = "[%s, ..., %s]" % tuple(map(", ".join, (first_points, last_points)))
+        else:
+            repr_points = str(points)
+        return "%s(points=%s)" % (self.__class__.__name__, repr_points)
+
+    def draw_construction_guides(self, detail):
+        # Draw guides in the first and last points.
+        points = self.points
+        self.draw_small_disk(points[0], detail.pixel_scale)
+        self.draw_small_disk(points[-1], detail.pixel_scale)
+
+    def draw_fill(self, detail):
+        pass
+
+    def draw_outline(self, detail):
+        # Feed the packed coordinates to OpenGL without copying them. The
+        # ctypes view must not outlive this call, as `construct` may
+        # reallocate the array.
+        coordinates = self.drawn_coordinates(detail)
+        vertices = (GLdouble * len(coordinates)).from_buffer(coordinates)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_DOUBLE, 0, vertices)
+        glDrawArrays(GL_LINE_STRIP, 0, len(coordinates) // 2)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def draw_selection_overlay(self):
+        x1, y1, x2, y2 = self.local_bounding_box
+        self.draw_rectangle_outline(Point(x1, y1), Point(x2, y2), -1.0)
+
+    def construct(self, x, y):
+        # Add new points to the FreeForm.
+        if not self.finished:
+            self._sample_count += 1
+            coordinates = self.coordinates
+            if hypot(x - coordinates[-2], y - coordinates[-1]) < self.min_sample_distance:
+                self._dropped_sample = (x, y)
+                return
+            self._dropped_sample = None
+            coordinates.extend((x, y))
+            if self._extent is not None:
+                extent = self._extent
+                extent[0] = min(extent[0], x)
+                extent[1] = min(extent[1], y)
+                extent[2] = max(extent[2], x)
+                extent[3] = max(extent[3], y)
+            if self._sums is not None:
+                self._sums[0] += x
+                self._sums[1] += y
+            self.changed()
+
+    def finish(self):
+        """Finish construction, simplifying the stroke.
+
+        The last sample is kept even if `construct` dropped it, and then the
+        stroke is simplified within `simplify_tolerance`.
+
+        """
+        if self._dropped_sample is not None:
+            self.coordinates.extend(self._dropped_sample)
+            self._dropped_sample = None
+        self.coordinates = simplify_polyline(self.coordinates, self.simplify_tolerance)
+        super(FreeForm, self).finish()
+
+    @property
+    def simplification_stats(self):
+        """Return the number of samples received and of points kept."""
+        return self._sample_count, len(self.coordinates) // 2
@@ -1,34 +1,440 @@
-# -*- coding: utf-8 -*-
-
-from collections import namedtuple
-from math import hypot
-
-
-class Point(namedtuple('Point', 'x y')):
-
-    """A useful and pragmatic implementation of a Point.
-
-    May also be used as a vector under some circunstances.
-    Refer to the unit tests for examples of usage.
-
-    """
-
-    __slots__ = ()
-
-    @property
-    def hypot(self):
-        return hypot(self.x, self.y)
-
-    def __add__(self, other):
-        return Point.__new__(Point, self.x + other.x, self.y + other.y)
-    def __sub__(self, other):
-        return Point.__new__(Point, self.x - other.x, self.y - other.y)
-    def __mul__(self, number):
-        return Point.__new__(Point, self.x * number, self.y * number)
-    def __div__(self, number):
-        return Point.__new__(Point, self.x / number, self.y / number)
-    def __lt__(self, other):
-        return self.hypot < other.hypot
-
-    def __and__(self, other):
-        return tuple.__add__(self, other)
+# -*- coding: utf-8 -*-
+
+from array import array
+from collections import namedtuple
+from math import hypot
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class Point(namedtuple('Point', 'x y')):
+
+    """A useful and pragmatic implementation of a Point.
+
+    May also be used as a vector under some circunstances.
+    Refer to the unit tests for examples of usage.
+
+    """
+
+    __slots__ = ()
+
+    @property
+    def hypot(self):
+        return hypot(self.x, self.y)
+
+    def __add__(self, other):
+        return Point.__new__(Point, self.x + other.x, self.y + other.y)
+    def __sub__(self, other):
+        return Point.__new__(Point, self.x - other.x, self.y - other.y)
+    def __mul__(self, number):
+        return Point.__new__(Point, self.x * number, self.y * number)
+    def __div__(self, number):
+        return Point.__new__(Point, self.x / number, self.y / number)
+    def __lt__(self, other):
+        return self.hypot < other.hypot
+
+    def __and__(self, other):
+        return tuple.__add__(self, other)
+
+
+class PointView(object):
+
+    """A read-only sequence of Points backed by packed (x, y) coordinates.
+
+    `coordinates` is a flat sequence such as an `array('d')` holding
+    x0, y0, x1, y1, ... Points are only created when items are accessed.
+
+    """
+
+    __slots__ = ('coordinates',)
+
+    def __init__(self, coordinates):
+        self.coordinates = coordinates
+
+    def __len__(self):
+        return len(self.coordinates) // 2
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("point index out of range")
+        return Point.__new__(Point, self.coordinates[2 * index],
+                             self.coordinates[2 * index + 1])
+
+    def __iter__(self):
+        coordinates = self.coordinates
+        for i in xrange(0, len(coordinates) - 1, 2):
+            yield Point.__new__(Point, coordinates[i], coordinates[i + 1])
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# Polylines with fewer points are tested in pure Python, which is faster than
+# setting up NumPy arrays for them.
+VECTORIZE_MIN_POINTS = 32
+# Number of segments tested at once by the vectorized implementation.
+VECTORIZE_CHUNK = 4096
+
+
+class PointArray(PointView):
+
+    """A mutable sequence of Points packed in an `array('d')`, with
+    operations applying to all of them at once.
+
+    Items are Points, and Points or (x, y) pairs are accepted wherever a
+    point or a vector is expected. Operations use NumPy on the packed
+    coordinates when it is installed and there are enough points, without
+    creating a Point per item, and give the same results in pure Python.
+
+    """
+
+    __slots__ = ()
+
+    def __init__(self, coordinates=None):
+        """Create a PointArray over a flat sequence of x0, y0, x1, y1, ...
+
+        An `array('d')` is used as is, so that the changes made through the
+        PointArray show in it. Other sequences are copied.
+
+        """
+        if coordinates is None:
+            coordinates = array('d')
+        elif not isinstance(coordinates, array) or coordinates.typecode != 'd':
+            coordinates = array('d', coordinates)
+        self.coordinates = coordinates
+
+    @classmethod
+    def from_points(cls, points):
+        """Create a PointArray holding a copy of a sequence of points."""
+        return cls(array('d', (c for point in points for c in point)))
+
+    def __setitem__(self, index, (x, y)):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("point index out of range")
+        self.coordinates[2 * index] = x
+        self.coordinates[2 * index + 1] = y
+
+    def append(self, (x, y)):
+        self.coordinates.append(x)
+        self.coordinates.append(y)
+
+    def copy(self):
+        return PointArray(array('d', self.coordinates))
+
+    def _vectorized(self):
+        """Return an (n, 2) NumPy view of the coordinates, or None if they
+        are better handled in pure Python.
+        """
+        if numpy is None or len(self.coordinates) < 2 * VECTORIZE_MIN_POINTS:
+            return None
+        return numpy.frombuffer(self.coordinates, numpy.float64).reshape(-1, 2)
+
+    def translate(self, (d_x, d_y)):
+        """Add the vector (d_x, d_y) to every point, in place."""
+        points = self._vectorized()
+        if points is not None:
+            points += (d_x, d_y)
+            return self
+        coordinates = self.coordinates
+        for i in xrange(0, len(coordinates) - 1, 2):
+            coordinates[i] += d_x
+            coordinates[i + 1] += d_y
+        return self
+
+    def scale(self, factor):
+        """Multiply every point by `factor`, a number or an (x, y) pair of
+        factors, in place.
+        """
+        if isinstance(factor, (int, long, float)):
+            factor = (factor, factor)
+        f_x, f_y = factor
+        points = self._vectorized()
+        if points is not None:
+            points *= (f_x, f_y)
+            return self
+        coordinates = self.coordinates
+        for i in xrange(0, len(coordinates) - 1, 2):
+            coordinates[i] *= f_x
+            coordinates[i + 1] *= f_y
+        return self
+
+    @property
+    def centroid(self):
+        """Return the average of the points."""
+        if not len(self):
+            raise ValueError("centroid of no points")
+        points = self._vectorized()
+        if points is not None:
+            x, y = points.mean(axis=0)
+            return Point(float(x), float(y))
+        count = float(len(self))
+        return Point(sum(self.coordinates[0::2]) / count,
+                     sum(self.coordinates[1::2]) / count)
+
+    @property
+    def bounding_box(self):
+        """Return the (x1, y1, x2, y2) box enclosing the points."""
+        if not len(self):
+            raise ValueError("bounding box of no points")
+        points = self._vectorized()
+        if points is not None:
+            (x1, y1), (x2, y2) = points.min(axis=0), points.max(axis=0)
+            return (float(x1), float(y1), float(x2), float(y2))
+        xs, ys = self.coordinates[0::2], self.coordinates[1::2]
+        return (min(xs), min(ys), max(xs), max(ys))
+
+    def hypot(self, origin=(0.0, 0.0)):
+        """Return an `array('d')` of the distances from `origin` to every point."""
+        o_x, o_y = origin
+        points = self._vectorized()
+        if points is not None:
+            distances = numpy.hypot(points[:, 0] - o_x, points[:, 1] - o_y)
+            return array('d', distances.tostring())
+        coordinates = self.coordinates
+        return array('d', (hypot(coordinates[i] - o_x, coordinates[i + 1] - o_y)
+                           for i in xrange(0, len(coordinates) - 1, 2)))
+
+    def segment_distances(self, (x, y)):
+        """Return an `array('d')` of the distances from (x, y) to each segment
+        of the polyline going through the points.
+        """
+        points = self._vectorized()
+        if points is not None:
+            x1, y1 = points[:-1, 0], points[:-1, 1]
+            d_x, d_y = points[1:, 0] - x1, points[1:, 1] - y1
+            length2 = d_x * d_x + d_y * d_y
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                u = ((x - x1) * d_x + (y - y1) * d_y) / length2
+            # Coincident points are a segment of length 0.
+            u = numpy.where(length2 == 0, 0.0, numpy.clip(u, 0.0, 1.0))
+            distances = numpy.hypot(x1 + u * d_x - x, y1 + u * d_y - y)
+            return array('d', distances.tostring())
+        coordinates = self.coordinates
+        distances = array('d')
+        for i in xrange(0, len(coordinates) - 3, 2):
+            x1, y1 = coordinates[i], coordinates[i + 1]
+            d_x, d_y = coordinates[i + 2] - x1, coordinates[i + 3] - y1
+            length2 = d_x * d_x + d_y * d_y
+            if length2 == 0:
+                u = 0.0
+            else:
+                u = min(max(((x - x1) * d_x + (y - y1) * d_y) / length2, 0.0), 1.0)
+            distances.append(hypot(x1 + u * d_x - x, y1 + u * d_y - y))
+        return distances
+
+    def __repr__(self):
+        return "PointArray(%r)" % (list(self),)
+
+
+def polyline_near(coordinates, x, y, threshold, scale=(1.0, 1.0), offset=(0.0, 0.0)):
+    """Return whether (x, y) lies within `threshold` of a polyline.
+
+    `coordinates` is a flat sequence of x0, y0, x1, y1, ... (such as an
+    `array('d')`) in local space. Each point is mapped to (x * scale.x +
+    offset.x, y * scale.y + offset.y) in the space of (x, y) and
+    `threshold`.
+
+    Rather than mapping every point, (x, y) is mapped once into local
+    space, where distances are measured with the metric the scale gives
+    them: the threshold then stretches along with the polyline when the
+    scale is not uniform. Axes scaled by 0 are handled too.
+
+    Long polylines are tested with NumPy when it is installed, a chunk of
+    segments at a time so that a hit near the start returns early. Both
+    implementations give the same results.
+
+    """
+    query = _local_query(x, y, threshold, scale, offset)
+    if query is None:
+        return False
+    if numpy is not None and len(coordinates) >= 2 * VECTORIZE_MIN_POINTS:
+        return _polyline_near_numpy(coordinates, *query)
+    return _polyline_near_python(coordinates, *query)
+
+
+def _local_query(x, y, threshold, scale, offset):
+    """Map a query into local space.
+
+    Return the local (x, y), the weights of each axis in squared distances
+    (the squared scale), and the squared distance left to reach, or None if
+    the polyline is out of reach whatever its points.
+
+    """
+    local = []
+    weights = []
+    remaining = threshold * threshold
+    for value, factor, shift in zip((x, y), scale, offset):
+        if factor:
+            local.append((value - shift) / float(factor))
+            weights.append(float(factor) * factor)
+        else:
+            # Every point lies at `shift` along this axis.
+            local.append(0.0)
+            weights.append(0.0)
+            remaining -= (value - shift) ** 2
+    if remaining < 0:
+        return None
+    return local[0], local[1], weights[0], weights[1], remaining
+
+
+def _polyline_near_python(coordinates, x, y, w_x, w_y, remaining):
+    x2, y2 = coordinates[0], coordinates[1]
+    # Iterate over all pairs of sequential points.
+    for i in xrange(2, len(coordinates), 2):
+        x1, y1 = x2, y2
+        x2, y2 = coordinates[i], coordinates[i + 1]
+        d_x, d_y = x2 - x1, y2 - y1
+
+        # Project (x, y) on the segment, clamping to its ends. Based on:
+        # http://local.wasp.uwa.edu.au/~pbourke/geometry/pointline/
+        length2 = w_x * d_x * d_x + w_y * d_y * d_y
+        if length2 == 0:
+            # The points are coincident (in the scaled space).
+            u = 0.0
+        else:
+            u = (w_x * (x - x1) * d_x + w_y * (y - y1) * d_y) / length2
+            u = min(max(u, 0.0), 1.0)
+        e_x, e_y = x1 + u * d_x - x, y1 + u * d_y - y
+
+        if w_x * e_x * e_x + w_y * e_y * e_y <= remaining:
+            return True
+    return False
+
+
+def _polyline_near_numpy(coordinates, x, y, w_x, w_y, remaining):
+    if isinstance(coordinates, numpy.ndarray):
+        points = coordinates.reshape(-1, 2)
+    else:
+        # Works without copying for array('d') and other buffers.
+        try:
+            points = numpy.frombuffer(coordinates, numpy.float64).reshape(-1, 2)
+        except (TypeError, ValueError):
+            points = numpy.asarray(coordinates, numpy.float64).reshape(-1, 2)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        for start in xrange(0, len(points) - 1, VECTORIZE_CHUNK):
+            # Each chunk shares its last point with the next one.
+            chunk = points[start:start + VECTORIZE_CHUNK + 1]
+            x1, y1 = chunk[:-1, 0], chunk[:-1, 1]
+            d_x, d_y = chunk[1:, 0] - x1, chunk[1:, 1] - y1
+
+            length2 = w_x * d_x * d_x + w_y * d_y * d_y
+            u = (w_x * (x - x1) * d_x + w_y * (y - y1) * d_y) / length2
+            u = numpy.where(length2 == 0, 0.0, numpy.clip(u, 0.0, 1.0))
+            e_x, e_y = x1 + u * d_x - x, y1 + u * d_y - y
+
+            if (w_x * e_x * e_x + w_y * e_y * e_y <= remaining).any():
+                return True
+    return False
+
+
+def _segment_distances(coordinates, first, last, indices):
+    """Return the distances from the points at `indices` to the segment
+    between points `first` and `last` (pure Python version).
+    """
+    x1, y1 = coordinates[2 * first], coordinates[2 * first + 1]
+    x2, y2 = coordinates[2 * last], coordinates[2 * last + 1]
+    d_x, d_y = x2 - x1, y2 - y1
+    length2 = d_x * d_x + d_y * d_y
+    distances = []
+    for i in indices:
+        x, y = coordinates[2 * i], coordinates[2 * i + 1]
+        if length2 == 0:
+            u = 0.0
+        else:
+            u = min(max(((x - x1) * d_x + (y - y1) * d_y) / length2, 0.0), 1.0)
+        distances.append(hypot(x1 + u * d_x - x, y1 + u * d_y - y))
+    return distances
+
+
+def simplify_polyline(coordinates, tolerance):
+    """Simplify a polyline with the Ramer-Douglas-Peucker algorithm.
+
+    `coordinates` is a flat sequence of x0, y0, x1, y1, ... Return an
+    `array('d')` with the same layout, holding a subset of the points such
+    that no removed point is farther than `tolerance` from the simplified
+    polyline. The first and last points are always kept.
+
+    """
+    count = len(coordinates) // 2
+    if count < 3 or tolerance <= 0:
+        return array('d', coordinates)
+
+    if numpy is not None:
+        points = numpy.asarray(coordinates, numpy.float64).reshape(-1, 2)
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    # Use an explicit stack: long strokes would exceed the recursion limit.
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        if numpy is not None and last - first > VECTORIZE_MIN_POINTS:
+            start, end = points[first], points[last]
+            direction = end - start
+            length2 = float(numpy.dot(direction, direction))
+            inner = points[first + 1:last]
+            if length2 == 0:
+                u = numpy.zeros(len(inner))
+            else:
+                u = numpy.clip(numpy.dot(inner - start, direction) / length2, 0.0, 1.0)
+            distances = numpy.hypot(*(start + u[:, None] * direction - inner).T)
+            farthest = int(distances.argmax())
+            distance = distances[farthest]
+        else:
+            distances = _segment_distances(coordinates, first, last, xrange(first + 1, last))
+            distance = max(distances)
+            farthest = distances.index(distance)
+        if distance > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    simplified = array('d')
+    for i in xrange(count):
+        if keep[i]:
+            simplified.extend((coordinates[2 * i], coordinates[2 * i + 1]))
+    return simplified
+
+
+def polyline_pyramid(coordinates, tolerance=0.5, levels=16):
+    """Return successively coarser simplifications of a polyline.
+
+    Return a list of (error, simplified) pairs by increasing error, where
+    every point of the polyline `coordinates` is within `error` of the
+    `array('d')` `simplified`. The first level is simplified within
+    `tolerance`, and every next level simplifies the previous one within
+    twice the tolerance, so that each has roughly half as many points. There
+    are at most `levels` levels, and the last one may have only two points.
+
+    """
+    pyramid = []
+    error = 0.0
+    current = coordinates
+    while len(current) > 4 and len(pyramid) < levels:
+        coarser = simplify_polyline(current, tolerance)
+        if len(coarser) < len(current):
+            # Removed points are within `tolerance` of a segment which is
+            # itself within `tolerance` of the coarser polyline, and so on.
+            error += tolerance
+            pyramid.append((error, coarser))
+            current = coarser
+        tolerance *= 2
+    return pyramid
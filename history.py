@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from geometry import Point
+
+
+def drawable_size(obj):
+    """Return a rough estimate of the memory held by a drawable, in bytes."""
+    size = 400
+    coordinates = getattr(obj, "coordinates", None)
+    if coordinates is not None:
+        size += 8 * len(coordinates)
+    return size
+
+
+class Command(object):
+
+    """An undoable change to an ObjectList.
+
+    Subclasses must implement `undo` and `redo`, and set `size` to an
+    estimate of the memory the command keeps alive.
+
+    """
+
+    size = 64
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+    def undo(self, objects):
+        raise NotImplementedError
+
+    def redo(self, objects):
+        raise NotImplementedError
+
+    def _take(self, objects, obj):
+        """Remove `obj` from `objects`, dropping it from the selection."""
+        # ObjectList drops removed objects from its selection.
+        objects.pop(objects.index(obj))
+        obj.selected = False
+
+
+class Create(Command):
+
+    """Creation of a drawable. Only a reference to it is stored."""
+
+    def __init__(self, obj, index):
+        self.obj = obj
+        self.index = index
+
+    def undo(self, objects):
+        self._take(objects, self.obj)
+
+    def redo(self, objects):
+        objects.insert(self.index, self.obj)
+
+
+class Delete(Command):
+
+    """Deletion of a drawable, which is kept along with its z-index."""
+
+    def __init__(self, obj, index):
+        self.obj = obj
+        self.index = index
+        self.size = drawable_size(obj)
+
+    def undo(self, objects):
+        objects.insert(self.index, self.obj)
+
+    def redo(self, objects):
+        self._take(objects, self.obj)
+
+
+class Move(Command):
+
+    """Translation of a drawable by (dx, dy), e.g. a whole MoveTool drag."""
+
+    def __init__(self, obj, dx, dy):
+        self.obj = obj
+        self.delta = Point(dx, dy)
+
+    def _translate(self, objects, delta):
+        self.obj.translation_vector += delta
+        self.obj.changed(transform_only=True)
+        objects.update(self.obj)
+
+    def undo(self, objects):
+        self._translate(objects, self.delta * -1)
+
+    def redo(self, objects):
+        self._translate(objects, self.delta)
+
+
+class Resize(Command):
+
+    """Scaling of a drawable, e.g. a whole ResizeTool drag."""
+
+    def __init__(self, obj, before, after):
+        self.obj = obj
+        self.before = Point._make(before)
+        self.after = Point._make(after)
+
+    def _scale(self, objects, resize_vector):
+        self.obj.resize_vector = resize_vector
+        self.obj.changed(transform_only=True)
+        objects.update(self.obj)
+
+    def undo(self, objects):
+        self._scale(objects, self.before)
+
+    def redo(self, objects):
+        self._scale(objects, self.after)
+
+
+class Batch(Command):
+
+    """Several commands carried out as one, e.g. moving a whole selection."""
+
+    def __init__(self, commands):
+        self.commands = list(commands)
+        self.size = sum(command.size for command in self.commands)
+
+    def __repr__(self):
+        return "<%s of %s>" % (self.__class__.__name__, len(self.commands))
+
+    def undo(self, objects):
+        for command in reversed(self.commands):
+            command.undo(objects)
+
+    def redo(self, objects):
+        for command in self.commands:
+            command.redo(objects)
+
+
+class History(object):
+
+    """Undo and redo stacks of commands, bounded by an estimate of their size.
+
+    When the commands kept exceed `budget` bytes, the oldest ones are
+    forgotten.
+
+    """
+
+    def __init__(self, budget):
+        """Create an empty history keeping at most about `budget` bytes."""
+        self.budget = budget
+        self.size = 0
+        self._undo = []
+        self._redo = []
+
+    def __repr__(self):
+        return "%s(undo=%s, redo=%s, size=%s)" % (
+            self.__class__.__name__, len(self._undo), len(self._redo), self.size)
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def push(self, command):
+        """Record a command which was just carried out."""
+        for undone in self._redo:
+            self.size -= undone.size
+        del self._redo[:]
+        self._undo.append(command)
+        self.size += command.size
+        self._evict()
+
+    def _evict(self):
+        # Keep at least the latest command, even if it does not fit.
+        evicted = 0
+        while self.size > self.budget and evicted < len(self._undo) - 1:
+            self.size -= self._undo[evicted].size
+            evicted += 1
+        del self._undo[:evicted]
+
+    def undo(self, objects):
+        """Undo the latest command. Return whether there was one."""
+        if not self._undo:
+            return False
+        command = self._undo.pop()
+        command.undo(objects)
+        self._redo.append(command)
+        return True
+
+    def redo(self, objects):
+        """Redo the latest undone command. Return whether there was one."""
+        if not self._redo:
+            return False
+        command = self._redo.pop()
+        command.redo(objects)
+        self._undo.append(command)
+        return True
+
+    def clear(self):
+        """Forget all commands."""
+        del self._undo[:]
+        del self._redo[:]
+        self.size = 0
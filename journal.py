@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+# Incremental autosave.
+#
+# The drawing is kept on disk as a checkpoint (a regular document, see
+# document.py) plus a journal of the changes made since that checkpoint.
+# The journal file is:
+#
+#   header   "RYKJ", CRC-32 of the checkpoint it applies to (uint32)
+#   frames   kind (uint8), payload size (uint32), payload CRC-32 (uint32),
+#            payload
+#
+# with the payloads:
+#
+#   CREATE     index (varint), a document holding the created drawable
+#   TRANSFORM  index (varint), translation x, y, resize x, y (float64)
+#   DELETE     index (varint)
+#
+# Indexes count finished drawables only, in z-order. TRANSFORM frames hold
+# absolute values, so replaying one more than needed is harmless.
+#
+# A checkpoint is written to a temporary file which then replaces the old
+# one, and only then is the journal restarted for the new checkpoint. A
+# journal whose header does not match the checkpoint on disk is stale (its
+# changes are all part of the checkpoint) and is ignored. A frame cut short
+# by a crash ends the replay.
+
+import os
+import struct
+import threading
+import weakref
+import zlib
+from Queue import Queue
+from StringIO import StringIO
+
+from document import (DocumentError, write_document, iter_document,
+                      iter_any_document, _encode_varint, CHUNK_SIZE)
+from geometry import Point
+
+MAGIC = "RYKJ"
+CREATE, TRANSFORM, DELETE = range(1, 4)
+
+_header = struct.Struct("<4sI")
+_frame = struct.Struct("<BII")
+_transform = struct.Struct("<4d")
+
+
+def file_crc(path):
+    """Return the CRC-32 of a file, or 0 if it does not exist."""
+    crc = 0
+    try:
+        checkpoint = open(path, "rb")
+    except IOError:
+        return 0
+    try:
+        while True:
+            data = checkpoint.read(CHUNK_SIZE)
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+    finally:
+        checkpoint.close()
+    return crc & 0xffffffff
+
+
+def _decode_varint(data, position):
+    result = shift = 0
+    while True:
+        byte = ord(data[position])
+        position += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, position
+        shift += 7
+
+
+class Journal(object):
+
+    """Keep a checkpoint and an append-only journal of changes on disk.
+
+    All file writes happen in a background thread, so recording a change or
+    requesting a checkpoint takes about the same time whatever the size of
+    the drawing.
+
+    Use `recover` to read back the drawing, then `attach` the ObjectList
+    whose changes should be recorded. Frames are on disk as soon as the
+    background thread has nothing else to write.
+
+    """
+
+    def __init__(self, checkpoint_path, journal_path, compact_every=1000, compress=True):
+        """Create a journal.
+
+        checkpoint_path -- path of the document holding the last checkpoint
+        journal_path -- path of the journal of changes since the checkpoint
+        compact_every -- number of journal frames after which a new
+                         checkpoint is written automatically
+        compress -- whether checkpoints are compressed
+        """
+        self.checkpoint_path = checkpoint_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.compress = compress
+        self.objects = None
+        self._journaled = weakref.WeakKeyDictionary()
+        self._frames = 0
+        self._queue = Queue()
+        self._journal_file = None
+        self._thread = threading.Thread(target=self._run, name="journal")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def recover(self):
+        """Return the drawables of the last checkpoint with the journal replayed.
+
+        Raise IOError if there is no checkpoint to start from.
+
+        """
+        checkpoint = open(self.checkpoint_path, "rb")
+        try:
+            objects = [obj for obj in iter_any_document(checkpoint) if obj.finished]
+        finally:
+            checkpoint.close()
+        self.replay(objects)
+        return objects
+
+    def replay(self, objects):
+        """Apply the journal to the list of finished drawables `objects`.
+
+        `objects` may be a plain list or an ObjectList, whose spatial index is
+        then kept up to date.
+
+        Return the number of frames applied.
+
+        """
+        try:
+            journal = open(self.journal_path, "rb")
+        except IOError:
+            return 0
+        try:
+            data = journal.read()
+        finally:
+            journal.close()
+
+        if len(data) < _header.size:
+            return 0
+        magic, crc = _header.unpack_from(data)
+        if magic != MAGIC or crc != file_crc(self.checkpoint_path):
+            # Stale journal: its changes are already in the checkpoint.
+            return 0
+
+        applied = 0
+        position = _header.size
+        while position + _frame.size <= len(data):
+            kind, size, crc = _frame.unpack_from(data, position)
+            payload = data[position + _frame.size:position + _frame.size + size]
+            if len(payload) < size or zlib.crc32(payload) & 0xffffffff != crc:
+                # Torn write.
+                break
+            position += _frame.size + size
+            try:
+                self._apply(objects, kind, payload)
+            except (DocumentError, IndexError, struct.error):
+                break
+            applied += 1
+        return applied
+
+    def _apply(self, objects, kind, payload):
+        index, offset = _decode_varint(payload, 0)
+        if kind == CREATE:
+            for obj in iter_document(StringIO(payload[offset:])):
+                objects.insert(index, obj)
+        elif kind == TRANSFORM:
+            t_x, t_y, r_x, r_y = _transform.unpack_from(payload, offset)
+            obj = objects[index]
+            obj.translation_vector = Point(t_x, t_y)
+            obj.resize_vector = Point(r_x, r_y)
+            obj.changed(transform_only=True)
+            if hasattr(objects, "update"):
+                objects.update(obj)
+        elif kind == DELETE:
+            objects.pop(index)
+
+    def attach(self, objects, recovered=True):
+        """Start recording the changes made to the ObjectList `objects`.
+
+        If `objects` came from `recover`, the journal keeps growing from where
+        it was, or is restarted if it does not belong to the checkpoint on
+        disk. Otherwise pass recovered=False, and `objects` replaces the
+        checkpoint on disk.
+
+        """
+        if self.objects is not None:
+            self.objects.listeners.remove(self._record)
+        self.objects = objects
+        objects.listeners.append(self._record)
+        self._journaled.clear()
+        for obj in objects:
+            if obj.finished:
+                self._journaled[obj] = True
+        self._frames = 0
+        self._queue.put(("open", None))
+        if not recovered:
+            self.checkpoint()
+
+    def _index(self, obj):
+        """Return the index of `obj` among the finished objects."""
+        # Objects under construction are always at the end of the list.
+        return self.objects.index(obj)
+
+    def _record(self, event, obj, index):
+        """Listener of ObjectList changes."""
+        if event == "reset":
+            self.checkpoint()
+            return
+        if not obj.finished:
+            return
+        if event == "insert":
+            self._put(CREATE, index, obj)
+        elif event == "update":
+            if obj not in self._journaled:
+                # Freshly finished.
+                self._put(CREATE, self._index(obj), obj)
+            else:
+                self._put(TRANSFORM, self._index(obj),
+                          tuple(obj.translation_vector & obj.resize_vector))
+        elif event == "remove":
+            self._journaled.pop(obj, None)
+            self._put(DELETE, index, None)
+        if event in ("insert", "update"):
+            self._journaled[obj] = True
+
+    def _put(self, kind, index, argument):
+        self._queue.put(("frame", (kind, index, argument)))
+        self._frames += 1
+        if self._frames >= self.compact_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write a new checkpoint in the background and restart the journal."""
+        snapshot = [obj for obj in self.objects if obj.finished]
+        self._frames = 0
+        self._queue.put(("checkpoint", snapshot))
+
+    def flush(self):
+        """Wait until everything recorded so far is on disk."""
+        if self._thread is None:
+            return
+        self._queue.put(("flush", None))
+        self._queue.join()
+
+    def close(self):
+        """Write pending changes and stop the background thread."""
+        if self._thread is not None:
+            self._queue.put(("stop", None))
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """Body of the background writer thread."""
+        while True:
+            action, argument = self._queue.get()
+            try:
+                if action == "frame":
+                    self._write_frame(*argument)
+                    if self._queue.empty():
+                        # Nothing else to write for now: make it survive a crash.
+                        self._sync()
+                elif action == "checkpoint":
+                    self._write_checkpoint(argument)
+                elif action == "open":
+                    self._open()
+                elif action == "flush":
+                    self._sync()
+                elif action == "stop":
+                    if self._journal_file:
+                        self._journal_file.close()
+                        self._journal_file = None
+                    return
+            except (IOError, OSError), error:
+                print "PyRysunek failed to autosave: %s" % error
+            finally:
+                self._queue.task_done()
+
+    def _sync(self):
+        """Push the frames written so far to the disk."""
+        if self._journal_file:
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+
+    def _open(self):
+        """Open the journal for appending, restarting it if stale."""
+        if self._journal_file:
+            self._journal_file.close()
+        crc = file_crc(self.checkpoint_path)
+        try:
+            journal = open(self.journal_path, "rb")
+            header = journal.read(_header.size)
+            journal.close()
+        except IOError:
+            header = ""
+        if header == _header.pack(MAGIC, crc):
+            self._journal_file = open(self.journal_path, "ab")
+        else:
+            self._restart(crc)
+
+    def _restart(self, crc):
+        """Start an empty journal for the checkpoint with the given CRC-32."""
+        if self._journal_file:
+            self._journal_file.close()
+        self._journal_file = open(self.journal_path, "wb")
+        self._journal_file.write(_header.pack(MAGIC, crc))
+        self._journal_file.flush()
+
+    def _write_frame(self, kind, index, argument):
+        payload = bytearray()
+        _encode_varint(index, payload)
+        if kind == CREATE:
+            document = StringIO()
+            write_document([argument], document, compress=False)
+            payload.extend(document.getvalue())
+        elif kind == TRANSFORM:
+            payload.extend(_transform.pack(*argument))
+        payload = str(payload)
+        self._journal_file.write(_frame.pack(kind, len(payload), zlib.crc32(payload) & 0xffffffff))
+        self._journal_file.write(payload)
+
+    def _write_checkpoint(self, snapshot):
+        temp_path = self.checkpoint_path + ".tmp"
+        temp_file = open(temp_path, "wb")
+        try:
+            write_document(snapshot, temp_file, compress=self.compress)
+        finally:
+            temp_file.close()
+        if os.name == "nt" and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        os.rename(temp_path, self.checkpoint_path)
+        self._restart(file_crc(self.checkpoint_path))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+
+FONT = GLUT_BITMAP_HELVETICA_10
+LINE_HEIGHT = 10
+CHAR_WIDTH = 6
+
+
+class PerformanceOverlay(object):
+
+    """A box showing recent performance counters, drawn next to the toolbar.
+
+    It shows the 50th, 90th and 99th percentiles of the frame time, and for
+    the last frame the number of objects drawn and culled, the GL calls,
+    vertices and texture uploads, and the time spent in mouse handlers.
+
+    GL calls are only counted while the overlay is shown.
+
+    """
+
+    def __init__(self, stats, x, y, height, color, modules):
+        """Create a hidden overlay.
+
+        stats -- the `Stats` to show
+        x, y -- top-left corner of the overlay
+        height -- height of the overlay, usually that of the toolbar
+        color -- background color
+        modules -- modules whose GL calls are counted
+        """
+        self.stats = stats
+        self.x, self.y = x, y
+        self.height = height
+        self.color = color
+        self.modules = modules
+        self.visible = False
+
+    def __repr__(self):
+        return "%s(visible=%s)" % (self.__class__.__name__, self.visible)
+
+    def toggle(self):
+        """Show or hide the overlay."""
+        self.visible = not self.visible
+        if self.visible:
+            self.stats.count_gl_calls(self.modules)
+        else:
+            self.stats.stop_counting_gl_calls()
+
+    def lines(self):
+        """Return the lines of text to show."""
+        stats = self.stats
+        return [
+            "frame ms  p50 %.1f  p90 %.1f  p99 %.1f" % tuple(
+                1000 * stats.percentile("frame", percent) for percent in (50, 90, 99)),
+            "objects  drawn %d  culled %d" % (
+                stats.last("objects_drawn"), stats.last("objects_culled")),
+            "GL calls %d  vertices %d  uploads %d" % (
+                stats.last("gl_calls"), stats.last("vertices"), stats.last("texture_uploads")),
+            "mouse %.2f ms  motion %.2f ms" % (
+                1000 * stats.last("mouse"), 1000 * stats.last("motion")),
+        ]
+
+    def draw(self):
+        """Draw the overlay if it is visible."""
+        if not self.visible:
+            return
+        lines = self.lines()
+        padding = (self.height - LINE_HEIGHT * len(lines)) / 2
+        width = CHAR_WIDTH * max(len(line) for line in lines) + 2 * padding
+
+        glColor4fv(self.color)
+        glRectf(self.x, self.y, self.x + width, self.y + self.height)
+        glColor4f(0.0, 0.0, 0.0, 1.0)
+        for i, line in enumerate(lines):
+            # The raster position is the baseline of the text.
+            glRasterPos2f(self.x + padding, self.y + padding + LINE_HEIGHT * (i + 1) - 2)
+            for char in line:
+                glutBitmapCharacter(FONT, ord(char))
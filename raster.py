@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+
+# Software rendering of drawings, for exporting them without OpenGL.
+#
+# Drawables are rasterized the way `Drawable.draw` draws them with OpenGL:
+# the outline in the line color, then the fill on top of it in the fill
+# color, both after `resize_vector` and `translation_vector` are applied.
+# Shapes cover the pixels whose centers they contain, free form lines are
+# one pixel wide whatever the scale, and colors are not blended.
+#
+# Images are rendered a tile at a time, so that only one tile of floating
+# point work is alive at once. `export_png` compresses each row of tiles
+# into the file as soon as it is rendered, and `export_png_tiles` writes
+# each tile to its own file, so both handle large images in bounded memory.
+
+import os
+import struct
+import zlib
+from math import ceil, floor
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import Image
+except ImportError:
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+
+from drawables import Rectangle, Ellipse, FreeForm
+from spatial import SpatialGrid
+
+DEFAULT_TILE_SIZE = 512
+
+
+class SoftwareRenderer(object):
+
+    """Rasterize drawables into NumPy arrays of RGB pixels.
+
+    An image shows the world with its top-left pixel corner at `origin`,
+    with `scale` pixels per world unit.
+
+    Requires NumPy.
+
+    """
+
+    def __init__(self, objects, background=(1.0, 1.0, 1.0, 1.0), cell_size=128):
+        """Prepare to render `objects`, a sequence of drawables in z-order.
+
+        Optional arguments:
+        background -- color of the pixels not covered by any drawable
+        cell_size -- cell size of the spatial index used to find the
+                     drawables in each tile
+        """
+        if numpy is None:
+            raise ImportError("SoftwareRenderer requires NumPy")
+        self.objects = list(objects)
+        self.background = _rgb(background)
+        self._index = SpatialGrid(cell_size)
+        for z, obj in enumerate(self.objects):
+            self._index.insert(z, obj.bounding_box)
+
+    @property
+    def bounds(self):
+        """Return the world-space (x1, y1, x2, y2) box enclosing all drawables,
+        or None if there are none.
+        """
+        boxes = [obj.bounding_box for obj in self.objects]
+        if not boxes:
+            return None
+        return (min(box[0] for box in boxes), min(box[1] for box in boxes),
+                max(box[2] for box in boxes), max(box[3] for box in boxes))
+
+    def render(self, x, y, width, height, origin=(0.0, 0.0), scale=1.0):
+        """Return the `width` x `height` pixels at (x, y) of the image, as a
+        (height, width, 3) array of uint8.
+        """
+        pixels = numpy.empty((height, width, 3), numpy.uint8)
+        pixels[:] = self.background
+        tile = _Tile(pixels, x, y, origin, scale)
+        for z in sorted(self._index.query_rect(tile.world_rect)):
+            obj = self.objects[z]
+            if isinstance(obj, FreeForm):
+                tile.line_strip(obj, obj.line_color)
+            elif isinstance(obj, Ellipse):
+                tile.ellipse(obj, 0.0, obj.line_color)
+                tile.ellipse(obj, 1.0, obj.fill_color)
+            elif isinstance(obj, Rectangle):
+                tile.rectangle(obj, 0.0, obj.line_color)
+                tile.rectangle(obj, 1.0, obj.fill_color)
+        return pixels
+
+    def tiles(self, width, height, origin=(0.0, 0.0), scale=1.0, tile_size=DEFAULT_TILE_SIZE):
+        """Yield (x, y, pixels) for the tiles of a `width` x `height` image,
+        row by row.
+        """
+        for y in xrange(0, height, tile_size):
+            for x in xrange(0, width, tile_size):
+                yield x, y, self.render(x, y, min(tile_size, width - x),
+                                        min(tile_size, height - y), origin, scale)
+
+
+class _Tile(object):
+
+    """The pixels of a tile and the rasterization of shapes into them."""
+
+    def __init__(self, pixels, x, y, origin, scale):
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+        self.x, self.y = x, y
+        self.scale = float(scale)
+        # World coordinates of the top-left corner of the tile.
+        self.left = origin[0] + x / self.scale
+        self.top = origin[1] + y / self.scale
+        self.world_rect = (self.left, self.top,
+                           self.left + self.width / self.scale,
+                           self.top + self.height / self.scale)
+
+    def _centers(self, obj):
+        """Return the pixel window covering the bounding box of `obj`, and the
+        local coordinates of its pixel centers, or None if it is empty.
+        """
+        x1, y1, x2, y2 = obj.bounding_box
+        i1 = max(int(floor((x1 - self.left) * self.scale)), 0)
+        i2 = min(int(ceil((x2 - self.left) * self.scale)) + 1, self.width)
+        j1 = max(int(floor((y1 - self.top) * self.scale)), 0)
+        j2 = min(int(ceil((y2 - self.top) * self.scale)) + 1, self.height)
+        resize_x, resize_y = obj.resize_vector
+        if i1 >= i2 or j1 >= j2 or not resize_x or not resize_y:
+            # Nothing in this tile, or a shape without area.
+            return None
+        world_x = self.left + (numpy.arange(i1, i2) + 0.5) / self.scale
+        world_y = self.top + (numpy.arange(j1, j2) + 0.5) / self.scale
+        local_x = (world_x - obj.translation_vector.x) / resize_x
+        local_y = (world_y - obj.translation_vector.y) / resize_y
+        return (slice(j1, j2), slice(i1, i2)), local_x[numpy.newaxis, :], local_y[:, numpy.newaxis]
+
+    def rectangle(self, obj, radial_reduction, color):
+        """Fill the rectangle of `obj` as `Rectangle._draw_rectangle` does."""
+        window = self._centers(obj)
+        if window is None:
+            return
+        window, x, y = window
+        x1, y1, x2, y2 = obj.corner1 & obj.corner2
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        # Like glRectf, a rectangle contracted past its center is drawn
+        # between its swapped corners.
+        x1, x2 = sorted((x1 + radial_reduction, x2 - radial_reduction))
+        y1, y2 = sorted((y1 + radial_reduction, y2 - radial_reduction))
+        inside = (x1 <= x) & (x <= x2) & (y1 <= y) & (y <= y2)
+        self.pixels[window][inside] = _rgb(color)
+
+    def ellipse(self, obj, radial_reduction, color):
+        """Fill the ellipse of `obj` as `Ellipse._draw_ellipse` does."""
+        window = self._centers(obj)
+        if window is None:
+            return
+        window, x, y = window
+        d_x, d_y = map(lambda v: float(abs(v)), (obj.corner1 - obj.corner2))
+        d_x = d_x or 1.0
+        radius_x = abs(d_x / 2.0 - radial_reduction)
+        radius_y = radius_x * d_y / d_x
+        if not radius_x or not radius_y:
+            return
+        c_x, c_y = obj.centroid
+        inside = ((x - c_x) / radius_x) ** 2 + ((y - c_y) / radius_y) ** 2 <= 1.0
+        self.pixels[window][inside] = _rgb(color)
+
+    def line_strip(self, obj, color):
+        """Draw the one pixel wide polyline of a free form."""
+        points = numpy.array(obj.coordinates, numpy.float64).reshape(-1, 2)
+        # To pixel coordinates in the tile.
+        points *= obj.resize_vector
+        points += obj.translation_vector
+        points -= (self.left, self.top)
+        points *= self.scale
+        if len(points) == 1:
+            starts = ends = points
+        else:
+            starts, ends = points[:-1], points[1:]
+        starts, ends = self._clip(starts, ends)
+        if not len(starts):
+            return
+
+        # Step along each segment at most a pixel at a time.
+        delta = ends - starts
+        steps = numpy.ceil(numpy.abs(delta).max(axis=1)).astype(int) + 1
+        segment = numpy.repeat(numpy.arange(len(steps)), steps)
+        step = numpy.arange(steps.sum()) - numpy.repeat(steps.cumsum() - steps, steps)
+        t = step / numpy.maximum(steps - 1, 1).astype(numpy.float64)[segment]
+        samples = starts[segment] + t[:, numpy.newaxis] * delta[segment]
+
+        columns = numpy.floor(samples[:, 0]).astype(int)
+        rows = numpy.floor(samples[:, 1]).astype(int)
+        keep = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+        self.pixels[rows[keep], columns[keep]] = _rgb(color)
+
+    def _clip(self, starts, ends):
+        """Clip segments, in pixel coordinates, to the tile plus a pixel of
+        margin (Liang-Barsky). Return the starts and ends of what is left.
+        """
+        t0 = numpy.zeros(len(starts))
+        t1 = numpy.ones(len(starts))
+        keep = numpy.ones(len(starts), bool)
+        delta = ends - starts
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            for axis, size in ((0, self.width), (1, self.height)):
+                start, d = starts[:, axis], delta[:, axis]
+                low = (-1.0 - start) / d
+                high = (size + 1.0 - start) / d
+                moving = d != 0
+                t0 = numpy.where(moving, numpy.maximum(t0, numpy.minimum(low, high)), t0)
+                t1 = numpy.where(moving, numpy.minimum(t1, numpy.maximum(low, high)), t1)
+                keep &= moving | ((start >= -1.0) & (start <= size + 1.0))
+        keep &= t0 <= t1
+        starts, delta, t0, t1 = starts[keep], delta[keep], t0[keep], t1[keep]
+        return (starts + t0[:, numpy.newaxis] * delta,
+                starts + t1[:, numpy.newaxis] * delta)
+
+
+def _rgb(color):
+    """Return the uint8 RGB values of a 4-value color tuple."""
+    return [int(round(min(max(c, 0.0), 1.0) * 255)) for c in color[:3]]
+
+
+def _layout(renderer, width, height, scale, origin):
+    """Fill in whichever of the image size, scale and origin are None, so
+    that the image shows all of the drawables.
+    """
+    bounds = renderer.bounds or (0.0, 0.0, 1.0, 1.0)
+    bounds_width = max(bounds[2] - bounds[0], 1e-9)
+    bounds_height = max(bounds[3] - bounds[1], 1e-9)
+    if scale is None:
+        if width is None and height is None:
+            scale = 1.0
+        else:
+            scale = min(float(width or height) / bounds_width,
+                        float(height or width) / bounds_height)
+    if origin is None:
+        origin = bounds[:2]
+    if width is None:
+        width = int(ceil(bounds_width * scale))
+    if height is None:
+        height = int(ceil(bounds_height * scale))
+    return max(width, 1), max(height, 1), scale, origin
+
+
+def _write_chunk(output, kind, data):
+    """Write a PNG chunk of type `kind`."""
+    output.write(struct.pack(">I", len(data)))
+    output.write(kind)
+    output.write(data)
+    output.write(struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+
+def export_png(objects, path, width=None, height=None, scale=None, origin=None,
+               background=(1.0, 1.0, 1.0, 1.0), tile_size=DEFAULT_TILE_SIZE):
+    """Render drawables into a PNG file at `path`, without OpenGL.
+
+    By default the image fits all of the drawables at one pixel per world
+    unit. With `width` and/or `height`, the drawing is scaled to fit them,
+    e.g. for thumbnails. Give `scale` (pixels per world unit) and `origin`
+    (world coordinates of the top-left corner) to choose what is shown.
+
+    The image is written a row of tiles at a time, so that only `tile_size`
+    rows of pixels are held in memory at once.
+
+    Requires NumPy.
+
+    """
+    renderer = SoftwareRenderer(objects, background)
+    width, height, scale, origin = _layout(renderer, width, height, scale, origin)
+    compressor = zlib.compressobj()
+    with open(path, "wb") as output:
+        output.write("\x89PNG\r\n\x1a\n")
+        # 8 bits per channel, RGB, no interlacing.
+        _write_chunk(output, "IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        band = None
+        for x, y, pixels in renderer.tiles(width, height, origin, scale, tile_size):
+            rows = pixels.shape[0]
+            if x == 0:
+                # Each row starts with its filter type, 0 for none.
+                band = numpy.zeros((rows, 1 + 3 * width), numpy.uint8)
+            band[:, 1 + 3 * x:1 + 3 * (x + pixels.shape[1])] = pixels.reshape(rows, -1)
+            if x + pixels.shape[1] == width:
+                data = compressor.compress(band.tostring())
+                if data:
+                    _write_chunk(output, "IDAT", data)
+        _write_chunk(output, "IDAT", compressor.flush())
+        _write_chunk(output, "IEND", "")
+
+
+def export_png_tiles(objects, directory, width=None, height=None, scale=None, origin=None,
+                     background=(1.0, 1.0, 1.0, 1.0), tile_size=DEFAULT_TILE_SIZE):
+    """Render drawables into PNG tiles of `tile_size` pixels in `directory`.
+
+    The image is laid out as in `export_png`, and tiles are named after
+    their row and column, such as "0_3.png". Only one tile is held in memory
+    at a time. Return the paths of the files written.
+
+    Requires NumPy and PIL.
+
+    """
+    if Image is None:
+        raise ImportError("PNG export requires PIL")
+    renderer = SoftwareRenderer(objects, background)
+    width, height, scale, origin = _layout(renderer, width, height, scale, origin)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    paths = []
+    for x, y, pixels in renderer.tiles(width, height, origin, scale, tile_size):
+        path = os.path.join(directory, "%d_%d.png" % (y // tile_size, x // tile_size))
+        Image.fromarray(pixels, "RGB").save(path, "PNG")
+        paths.append(path)
+    return paths
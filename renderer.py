@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+import ctypes
+import weakref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+from OpenGL.GL import *
+
+from drawables import DEFAULT_DETAIL, Rectangle, Ellipse, FreeForm
+import tessellation
+
+
+class _Range(object):
+
+    """Where the vertices of one drawable are kept in the shared buffer."""
+
+    __slots__ = ("first", "capacity", "count", "mode", "version")
+
+    def __init__(self, first, capacity):
+        self.first = first
+        self.capacity = capacity
+        self.count = 0
+        self.mode = None
+        self.version = None
+
+
+class BatchRenderer(object):
+
+    """Draw finished drawables from one persistent vertex buffer object.
+
+    Every finished drawable is converted into world-space triangles
+    (rectangles and ellipses) or line segments (free forms), interleaved
+    with their color, and kept in its own range of a shared buffer. A range
+    is only rewritten, and uploaded, when the drawable's `revision` changes
+    or when the zoom calls for a different tessellation or level of detail.
+    Panning and editing a single object thus upload nothing but the
+    drawables which changed or came into view for the first time.
+
+    Vertices which no longer fit their range get a new one at the end of
+    the buffer. When the buffer is full, it is repacked if most of it is
+    unused, and grown otherwise; either way it is then uploaded as a whole.
+
+    Each frame draws the ranges of the given drawables in z-order, with one
+    `glMultiDrawArrays` call per run of drawables of the same primitive
+    type. Objects under construction and selection overlays are still drawn
+    in immediate mode on top of the batched scene.
+
+    Requires NumPy.
+
+    """
+
+    # Floats per vertex: x, y, then r, g, b, a.
+    FLOATS = 6
+    STRIDE = FLOATS * 4
+    # Number of vertices the buffer has room for at first.
+    INITIAL_CAPACITY = 4096
+
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("BatchRenderer requires NumPy")
+        # Ranges of drawables which may still be drawn; those of deleted
+        # drawables go away with them, their space being reclaimed by the
+        # next repacking.
+        self._ranges = weakref.WeakKeyDictionary()
+        self._data = numpy.zeros((self.INITIAL_CAPACITY, self.FLOATS), numpy.float32)
+        self._used = 0
+        self._buffer = None
+        # Whether the whole buffer has to be uploaded, or else the
+        # (first, end) vertex ranges which have to be.
+        self._reallocated = True
+        self._dirty = []
+        self._detail = DEFAULT_DETAIL
+
+    def draw(self, objects, detail=DEFAULT_DETAIL):
+        """Draw all `objects`, keeping their z-order.
+
+        `detail` tells how finely to draw, as for `Drawable.draw`.
+
+        """
+        self._detail = detail
+        finished = [obj for obj in objects if obj.finished]
+        for obj in finished:
+            version = self._version(obj)
+            vertex_range = self._ranges.get(obj)
+            if vertex_range is None or vertex_range.version != version:
+                self._store(obj, vertex_range, version)
+
+        # Contiguous ranges of successive drawables are drawn as one.
+        runs = []
+        for obj in finished:
+            vertex_range = self._ranges[obj]
+            if not vertex_range.count:
+                continue
+            if runs and runs[-1][0] == vertex_range.mode:
+                mode, firsts, counts = runs[-1]
+                if firsts[-1] + counts[-1] == vertex_range.first:
+                    counts[-1] += vertex_range.count
+                else:
+                    firsts.append(vertex_range.first)
+                    counts.append(vertex_range.count)
+            else:
+                runs.append((vertex_range.mode, [vertex_range.first], [vertex_range.count]))
+
+        if self._buffer is None:
+            self._buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self._buffer)
+        self._upload()
+        if runs:
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_COLOR_ARRAY)
+            glVertexPointer(2, GL_FLOAT, self.STRIDE, ctypes.c_void_p(0))
+            glColorPointer(4, GL_FLOAT, self.STRIDE, ctypes.c_void_p(2 * 4))
+            for mode, firsts, counts in runs:
+                glMultiDrawArrays(mode, numpy.array(firsts, numpy.int32),
+                                  numpy.array(counts, numpy.int32), len(firsts))
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        for obj in objects:
+            if not obj.finished:
+                obj.draw(detail)
+            elif obj.selected:
+                obj.draw_selection()
+
+    def _store(self, obj, vertex_range, version):
+        """Convert `obj` into its range of the buffer, moving it if needed."""
+        mode, vertices = self._vertices(obj)
+        count = len(vertices)
+        if vertex_range is None or count > vertex_range.capacity:
+            if vertex_range is not None:
+                # Its old vertices need not be kept by a repacking.
+                vertex_range.count = 0
+            vertex_range = _Range(self._allocate(count), count)
+            self._ranges[obj] = vertex_range
+        vertex_range.count = count
+        vertex_range.mode = mode
+        vertex_range.version = version
+        first = vertex_range.first
+        self._data[first:first + count] = vertices
+        if count:
+            self._dirty.append((first, first + count))
+
+    def _allocate(self, count):
+        """Return the first of `count` free vertices at the end of the buffer."""
+        if self._used + count > len(self._data):
+            live = sum(r.count for r in self._ranges.values())
+            capacity = len(self._data)
+            while live + count > capacity // 2:
+                capacity *= 2
+            self._repack(capacity)
+        first = self._used
+        self._used += count
+        return first
+
+    def _repack(self, capacity):
+        """Move the ranges in use next to each other, in a buffer of
+        `capacity` vertices which is then uploaded as a whole.
+        """
+        data = numpy.zeros((capacity, self.FLOATS), numpy.float32)
+        used = 0
+        for vertex_range in self._ranges.values():
+            first, count = vertex_range.first, vertex_range.count
+            data[used:used + count] = self._data[first:first + count]
+            vertex_range.first, vertex_range.capacity = used, count
+            used += count
+        self._data, self._used = data, used
+        self._reallocated = True
+        self._dirty = []
+
+    def _upload(self):
+        """Upload what changed in the buffer since the last frame."""
+        if self._reallocated:
+            glBufferData(GL_ARRAY_BUFFER, self._data.nbytes, self._data, GL_DYNAMIC_DRAW)
+            self._reallocated = False
+        else:
+            self._dirty.sort()
+            merged = []
+            for first, end in self._dirty:
+                if merged and first <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([first, end])
+            for first, end in merged:
+                glBufferSubData(GL_ARRAY_BUFFER, first * self.STRIDE,
+                                (end - first) * self.STRIDE, self._data[first:end])
+        self._dirty = []
+
+    def _vertices(self, obj):
+        """Return the primitive type of `obj` and its interleaved vertices."""
+        mode = GL_TRIANGLES
+        chunks = []
+        for mode, vertices, color in self._convert(obj):
+            if len(vertices):
+                chunk = numpy.empty((len(vertices), self.FLOATS), numpy.float32)
+                chunk[:, :2] = vertices
+                chunk[:, 2:] = color
+                chunks.append(chunk)
+        if not chunks:
+            return mode, numpy.zeros((0, self.FLOATS), numpy.float32)
+        return mode, numpy.concatenate(chunks)
+
+    def _version(self, obj):
+        """Return what the cached chunks of `obj` depend on."""
+        if isinstance(obj, Ellipse):
+            return obj.revision, self._segments(obj)
+        if isinstance(obj, FreeForm):
+            return obj.revision, len(obj.drawn_coordinates(self._detail))
+        return obj.revision
+
+    def _ellipse_radii(self, obj, radial_reduction):
+        # Same shape as `Ellipse._draw_ellipse`.
+        d_x, d_y = map(lambda v: float(abs(v)), (obj.corner1 - obj.corner2))
+        d_x = d_x or 1.0
+        radius_x = d_x / 2.0 - radial_reduction
+        return radius_x, radius_x * d_y / d_x
+
+    def _segments(self, obj):
+        radius_x, radius_y = self._ellipse_radii(obj, 0.0)
+        on_screen = max(abs(radius_x * obj.resize_vector.x),
+                        abs(radius_y * obj.resize_vector.y))
+        return tessellation.segments_for(on_screen * self._detail.pixel_scale)
+
+    def _convert(self, obj):
+        """Yield (mode, world-space vertices, color) chunks for `obj`.
+
+        Outlines come before fills, as in `Drawable.draw`.
+
+        """
+        if isinstance(obj, Rectangle):
+            yield GL_TRIANGLES, self._rectangle(obj, 0.0), obj.line_color
+            yield GL_TRIANGLES, self._rectangle(obj, 1.0), obj.fill_color
+        elif isinstance(obj, Ellipse):
+            yield GL_TRIANGLES, self._ellipse(obj, 0.0), obj.line_color
+            yield GL_TRIANGLES, self._ellipse(obj, 1.0), obj.fill_color
+        elif isinstance(obj, FreeForm):
+            yield GL_LINES, self._free_form(obj), obj.line_color
+
+    def _to_world(self, obj, local):
+        """Apply the `resize_vector` and `translation_vector` of `obj`."""
+        world = local * numpy.array(obj.resize_vector, numpy.float64)
+        world += numpy.array(obj.translation_vector, numpy.float64)
+        return world.astype(numpy.float32)
+
+    def _rectangle(self, obj, radial_reduction):
+        x1, y1, x2, y2 = obj.corner1 & obj.corner2
+        x1, x2 = sorted((x1, x2))
+        y1, y2 = sorted((y1, y2))
+        x1 += radial_reduction
+        x2 -= radial_reduction
+        y1 += radial_reduction
+        y2 -= radial_reduction
+        local = numpy.array([(x1, y1), (x2, y1), (x2, y2),
+                             (x1, y1), (x2, y2), (x1, y2)], numpy.float64)
+        return self._to_world(obj, local)
+
+    def _ellipse(self, obj, radial_reduction):
+        radius_x, radius_y = self._ellipse_radii(obj, radial_reduction)
+        c_x, c_y = obj.centroid
+
+        segments = self._segments(obj)
+        rim = numpy.array(tessellation.unit_circle(segments), numpy.float64)
+        rim *= (radius_x, radius_y)
+        rim += (c_x, c_y)
+
+        # Turn the fan into independent triangles.
+        local = numpy.empty((segments, 3, 2), numpy.float64)
+        local[:, 0] = (c_x, c_y)
+        local[:, 1] = rim[:-1]
+        local[:, 2] = rim[1:]
+        return self._to_world(obj, local.reshape(-1, 2))
+
+    def _free_form(self, obj):
+        points = numpy.array(obj.drawn_coordinates(self._detail), numpy.float64).reshape(-1, 2)
+        if len(points) < 2:
+            return numpy.zeros((0, 2), numpy.float32)
+        # Turn the strip into independent segments.
+        local = numpy.empty((len(points) - 1, 2, 2), numpy.float64)
+        local[:, 0] = points[:-1]
+        local[:, 1] = points[1:]
+        return self._to_world(obj, local.reshape(-1, 2))
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Command line tools for PyRysunek documents.
+#
+# Usage:
+#   python rykutil.py inspect [--json] FILE...
+#   python rykutil.py convert [--uncompressed] [--quantum Q] -o DIR FILE...
+#   python rykutil.py simplify [--tolerance T] -o DIR FILE...
+#   python rykutil.py export [--format png|svg] [--width W] [--height H]
+#                            [--scale S] -o DIR FILE...
+#
+# Files are processed in parallel by a pool of worker processes (see --jobs).
+# Workers read documents a drawable at a time where they can, and are
+# replaced after --max-tasks files so that their memory use stays bounded.
+# A line is printed per file, and --report writes all of them as JSON. The
+# exit status is 1 if any file failed.
+#
+# Documents in the legacy pickle format can be read, and `convert` turns
+# them into current documents. Nothing here needs a display: GLUT is never
+# imported.
+
+import json
+import multiprocessing
+import os
+import sys
+
+from document import (DocumentError, MAGIC, FLAG_COMPRESSED, DEFAULT_QUANTUM,
+                      write_document, iter_any_document, _header)
+from drawables import FreeForm
+from geometry import simplify_polyline
+
+COMMANDS = ("inspect", "convert", "simplify", "export")
+
+
+def _union(bounds, box):
+    """Return the box enclosing `bounds` (which may be None) and `box`."""
+    if bounds is None:
+        return list(box)
+    return [min(bounds[0], box[0]), min(bounds[1], box[1]),
+            max(bounds[2], box[2]), max(bounds[3], box[3])]
+
+
+def _read_format(fileobj):
+    """Describe the format of a document, leaving `fileobj` where it was."""
+    start = fileobj.tell()
+    header = fileobj.read(_header.size)
+    fileobj.seek(start)
+    if len(header) == _header.size and header.startswith(MAGIC):
+        magic, version, flags, quantum = _header.unpack(header)
+        return {"format": "ryk", "version": version, "quantum": quantum,
+                "compressed": bool(flags & FLAG_COMPRESSED)}
+    return {"format": "pickle"}
+
+
+def _iter_file(path):
+    """Yield the drawables of the document at `path`, then close it."""
+    document = open(path, "rb")
+    try:
+        for obj in iter_any_document(document):
+            yield obj
+    finally:
+        document.close()
+
+
+def inspect_document(path):
+    """Return a dictionary describing the document at `path`: its format, and
+    the number, types, extent and total points of its drawables.
+    """
+    document = open(path, "rb")
+    try:
+        info = _read_format(document)
+        info.update(objects=0, finished=0, types={}, points=0, extent=None)
+        for obj in iter_any_document(document):
+            info["objects"] += 1
+            info["finished"] += bool(obj.finished)
+            name = obj.__class__.__name__
+            info["types"][name] = info["types"].get(name, 0) + 1
+            if isinstance(obj, FreeForm):
+                info["points"] += len(obj.coordinates) // 2
+            info["extent"] = _union(info["extent"], obj.bounding_box)
+    finally:
+        document.close()
+    return info
+
+
+def _write(path, objects, compress=True, quantum=DEFAULT_QUANTUM):
+    """Write drawables to a document at `path`, removing it if that fails."""
+    output = open(path, "wb")
+    try:
+        write_document(objects, output, compress=compress, quantum=quantum)
+    except:
+        output.close()
+        os.remove(path)
+        raise
+    output.close()
+
+
+def convert_document(path, output, compress=True, quantum=DEFAULT_QUANTUM):
+    """Rewrite the document at `path`, of any format, as a current document."""
+    counter = [0]
+    def objects():
+        for obj in _iter_file(path):
+            counter[0] += 1
+            yield obj
+    _write(output, objects(), compress, quantum)
+    return {"objects": counter[0]}
+
+
+def simplify_document(path, output, tolerance):
+    """Rewrite the document at `path` with its free forms simplified within
+    `tolerance`.
+    """
+    points = [0, 0]
+    def objects():
+        for obj in _iter_file(path):
+            if isinstance(obj, FreeForm):
+                points[0] += len(obj.coordinates) // 2
+                obj.coordinates = simplify_polyline(obj.coordinates, tolerance)
+                points[1] += len(obj.coordinates) // 2
+            yield obj
+    _write(output, objects())
+    return {"points_before": points[0], "points_after": points[1]}
+
+
+def export_document(path, output, format="png", width=None, height=None, scale=None):
+    """Export the document at `path` as a PNG or SVG image."""
+    if format == "svg":
+        from svg import export_svg
+        # Find the view box in a first pass, so that the second one can
+        # stream the drawables to the file.
+        bounds = None
+        for obj in _iter_file(path):
+            bounds = _union(bounds, obj.bounding_box)
+        export_svg(_iter_file(path), output, bounds=bounds)
+    else:
+        from raster import export_png
+        # The pixels are streamed to the file by bands of tiles, but the
+        # drawables are all kept, indexed, to find those in each tile.
+        export_png(list(_iter_file(path)), output, width, height, scale)
+    return {}
+
+
+def _output_path(path, directory, extension):
+    """Return where the result for `path` goes, refusing to overwrite it."""
+    name = os.path.splitext(os.path.basename(path))[0] + extension
+    output = os.path.join(directory, name)
+    if os.path.abspath(output) == os.path.abspath(path):
+        raise ValueError("%s would overwrite its input" % output)
+    return output
+
+
+def run_task(task):
+    """Worker body: carry out one command on one file, and report on it.
+
+    `task` is a (command, path, options) tuple. Return a dictionary with the
+    "file", whether it went "ok", and either the results or the "error".
+
+    """
+    command, path, options = task
+    report = {"file": path, "ok": False}
+    try:
+        if command == "inspect":
+            report.update(inspect_document(path))
+        else:
+            directory = options["output_dir"]
+            if command == "convert":
+                output = _output_path(path, directory, ".ryk")
+                report.update(convert_document(path, output, options["compress"],
+                                               options["quantum"]))
+            elif command == "simplify":
+                output = _output_path(path, directory, ".ryk")
+                report.update(simplify_document(path, output, options["tolerance"]))
+            elif command == "export":
+                output = _output_path(path, directory, "." + options["format"])
+                report.update(export_document(path, output, options["format"],
+                                              options["width"], options["height"],
+                                              options["scale"]))
+            report["output"] = output
+        report["ok"] = True
+    except (IOError, OSError, ValueError, ImportError, DocumentError), error:
+        report["error"] = "%s: %s" % (error.__class__.__name__, error)
+    except Exception, error:
+        # A damaged document may break the readers in unexpected ways.
+        report["error"] = "unexpected %s: %s" % (error.__class__.__name__, error)
+    return report
+
+
+def _describe(report):
+    """Return a line of text summarizing a report."""
+    if not report["ok"]:
+        return "%s: FAILED %s" % (report["file"], report["error"])
+    if "types" in report:
+        types = ", ".join("%s %s" % (count, name) for name, count in sorted(report["types"].items()))
+        extent = report["extent"]
+        extent = "(%.1f, %.1f)-(%.1f, %.1f)" % tuple(extent) if extent else "empty"
+        return "%s: %s, %s objects (%s), %s points, extent %s" % (
+            report["file"], report["format"], report["objects"], types or "none",
+            report["points"], extent)
+    details = ", ".join("%s %s" % (key.replace("_", " "), value)
+                        for key, value in sorted(report.items())
+                        if key not in ("file", "ok", "output"))
+    return "%s -> %s%s" % (report["file"], report["output"], details and " (%s)" % details)
+
+
+def process(command, paths, options, jobs=None, max_tasks=50):
+    """Carry out `command` on every file in `paths` with a pool of `jobs`
+    worker processes, yielding their reports in order.
+    """
+    tasks = [(command, path, options) for path in paths]
+    if jobs == 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield run_task(task)
+        return
+    pool = multiprocessing.Pool(jobs, maxtasksperchild=max_tasks)
+    try:
+        for report in pool.imap(run_task, tasks):
+            yield report
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect, convert and export PyRysunek documents.")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("files", nargs="+", metavar="FILE")
+    parser.add_argument("-o", "--output-dir", help="where to write the results")
+    parser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: one per CPU)")
+    parser.add_argument("--max-tasks", type=int, default=50,
+                        help="files a worker processes before it is replaced (default: %(default)s)")
+    parser.add_argument("--report", help="write the per-file reports to this file, as JSON")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    parser.add_argument("--uncompressed", action="store_true", help="convert: do not compress")
+    parser.add_argument("--quantum", type=int, default=DEFAULT_QUANTUM,
+                        help="convert: free form coordinate units per pixel (default: %(default)s)")
+    parser.add_argument("--tolerance", type=float, default=1.0,
+                        help="simplify: maximum distance to the original strokes (default: %(default)s)")
+    parser.add_argument("--format", choices=("png", "svg"), default="png", help="export: image format")
+    parser.add_argument("--width", type=int, help="export: PNG width in pixels")
+    parser.add_argument("--height", type=int, help="export: PNG height in pixels")
+    parser.add_argument("--scale", type=float, help="export: PNG pixels per unit")
+    args = parser.parse_args(argv)
+
+    if args.command != "inspect":
+        if not args.output_dir:
+            parser.error("%s needs --output-dir" % args.command)
+        if not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+    options = {
+        "output_dir": args.output_dir,
+        "compress": not args.uncompressed,
+        "quantum": args.quantum,
+        "tolerance": args.tolerance,
+        "format": args.format,
+        "width": args.width,
+        "height": args.height,
+        "scale": args.scale,
+    }
+
+    reports = []
+    for report in process(args.command, args.files, options, args.jobs, args.max_tasks):
+        reports.append(report)
+        if args.json:
+            print json.dumps(report, sort_keys=True)
+        else:
+            print _describe(report)
+        sys.stdout.flush()
+
+    if args.report:
+        output = open(args.report, "w")
+        json.dump(reports, output, indent=2, sort_keys=True)
+        output.close()
+    failed = [report for report in reports if not report["ok"]]
+    if failed:
+        print >> sys.stderr, "%s of %s files failed" % (len(failed), len(reports))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,233 +1,751 @@
-#!/usr/bin/env python
-# -*- coding: utf-8 -*-
-
-# PyRysunek is a simple vector drawing program using OpenGL.
-# http://launchpad.net/pyrysunek
-
-# TODO:
-# change line size
-# -- bonus --
-# better selection overlay
-# transparent color (draw without fill or outline)
-# Buttons to Save / Load actions
-# SelectionTool behavior according to the Red Book
-# group/ungroup objects
-# rotate tool
-# bring to front / send to back
-
-# ** turn off DEBUG and AUTORELOAD **
-
-import cPickle as pickle
-import sys
-
-try:
-    from OpenGL.GL import *
-    from OpenGL.GLUT import *
-    from OpenGL.GLU import *
-except ImportError:
-    print "A required library is not available: PyOpenGL"
-    raise
-
-from config import default, DEBUG
-from toolbar import Toolbar
-
-
-class App(object):
-
-    """A simple OpenGL drawing application."""
-
-    def __init__(self, config=default):
-        """Create an instance of a PyRysunek application.
-
-        Optional arguments:
-        config -- dictionary containing configuration values (see `config.default`)
-        """
-        self.config = config
-        self.width, self.height = self.config.window_size
-
-        self.toolbar = Toolbar(self.config.toolbar)
-        self.context = Context(
-            objects = ObjectList(),
-            color_picker = self.toolbar.color_picker,
-        )
-
-        self._init_opengl()
-
-        if config.auto_load_on_start:
-            self.load()
-
-    def _init_opengl(self):
-        """OpenGL initialization commands."""
-        glutInit(sys.argv)
-        glutInitDisplayMode(GLUT_RGBA | GLUT_DOUBLE)
-        glutInitWindowSize(self.width, self.height)
-        glutInitWindowPosition(*self.config.window_position)
-        glutCreateWindow(self.config.window_title)
-
-        # Assign callback functions
-        glutDisplayFunc(self.display)
-        glutReshapeFunc(self.reshape)
-        glutMouseFunc(self.mouse)
-        glutMotionFunc(self.motion)
-        glutIdleFunc(self.display)
-        glutKeyboardFunc(self.keyboard)
-
-        # Set background color
-        glClearColor(*self.config.bg_color)
-
-    def display(self):
-        """Callback to draw the application in the screen."""
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-        # Clear frame buffer
-        glClear(GL_COLOR_BUFFER_BIT)
-
-        for obj in self.context.objects:
-            obj.draw()
-
-        # Make sure that toolbar is on top of everything
-        self.toolbar.draw()
-
-        # Flush and swap buffers
-        glutSwapBuffers()
-
-    def reshape(self, w, h):
-        """Callback to adjust the coordinate system whenever a window is
-        created, moved or resized.
-        """
-        self.width, self.height = w, h
-        glViewport(0, 0, w, h)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        # Define left, right, bottom, top coordinates
-        gluOrtho2D(0.0, w, h, 0.0)
-
-    def mouse(self, button, state, x, y):
-        """Callback to handle mouse click events."""
-        if (x, y) in self.toolbar:
-            self.toolbar.mouse(button, state, x, y)
-        else:
-            if state == GLUT_DOWN:
-                self.toolbar.current_tool.mouse_down(x, y, self.context)
-
-            elif state == GLUT_UP:
-                self.toolbar.current_tool.mouse_up(x, y, self.context)
-
-        if DEBUG:
-            print "<Mouse click event>"
-            print "  button=%s, state=%s, x=%s, y=%s" % (button, state, x, y)
-            print "  current_tool = %s" % self.toolbar.current_tool
-            print "  len(objects) = %s" % len(self.context.objects)
-            print "  objects[-3:] = %s" % self.context.objects[-3:]
-
-    def motion(self, x, y):
-        """Callback to handle mouse drag events.
-
-        This method is called by OpenGL/GLUT when a mouse button is pressed
-        and movement occurs.
-
-        """
-        self.toolbar.current_tool.mouse_move(x, y, self.context)
-
-    def keyboard(self, key, x, y):
-        """Callback to handle key down events."""
-        if key == "\x1b":
-            # Exit on `ESC` keycode.
-            sys.exit(0)
-        elif key == "\x13":
-            # Ctrl+s
-            self.save()
-        elif key == "\x12":
-            # Ctrl+r
-            self.load()
-        else:
-            # Propagate event to toolbar.
-            self.toolbar.keyboard(key, x, y)
-
-    def save(self):
-        """Save the current objects to disk.
-
-        Fail silently if `self.config.temp_file` fails to open.
-
-        """
-        try:
-            temp_file = open(self.config.temp_file, "wb")
-            pickle.dump(self.context.objects, temp_file)
-            temp_file.close()
-            if DEBUG:
-                print "<Saved objects>"
-        except IOError:
-            if DEBUG:
-                print "<Failed to save objects>"
-
-    def load(self):
-        """Load objects from disk.
-
-        Fail silently if `self.config.temp_file` fails to open.
-
-        """
-        try:
-            temp_file = open(self.config.temp_file, "rb")
-            self.context.objects = pickle.load(temp_file)
-            temp_file.close()
-            if DEBUG:
-                print "<Load objects>"
-        except IOError:
-            if DEBUG:
-                print "<Failed to load objects>"
-
-
-class Context(dict):
-
-    """A Context object holds program execution state which can be passed around."""
-
-    def __getattr__(self, name):
-        """Allow item access using attribute access syntax."""
-        return self.get(name)
-
-    def __setattr__(self, name, value):
-        """Allow item attribution using attribute attribution syntax."""
-        return self.__setitem__(name, value)
-
-    def __delattr__(self, name):
-        """Allow item deletion using attribute deletion syntax."""
-        return self.__delitem__(name)
-
-
-class ObjectList(list):
-
-    """A ObjectList holds a group of objects and allow easy manipulation of them."""
-
-    def __init__(self, iterable=()):
-        """Create an ObjectList initialized with items from `iterable`."""
-        super(ObjectList, self).__init__(iterable)
-        self.selected = None
-
-    def select_none(self):
-        """Clear the selection."""
-        for obj in self:
-            obj.selected = False
-        self.selected = None
-
-    def select(self, x, y):
-        """Select the topmost object at the given x, y coordinates."""
-        self.select_none()
-        for obj in reversed(self):
-            if (x, y) in obj:
-                obj.selected = True
-                self.selected = obj
-                break
-
-
-def main():
-    """Run main program loop."""
-    app = App()
-    glutMainLoop()
-
-
-if __name__ == "__main__":
-    if DEBUG:
-        import autoreload
-        autoreload.main(main)
-    else:
-        main()
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# PyRysunek is a simple vector drawing program using OpenGL.
+# http://launchpad.net/pyrysunek
+
+# TODO:
+# change line size
+# -- bonus --
+# better selection overlay
+# transparent color (draw without fill or outline)
+# Buttons to Save / Load actions
+# SelectionTool behavior according to the Red Book
+# group/ungroup objects
+# rotate tool
+# bring to front / send to back
+
+# ** turn off DEBUG and AUTORELOAD **
+
+import os
+import sys
+import threading
+import time
+
+try:
+    from OpenGL.GL import *
+    from OpenGL.GLUT import *
+    from OpenGL.GLU import *
+except ImportError:
+    print "A required library is not available: PyOpenGL"
+    raise
+
+from config import default, DEBUG
+from document import write_document, DocumentLoader
+from history import History
+from journal import Journal
+from drawables import Detail, Drawable, FreeForm
+from overlay import PerformanceOverlay
+from renderer import BatchRenderer
+from spatial import SpatialGrid
+from stats import Stats
+from svg import export_svg
+from toolbar import Toolbar
+from viewport import Viewport
+import buttons
+import drawables
+import renderer
+import tessellation
+import toolbar
+
+# GLUT reports mouse wheel steps as clicks of these buttons.
+WHEEL_UP, WHEEL_DOWN = 3, 4
+
+
+class App(object):
+
+    """A simple OpenGL drawing application."""
+
+    def __init__(self, config=default):
+        """Create an instance of a PyRysunek application.
+
+        Optional arguments:
+        config -- dictionary containing configuration values (see `config.default`)
+        """
+        self.config = config
+        self.width, self.height = self.config.window_size
+
+        # Pixels by which free forms may be simplified when drawn.
+        self.max_draw_error = self.config.free_form.draw_error
+
+        self.toolbar = Toolbar(self.config.toolbar)
+        self.context = Context(
+            objects = ObjectList(cell_size=self.config.index_cell_size),
+            color_picker = self.toolbar.color_picker,
+            history = History(self.config.undo_budget),
+            free_form_options = dict(
+                simplify_tolerance = self.config.free_form.simplify_tolerance,
+                min_sample_distance = self.config.free_form.min_sample_distance,
+            ),
+        )
+
+        self.redraw = RedrawScheduler(self.config.target_fps)
+
+        self.stats = Stats()
+        color_picker = self.toolbar.color_picker
+        self.overlay = PerformanceOverlay(
+            self.stats,
+            color_picker.x + color_picker.width + self.config.toolbar.padding,
+            self.toolbar.y, self.toolbar.height, self.config.toolbar.color,
+            (drawables, tessellation, renderer, buttons, toolbar, sys.modules[__name__]),
+        )
+
+        self.view = Viewport(self.width, self.height,
+                             self.config.view.min_zoom, self.config.view.max_zoom)
+        self._pan_from = None
+
+        self.renderer = None
+        if config.batch_rendering:
+            try:
+                self.renderer = BatchRenderer()
+            except ImportError:
+                print "NumPy is not available: batch rendering is disabled"
+
+        self.loader = None
+        self.journal = None
+        if config.autosave:
+            self.journal = Journal(self.config.temp_file, self.config.journal_file,
+                                   self.config.journal_compact_every,
+                                   self.config.compress_documents)
+
+        self._init_opengl()
+
+        if config.auto_load_on_start:
+            self.load()
+        elif self.journal and not os.path.exists(self.config.temp_file):
+            self.journal.attach(self.context.objects, recovered=False)
+        # Otherwise the journal starts with the first save or load, so that
+        # the empty drawing does not replace the document on disk.
+
+    def _init_opengl(self):
+        """OpenGL initialization commands."""
+        glutInit(sys.argv)
+        glutInitDisplayMode(GLUT_RGBA | GLUT_DOUBLE)
+        glutInitWindowSize(self.width, self.height)
+        glutInitWindowPosition(*self.config.window_position)
+        glutCreateWindow(self.config.window_title)
+
+        # Assign callback functions
+        glutDisplayFunc(self.display)
+        glutReshapeFunc(self.reshape)
+        glutMouseFunc(self.mouse)
+        glutMotionFunc(self.motion)
+        glutKeyboardFunc(self.keyboard)
+
+        # Set background color
+        glClearColor(*self.config.bg_color)
+
+    def display(self):
+        """Callback to draw the application in the screen."""
+        self.redraw.frame_started()
+        start = time.time()
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+        # Clear frame buffer
+        glClear(GL_COLOR_BUFFER_BIT)
+
+        # Draw the drawing through the view, skipping what is out of sight.
+        Drawable.delete_released_lists()
+        glPushMatrix()
+        glScalef(self.view.zoom, self.view.zoom, 1.0)
+        glTranslatef(-self.view.origin.x, -self.view.origin.y, 0.0)
+        detail = Detail(self.view.zoom, self.max_draw_error)
+        visible = self.context.objects.visible(self.view.visible_rect)
+        if self.renderer:
+            self.renderer.draw(visible, detail)
+        else:
+            for obj in visible:
+                obj.draw(detail, self.config.display_lists)
+        if self.context.marquee:
+            self.draw_marquee(self.context.marquee)
+        glPopMatrix()
+        self.stats.add("objects_drawn", len(visible))
+        self.stats.add("objects_culled", len(self.context.objects) - len(visible))
+
+        # Make sure that toolbar is on top of everything
+        self.toolbar.draw()
+
+        if self.loader:
+            self.draw_progress()
+
+        self.stats.add("frame", time.time() - start)
+        self.stats.end_frame()
+        self.overlay.draw()
+
+        # Flush and swap buffers
+        glutSwapBuffers()
+
+    def draw_marquee(self, rect):
+        """Draw the outline of the box being dragged by the selection tool."""
+        x1, y1, x2, y2 = rect
+        glColor4fv(self.config.toolbar.selection_color)
+        glBegin(GL_LINE_LOOP)
+        glVertex2f(x1, y1)
+        glVertex2f(x2, y1)
+        glVertex2f(x2, y2)
+        glVertex2f(x1, y2)
+        glEnd()
+
+    def draw_progress(self):
+        """Draw a bar along the bottom of the window showing loading progress."""
+        height = 4
+        glColor4fv(self.config.toolbar.selection_color)
+        glRectf(0, self.height - height, self.width * self.loader.progress, self.height)
+
+    def reshape(self, w, h):
+        """Callback to adjust the coordinate system whenever a window is
+        created, moved or resized.
+        """
+        self.width, self.height = w, h
+        self.view.resize(w, h)
+        glViewport(0, 0, w, h)
+        glMatrixMode(GL_PROJECTION)
+        glLoadIdentity()
+        # Define left, right, bottom, top coordinates
+        gluOrtho2D(0.0, w, h, 0.0)
+        self.redraw.request()
+
+    def mouse(self, button, state, x, y):
+        """Callback to handle mouse click events.
+
+        The wheel zooms around the mouse cursor and the middle button pans the
+        view. Tools get world coordinates.
+
+        """
+        with self.stats.timer("mouse"):
+            self._mouse(button, state, x, y)
+        self.redraw.request()
+
+        if DEBUG:
+            print "<Mouse click event>"
+            print "  button=%s, state=%s, x=%s, y=%s" % (button, state, x, y)
+            print "  current_tool = %s" % self.toolbar.current_tool
+            print "  len(objects) = %s" % len(self.context.objects)
+            print "  objects[-3:] = %s" % self.context.objects[-3:]
+            last = self.context.objects[-1:]
+            if state == GLUT_UP and last and isinstance(last[0], FreeForm):
+                print "  free form samples/points = %s/%s" % last[0].simplification_stats
+
+    def _mouse(self, button, state, x, y):
+        """Handle a mouse click event, see `mouse`."""
+        if button in (WHEEL_UP, WHEEL_DOWN):
+            if state == GLUT_DOWN:
+                step = self.config.view.zoom_step
+                self.view.zoom_at(step if button == WHEEL_UP else 1.0 / step, x, y)
+        elif button == GLUT_MIDDLE_BUTTON:
+            self._pan_from = (x, y) if state == GLUT_DOWN else None
+            self.dragging(state == GLUT_DOWN)
+        elif (x, y) in self.toolbar:
+            self.toolbar.mouse(button, state, x, y)
+        elif self.loader:
+            # Drawing tools are disabled until loading is done.
+            pass
+        else:
+            world_x, world_y = self.view.to_world(x, y)
+            # Tools measure drags in pixels.
+            self.context.pixel_scale = self.view.zoom
+            self.dragging(state == GLUT_DOWN)
+            if state == GLUT_DOWN:
+                self.toolbar.current_tool.mouse_down(world_x, world_y, self.context)
+
+            elif state == GLUT_UP:
+                self.toolbar.current_tool.mouse_up(world_x, world_y, self.context)
+
+    def dragging(self, active):
+        """Trade detail for speed while the mouse is dragging something.
+
+        Free forms are drawn coarser until the mouse button is released, and
+        the next frame draws them in full detail again.
+
+        """
+        free_form = self.config.free_form
+        self.max_draw_error = free_form.drag_draw_error if active else free_form.draw_error
+
+    def motion(self, x, y):
+        """Callback to handle mouse drag events.
+
+        This method is called by OpenGL/GLUT when a mouse button is pressed
+        and movement occurs.
+
+        """
+        with self.stats.timer("motion"):
+            if self._pan_from:
+                from_x, from_y = self._pan_from
+                self.view.pan(x - from_x, y - from_y)
+                self._pan_from = (x, y)
+                self.redraw.request()
+            elif not self.loader:
+                world_x, world_y = self.view.to_world(x, y)
+                self.toolbar.current_tool.mouse_move(world_x, world_y, self.context)
+                self.redraw.request()
+
+    def keyboard(self, key, x, y):
+        """Callback to handle key down events."""
+        if key == "\x1b":
+            # Exit on `ESC` keycode.
+            if self.journal:
+                self.journal.close()
+            if self.config.stats_file:
+                self.stats.dump(self.config.stats_file)
+            sys.exit(0)
+        elif key == "\x13":
+            # Ctrl+s
+            self.save()
+        elif key == "\x12":
+            # Ctrl+r
+            self.load()
+        elif key == "\x05":
+            # Ctrl+e
+            self.export()
+        elif key == "\x1a":
+            # Ctrl+z
+            self.undo()
+        elif key == "\x19":
+            # Ctrl+y
+            self.redo()
+        elif key in ("+", "="):
+            self.view.zoom_at(self.config.view.zoom_step, self.width / 2, self.height / 2)
+        elif key == "-":
+            self.view.zoom_at(1.0 / self.config.view.zoom_step, self.width / 2, self.height / 2)
+        elif key == "0":
+            self.view.reset()
+        elif key == "p":
+            self.overlay.toggle()
+        else:
+            # Propagate event to toolbar.
+            self.toolbar.keyboard(key, x, y)
+        self.redraw.request()
+
+    def save(self):
+        """Save the current objects to disk.
+
+        With autosave, write a checkpoint in the background and return
+        immediately. Otherwise, fail silently if `self.config.temp_file` fails
+        to open. Do nothing while a document is loading.
+
+        """
+        if self.loader:
+            return
+        if self.journal:
+            if self.journal.objects is self.context.objects:
+                self.journal.checkpoint()
+            else:
+                self.journal.attach(self.context.objects, recovered=False)
+            if DEBUG:
+                print "<Checkpoint requested>"
+            return
+        try:
+            temp_file = open(self.config.temp_file, "wb")
+            write_document(self.context.objects, temp_file,
+                           compress=self.config.compress_documents)
+            temp_file.close()
+            if DEBUG:
+                print "<Saved objects>"
+        except IOError:
+            if DEBUG:
+                print "<Failed to save objects>"
+
+    def export(self):
+        """Export the finished objects to `self.config.svg_file`.
+
+        The file is written in a background thread, from a snapshot of the
+        list of objects. Do nothing while a document is loading.
+
+        """
+        if self.loader:
+            return
+        snapshot = [obj for obj in self.context.objects if obj.finished]
+        thread = threading.Thread(target=self._export, args=(snapshot,), name="export")
+        thread.start()
+
+    def _export(self, objects):
+        """Body of the export thread."""
+        try:
+            export_svg(objects, self.config.svg_file, background=self.config.bg_color)
+            if DEBUG:
+                print "<Exported %s objects>" % len(objects)
+        except IOError, error:
+            print "PyRysunek failed to export: %s" % error
+
+    def undo(self):
+        """Undo the latest change to the objects."""
+        if not self.loader:
+            self.context.history.undo(self.context.objects)
+
+    def redo(self):
+        """Redo the latest undone change to the objects."""
+        if not self.loader:
+            self.context.history.redo(self.context.objects)
+
+    def load(self):
+        """Start loading objects from disk.
+
+        Objects are read in a background thread and appear in batches, while
+        a progress bar is shown and drawing tools are disabled. With
+        autosave, changes recorded in the journal since the last checkpoint
+        are recovered at the end.
+        Both documents and legacy pickled object lists are accepted.
+        Fail silently if `self.config.temp_file` fails to open or is not a
+        document.
+
+        """
+        if self.loader:
+            return
+        if self.journal:
+            self.journal.flush()
+        try:
+            self.loader = DocumentLoader(self.config.temp_file,
+                                         self.config.load_batch_size,
+                                         finished_only=bool(self.journal))
+        except IOError:
+            self._loaded(False)
+            return
+        self._replaced_objects = self.context.objects
+        self.context.objects = ObjectList(cell_size=self.config.index_cell_size)
+        self.context.history.clear()
+        glutTimerFunc(0, self._receive_objects, 0)
+
+    def _receive_objects(self, value):
+        """Timer callback moving loaded objects into the drawing.
+
+        Spend at most half a frame doing so, then come back later.
+
+        """
+        deadline = time.time() + self.redraw.frame_interval / 2.0
+        while time.time() < deadline:
+            batch = self.loader.next_batch()
+            if not batch:
+                break
+            self.context.objects.extend(batch)
+
+        if self.loader.done:
+            loaded = self.loader.error is None
+            if not loaded:
+                # Forget about a partially loaded document.
+                self.context.objects, self._replaced_objects = \
+                    self._replaced_objects, self.context.objects
+            for obj in self._replaced_objects:
+                obj.release()
+            self.loader = self._replaced_objects = None
+            self._loaded(loaded)
+        else:
+            glutTimerFunc(int(self.redraw.frame_interval * 1000), self._receive_objects, 0)
+        self.redraw.request()
+
+    def _loaded(self, loaded):
+        """Finish loading, successful or not."""
+        if DEBUG:
+            print "<Load objects>" if loaded else "<Failed to load objects>"
+        if not self.journal:
+            return
+        if loaded:
+            self.journal.replay(self.context.objects)
+            self.journal.attach(self.context.objects)
+        elif not os.path.exists(self.config.temp_file):
+            self.journal.attach(self.context.objects, recovered=False)
+        else:
+            # Do not let autosave overwrite a document we cannot read.
+            print "PyRysunek could not read %s, autosave is disabled" % self.config.temp_file
+            self.journal = None
+
+
+class RedrawScheduler(object):
+
+    """Schedule redraws only when something changed, at a bounded frame rate.
+
+    Event handlers call `request` to mark the scene as dirty. Requests made
+    before the next frame is drawn are coalesced into that single frame, and
+    frames are never drawn closer together than 1 / `target_fps` seconds.
+    Nothing is drawn while nothing changes, so an idle window costs no CPU.
+
+    """
+
+    def __init__(self, target_fps):
+        """Create a scheduler drawing at most `target_fps` frames per second."""
+        self.frame_interval = 1.0 / target_fps
+        self.dirty = False
+        self._last_frame = 0.0
+
+    def request(self):
+        """Mark the scene as dirty and make sure a frame will be drawn."""
+        if self.dirty:
+            # A frame is already on its way.
+            return
+        self.dirty = True
+        delay = self._last_frame + self.frame_interval - time.time()
+        if delay <= 0:
+            glutPostRedisplay()
+        else:
+            glutTimerFunc(int(delay * 1000) + 1, self._timer, 0)
+
+    def _timer(self, value):
+        glutPostRedisplay()
+
+    def frame_started(self):
+        """Tell the scheduler that a frame is being drawn."""
+        self.dirty = False
+        self._last_frame = time.time()
+
+
+class Context(dict):
+
+    """A Context object holds program execution state which can be passed around."""
+
+    def __getattr__(self, name):
+        """Allow item access using attribute access syntax."""
+        return self.get(name)
+
+    def __setattr__(self, name, value):
+        """Allow item attribution using attribute attribution syntax."""
+        return self.__setitem__(name, value)
+
+    def __delattr__(self, name):
+        """Allow item deletion using attribute deletion syntax."""
+        return self.__delitem__(name)
+
+
+class ObjectList(list):
+
+    """A ObjectList holds a group of objects and allow easy manipulation of them.
+
+    Finished objects are kept in a spatial index keyed by their bounding box,
+    so that hit-testing only has to look at objects near the mouse cursor.
+    Objects which are still under construction are always hit-tested.
+    Whoever moves, resizes or finishes an object in the list must call
+    `update` so that the index can follow.
+
+    Selected objects are kept in the `selection` set, so that changing the
+    selection takes time in proportion to it rather than to the list.
+
+    Changes are reported to the callables in `listeners`, which are called
+    with an event name, an object and its index:
+        "insert", obj, index -- `obj` was added at `index`
+        "remove", obj, index -- `obj` was removed from `index`
+        "update", obj, None -- `obj` was moved, resized or finished
+        "reset", None, None -- the list was rearranged as a whole
+
+    """
+
+    # Default size of the spatial index cells.
+    cell_size = 128
+
+    def __init__(self, iterable=(), cell_size=None):
+        """Create an ObjectList initialized with items from `iterable`."""
+        super(ObjectList, self).__init__(iterable)
+        self.selection = set()
+        self.listeners = []
+        if cell_size is not None:
+            self.cell_size = cell_size
+        self._rebuild_index()
+
+    def __getstate__(self):
+        """Leave the spatial index out of pickles."""
+        state = self.__dict__.copy()
+        for name in ("_index", "_pending", "_z_order", "_next_z", "listeners"):
+            state.pop(name, None)
+        state["selection"] = list(self.selection)
+        return state
+
+    def __setstate__(self, state):
+        """Restore a pickled ObjectList and rebuild its spatial index."""
+        # Older pickles have the single `selected` object instead.
+        selected = state.pop("selected", None)
+        state["selection"] = set(state.get("selection", [selected] if selected else []))
+        self.__dict__.update(state)
+        self.listeners = []
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Index every object from scratch."""
+        self._index = SpatialGrid(self.cell_size)
+        self._pending = set()
+        self._z_order = {}
+        self._next_z = 0
+        for obj in self:
+            self._add(obj)
+        # Forget about selected objects which are gone.
+        self.selection.intersection_update(self._z_order)
+
+    def _renumber(self):
+        """Recompute the z-order of all objects from their list positions."""
+        self._z_order = dict((obj, z) for z, obj in enumerate(self))
+        self._next_z = len(self)
+
+    def _add(self, obj):
+        """Register an object appended to the end of the list."""
+        self._z_order[obj] = self._next_z
+        self._next_z += 1
+        self._pending.add(obj)
+        # Objects may come selected, e.g. from documents saved that way.
+        if obj.selected:
+            self.selection.add(obj)
+
+    def _discard(self, obj):
+        """Unregister an object which is no longer in the list."""
+        self._z_order.pop(obj, None)
+        self._pending.discard(obj)
+        self._index.remove(obj)
+        self.deselect(obj)
+        obj.release()
+
+    def _notify(self, event, obj=None, index=None):
+        for listener in self.listeners:
+            listener(event, obj, index)
+
+    def _clamp(self, index, size):
+        """Return the non-negative position `index` refers to, as list.insert does."""
+        if index < 0:
+            index = max(index + size, 0)
+        return min(index, size)
+
+    def _flush_pending(self):
+        """Move objects which got finished into the spatial index."""
+        for obj in [obj for obj in self._pending if obj.finished]:
+            self._pending.discard(obj)
+            self._index.insert(obj, obj.bounding_box)
+
+    def append(self, obj):
+        super(ObjectList, self).append(obj)
+        self._add(obj)
+        self._notify("insert", obj, len(self) - 1)
+
+    def extend(self, iterable):
+        for obj in iterable:
+            self.append(obj)
+
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
+
+    def insert(self, index, obj):
+        index = self._clamp(index, len(self))
+        if index == len(self):
+            self.append(obj)
+            return
+        super(ObjectList, self).insert(index, obj)
+        self._add(obj)
+        self._renumber()
+        self._notify("insert", obj, index)
+
+    def remove(self, obj):
+        self.pop(self.index(obj))
+
+    def pop(self, index=-1):
+        obj = super(ObjectList, self).pop(index)
+        self._discard(obj)
+        self._notify("remove", obj, self._clamp(index, len(self) + 1))
+        return obj
+
+    def __setitem__(self, index, value):
+        super(ObjectList, self).__setitem__(index, value)
+        self._rebuild_index()
+        self._notify("reset")
+
+    def __delitem__(self, index):
+        super(ObjectList, self).__delitem__(index)
+        self._rebuild_index()
+        self._notify("reset")
+
+    def __setslice__(self, i, j, sequence):
+        super(ObjectList, self).__setslice__(i, j, sequence)
+        self._rebuild_index()
+        self._notify("reset")
+
+    def __delslice__(self, i, j):
+        super(ObjectList, self).__delslice__(i, j)
+        self._rebuild_index()
+        self._notify("reset")
+
+    def reverse(self):
+        super(ObjectList, self).reverse()
+        self._renumber()
+        self._notify("reset")
+
+    def sort(self, *args, **kwargs):
+        super(ObjectList, self).sort(*args, **kwargs)
+        self._renumber()
+        self._notify("reset")
+
+    def update(self, obj):
+        """Refresh the spatial index after `obj` was moved, resized or finished."""
+        if obj in self._z_order and obj.finished:
+            self.reindex(obj)
+            self._notify("update", obj)
+
+    def reindex(self, obj):
+        """Refresh the spatial index while `obj` is being dragged around.
+
+        Listeners are not told; call `update` once the drag is over.
+
+        """
+        if obj in self._z_order and obj.finished:
+            self._pending.discard(obj)
+            self._index.insert(obj, obj.bounding_box)
+
+    @property
+    def selected(self):
+        """Return the selected object if there is exactly one, or None."""
+        if len(self.selection) == 1:
+            return next(iter(self.selection))
+        return None
+
+    def add_to_selection(self, obj):
+        obj.selected = True
+        self.selection.add(obj)
+
+    def deselect(self, obj):
+        obj.selected = False
+        self.selection.discard(obj)
+
+    def select_none(self):
+        """Clear the selection."""
+        for obj in self.selection:
+            obj.selected = False
+        self.selection.clear()
+
+    def visible(self, rect):
+        """Return the objects which may show in the world-space rectangle
+        `rect`, in z-order. Objects under construction are always included.
+        """
+        self._flush_pending()
+        candidates = self._index.query_rect(rect) | self._pending
+        if len(candidates) == len(self):
+            return self
+        return sorted(candidates, key=self._z_order.get)
+
+    def select(self, x, y):
+        """Select the topmost object at the given x, y coordinates."""
+        self.select_none()
+        self._flush_pending()
+        candidates = self._index.query_point(x, y) | self._pending
+        for obj in sorted(candidates, key=self._z_order.get, reverse=True):
+            if (x, y) in obj:
+                self.add_to_selection(obj)
+                break
+
+    def select_rect(self, rect):
+        """Select the finished objects whose bounding boxes meet the
+        world-space rectangle `rect`, that is which are inside it or cross it.
+        """
+        self.select_none()
+        self._flush_pending()
+        for obj in self._index.query_rect(rect):
+            self.add_to_selection(obj)
+
+    def selected_in_order(self):
+        """Return the selected objects in z-order."""
+        return sorted(self.selection, key=self._z_order.get)
+
+
+def main():
+    """Run main program loop."""
+    app = App()
+    glutMainLoop()
+
+
+if __name__ == "__main__":
+    if DEBUG:
+        import autoreload
+        autoreload.main(main)
+    else:
+        main()
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+
+# Columnar storage for large numbers of rectangles and ellipses.
+#
+# A `SceneStore` keeps its shapes in a few NumPy arrays, one row per shape:
+#
+#   kinds     uint8        RECTANGLE or ELLIPSE, as in document.py
+#   flags     uint8        FINISHED, SELECTED, DELETED
+#   corners   float64 x 4  corner1 x, y, corner2 x, y
+#   vectors   float64 x 4  translation x, y, resize x, y
+#   colors    uint32 x 2   fill and line color, as indices in `palette`
+#   z         int64        drawing order, higher is on top
+#   revisions uint32       see `Drawable.revision`
+#
+# which takes under a hundred bytes per shape, against several hundred for
+# Rectangle and Ellipse instances. Culling, hit-testing and writing
+# documents work on whole columns at once.
+#
+# Rows are never moved: removing a shape only flags it as deleted, so that
+# it can be restored in place (e.g. by undo) and row numbers stay valid.
+#
+# `store[row]` returns a proxy for a shape, made on demand, which is a
+# Rectangle or Ellipse whose state lives in the store, so that tools,
+# history and renderers can use it like any other drawable.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from document import (RECTANGLE, ELLIPSE, FINISHED, COLOR, END, FLAG_COMPRESSED,
+                      CHUNK_SIZE, DEFAULT_QUANTUM, MAGIC, VERSION,
+                      _Writer, _color, _corners, _encode_varint, _header, _vectors)
+from drawables import DEFAULT_DETAIL, Rectangle, Ellipse
+from geometry import Point
+
+SELECTED = 2
+DELETED = 4
+
+_KINDS = {Rectangle: RECTANGLE, Ellipse: ELLIPSE}
+
+
+def _round2(values):
+    """Round to 2 decimals like the builtin `round`, half away from zero."""
+    return numpy.sign(values) * numpy.floor(numpy.abs(values) * 100 + 0.5) / 100
+
+
+class SceneStore(object):
+
+    """Rectangles and ellipses stored in typed arrays.
+
+    Requires NumPy.
+
+    """
+
+    def __init__(self, capacity=1024):
+        """Create an empty store with room for `capacity` shapes."""
+        if numpy is None:
+            raise ImportError("SceneStore requires NumPy")
+        capacity = max(capacity, 1)
+        self.kinds = numpy.zeros(capacity, numpy.uint8)
+        self.flags = numpy.zeros(capacity, numpy.uint8)
+        self.corners = numpy.zeros((capacity, 4), numpy.float64)
+        self.vectors = numpy.zeros((capacity, 4), numpy.float64)
+        self.colors = numpy.zeros((capacity, 2), numpy.uint32)
+        self.z = numpy.zeros(capacity, numpy.int64)
+        self.revisions = numpy.zeros(capacity, numpy.uint32)
+        self.palette = []
+        self._palette_index = {}
+        # Number of rows in use, deleted ones included.
+        self.rows = 0
+        self._deleted = 0
+        self._next_z = 0
+        # World-space boxes of all rows, valid while `_geometry` does not
+        # change.
+        self._geometry = 0
+        self._boxes = None
+        self._boxes_geometry = None
+
+    def __repr__(self):
+        return "%s(%s shapes)" % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return self.rows - self._deleted
+
+    def __iter__(self):
+        """Yield proxies for the shapes, in z-order."""
+        for row in self.order():
+            yield self.proxy(row)
+
+    def __getitem__(self, row):
+        """Return the proxy for the shape in `row`."""
+        if not 0 <= row < self.rows or self.flags[row] & DELETED:
+            raise IndexError("no shape in row %s" % row)
+        return self.proxy(row)
+
+    @property
+    def nbytes(self):
+        """Return the number of bytes taken by the columns."""
+        return sum(column.nbytes for column in (self.kinds, self.flags, self.corners,
+                                                self.vectors, self.colors, self.z,
+                                                self.revisions))
+
+    def _reserve(self, count):
+        """Make room for `count` more rows."""
+        needed = self.rows + count
+        capacity = len(self.kinds)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("kinds", "flags", "corners", "vectors", "colors", "z", "revisions"):
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.rows] = old[:self.rows]
+            setattr(self, name, new)
+
+    def color_index(self, color):
+        """Return the palette index of `color`, adding it if needed."""
+        color = tuple(float(c) for c in color)
+        index = self._palette_index.get(color)
+        if index is None:
+            index = self._palette_index[color] = len(self.palette)
+            self.palette.append(color)
+        return index
+
+    def add(self, obj):
+        """Copy a Rectangle or Ellipse on top of the others and return the
+        proxy which replaces it.
+        """
+        kind = _KINDS.get(type(obj))
+        if kind is None:
+            if isinstance(obj, _ShapeProxy):
+                kind = obj.kind
+            else:
+                raise TypeError("SceneStore cannot hold %r" % (obj,))
+        self._reserve(1)
+        row = self.rows
+        self.rows += 1
+        self.kinds[row] = kind
+        self.flags[row] = ((FINISHED if obj.finished else 0) |
+                           (SELECTED if obj.selected else 0))
+        self.corners[row] = tuple(obj.corner1) + tuple(obj.corner2)
+        self.vectors[row] = tuple(obj.translation_vector) + tuple(obj.resize_vector)
+        self.colors[row] = (self.color_index(obj.fill_color),
+                            self.color_index(obj.line_color))
+        self.z[row] = self._next_z
+        self._next_z += 1
+        self.revisions[row] = 0
+        self._geometry += 1
+        return self.proxy(row)
+
+    def extend(self, objects):
+        """Add every Rectangle and Ellipse of `objects`, in order."""
+        for obj in objects:
+            self.add(obj)
+
+    def remove(self, row):
+        """Remove the shape in `row`, keeping its row for `restore`."""
+        if not self.flags[row] & DELETED:
+            self.flags[row] |= DELETED
+            self._deleted += 1
+
+    def restore(self, row):
+        """Put back the shape removed from `row`, at its previous depth."""
+        if self.flags[row] & DELETED:
+            self.flags[row] &= 0xff ^ DELETED
+            self._deleted -= 1
+
+    def raise_to_top(self, row):
+        """Draw the shape in `row` above all the others."""
+        self.z[row] = self._next_z
+        self._next_z += 1
+
+    def proxy(self, row):
+        """Return a drawable backed by `row`."""
+        cls = _RectangleProxy if self.kinds[row] == RECTANGLE else _EllipseProxy
+        proxy = cls.__new__(cls)
+        proxy.store = self
+        proxy.row = row
+        return proxy
+
+    def _live(self):
+        """Return a boolean mask of the rows which are not deleted."""
+        return (self.flags[:self.rows] & DELETED) == 0
+
+    def order(self, rows=None):
+        """Return the live rows, or the given ones, sorted by z-order."""
+        if rows is None:
+            rows = numpy.flatnonzero(self._live())
+        return rows[numpy.argsort(self.z[rows], kind="mergesort")]
+
+    def bounding_boxes(self):
+        """Return the world-space boxes of all rows as an (n, 4) array, like
+        `Drawable.bounding_box` computes them one at a time.
+        """
+        if self._boxes_geometry == self._geometry:
+            return self._boxes
+        n = self.rows
+        corners, vectors = self.corners[:n], self.vectors[:n]
+        x = corners[:, 0::2] * vectors[:, 2:3] + vectors[:, 0:1]
+        y = corners[:, 1::2] * vectors[:, 3:4] + vectors[:, 1:2]
+        boxes = numpy.column_stack((x.min(axis=1), y.min(axis=1),
+                                    x.max(axis=1), y.max(axis=1)))
+        # Same margin as `Ellipse.hit_margin`.
+        ellipses = self.kinds[:n] == ELLIPSE
+        margin_x = (boxes[ellipses, 2] - boxes[ellipses, 0]) * 0.005 + 0.001
+        margin_y = (boxes[ellipses, 3] - boxes[ellipses, 1]) * 0.005 + 0.001
+        boxes[ellipses] += numpy.column_stack((-margin_x, -margin_y, margin_x, margin_y))
+        self._boxes, self._boxes_geometry = boxes, self._geometry
+        return boxes
+
+    def query_rect(self, (x1, y1, x2, y2)):
+        """Return the live rows whose boxes meet the rectangle, in z-order."""
+        boxes = self.bounding_boxes()
+        hits = ((boxes[:, 0] <= x2) & (boxes[:, 2] >= x1) &
+                (boxes[:, 1] <= y2) & (boxes[:, 3] >= y1) & self._live())
+        return self.order(numpy.flatnonzero(hits))
+
+    def contains(self, x, y, rows=None):
+        """Return a boolean array telling which of `rows` (all by default)
+        contain (x, y), like `Rectangle.__contains__` and
+        `Ellipse.__contains__`.
+        """
+        if rows is None:
+            rows = numpy.arange(self.rows)
+        corners, vectors = self.corners[rows], self.vectors[rows]
+        x1 = corners[:, 0] * vectors[:, 2] + vectors[:, 0]
+        y1 = corners[:, 1] * vectors[:, 3] + vectors[:, 1]
+        x2 = corners[:, 2] * vectors[:, 2] + vectors[:, 0]
+        y2 = corners[:, 3] * vectors[:, 3] + vectors[:, 1]
+        inside = ((numpy.minimum(x1, x2) <= x) & (x <= numpy.maximum(x1, x2)) &
+                  (numpy.minimum(y1, y2) <= y) & (y <= numpy.maximum(y1, y2)))
+        ellipses = self.kinds[rows] == ELLIPSE
+        if ellipses.any():
+            a = (x1[ellipses] - x2[ellipses]) / 2.0
+            b = (y1[ellipses] - y2[ellipses]) / 2.0
+            xc = (x1[ellipses] + x2[ellipses]) / 2.0
+            yc = (y1[ellipses] + y2[ellipses]) / 2.0
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                fx = _round2((x - xc) ** 2 / a ** 2 + (y - yc) ** 2 / b ** 2 - 1)
+            # Flat ellipses are hit like their boxes, as `Ellipse.__contains__`
+            # does.
+            flat = (a == 0) | (b == 0)
+            inside[ellipses] = numpy.where(flat, inside[ellipses], fx <= 0.01)
+        return inside
+
+    def hit_test(self, x, y):
+        """Return the row of the topmost shape containing (x, y), or None."""
+        candidates = self.query_rect((x, y, x, y))
+        if not len(candidates):
+            return None
+        hits = candidates[self.contains(x, y, candidates)]
+        if not len(hits):
+            return None
+        return int(hits[-1])
+
+    def write(self, fileobj, compress=True, quantum=DEFAULT_QUANTUM):
+        """Write the shapes to `fileobj` as a document (see document.py),
+        in z-order.
+        """
+        fileobj.write(_header.pack(MAGIC, VERSION, FLAG_COMPRESSED if compress else 0, quantum))
+        writer = _Writer(fileobj, compress)
+        out = writer.buffer
+        # The whole palette goes first, so that color indices in records
+        # are those of the store.
+        for color in self.palette:
+            out.append(COLOR)
+            out.extend(_color.pack(*color))
+
+        rows = self.order()
+        if len(self.palette) <= 0x7f:
+            # Every varint is a single byte: records have a fixed layout.
+            record = numpy.dtype([("tag", "u1"), ("fill", "u1"), ("line", "u1"),
+                                  ("flags", "u1"), ("vectors", "<f8", 4),
+                                  ("corners", "<f8", 4)])
+            step = max(CHUNK_SIZE // record.itemsize, 1)
+            for start in xrange(0, len(rows), step):
+                chunk = rows[start:start + step]
+                records = numpy.empty(len(chunk), record)
+                records["tag"] = self.kinds[chunk]
+                records["fill"] = self.colors[chunk, 0]
+                records["line"] = self.colors[chunk, 1]
+                records["flags"] = self.flags[chunk] & FINISHED
+                records["vectors"] = self.vectors[chunk]
+                records["corners"] = self.corners[chunk]
+                out.extend(records.tostring())
+                writer.maybe_flush()
+        else:
+            for row in rows:
+                out.append(int(self.kinds[row]))
+                _encode_varint(int(self.colors[row, 0]), out)
+                _encode_varint(int(self.colors[row, 1]), out)
+                out.append(int(self.flags[row] & FINISHED))
+                out.extend(_vectors.pack(*self.vectors[row]))
+                out.extend(_corners.pack(*self.corners[row]))
+                writer.maybe_flush()
+
+        out.append(END)
+        writer.flush(final=True)
+
+
+def _column(name, size):
+    """Return a property for a Point made of two values of a row of the
+    store column `name`, starting at `size`.
+    """
+    def get(self):
+        values = getattr(self.store, name)[self.row]
+        return Point(float(values[size]), float(values[size + 1]))
+
+    def set(self, point):
+        x, y = point
+        getattr(self.store, name)[self.row, size:size + 2] = (x, y)
+        self.store._geometry += 1
+    return property(get, set)
+
+
+def _color_property(column):
+    def get(self):
+        return self.store.palette[self.store.colors[self.row, column]]
+
+    def set(self, color):
+        self.store.colors[self.row, column] = self.store.color_index(color)
+    return property(get, set)
+
+
+def _flag(flag):
+    def get(self):
+        return bool(self.store.flags[self.row] & flag)
+
+    def set(self, value):
+        if value:
+            self.store.flags[self.row] |= flag
+        else:
+            self.store.flags[self.row] &= 0xff ^ flag
+    return property(get, set)
+
+
+class _ShapeProxy(object):
+
+    """Mixin making a drawable keep its state in a row of a SceneStore."""
+
+    corner1 = _column("corners", 0)
+    corner2 = _column("corners", 2)
+    translation_vector = _column("vectors", 0)
+    resize_vector = _column("vectors", 2)
+    fill_color = _color_property(0)
+    line_color = _color_property(1)
+    _finished = _flag(FINISHED)
+    selected = _flag(SELECTED)
+
+    @property
+    def _revision(self):
+        return int(self.store.revisions[self.row])
+
+    @_revision.setter
+    def _revision(self, value):
+        self.store.revisions[self.row] = value
+
+    def draw(self, detail=DEFAULT_DETAIL, display_list=False):
+        # Proxies are made anew whenever needed, and would each compile a list.
+        super(_ShapeProxy, self).draw(detail)
+
+    def __eq__(self, other):
+        return (isinstance(other, _ShapeProxy) and
+                (self.store, self.row) == (other.store, other.row))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.store), self.row))
+
+    def __reduce__(self):
+        # Pickle a standalone copy.
+        return self.detach().__reduce_ex__(2)
+
+    @property
+    def kind(self):
+        return int(self.store.kinds[self.row])
+
+    def detach(self):
+        """Return a standalone Rectangle or Ellipse equal to this shape."""
+        cls = Rectangle if self.kind == RECTANGLE else Ellipse
+        obj = cls(self.fill_color, self.line_color, self.corner1, self.corner2)
+        obj.translation_vector = self.translation_vector
+        obj.resize_vector = self.resize_vector
+        obj._finished = self._finished
+        return obj
+
+
+class _RectangleProxy(_ShapeProxy, Rectangle):
+    pass
+
+
+class _EllipseProxy(_ShapeProxy, Ellipse):
+    pass
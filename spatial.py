@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+from math import floor
+
+
+class SpatialGrid(object):
+
+    """A uniform grid which indexes items by their axis-aligned bounding box.
+
+    Every item is registered in each cell its bounding box overlaps, so that
+    point and rectangle queries only have to look at a few nearby candidates.
+    Items whose bounding box would span more than `max_cells` cells are kept
+    apart in a list of large items that is always part of the candidates.
+
+    Bounding boxes are (x1, y1, x2, y2) tuples with x1 <= x2 and y1 <= y2.
+
+    """
+
+    def __init__(self, cell_size=128, max_cells=256):
+        """Create an empty grid.
+
+        Optional arguments:
+        cell_size -- width and height of each grid cell
+        max_cells -- maximum number of cells a single item may occupy
+        """
+        self.cell_size = float(cell_size)
+        self.max_cells = max_cells
+        self._cells = {}
+        self._large = set()
+        self._boxes = {}
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, item):
+        return item in self._boxes
+
+    def _cell_range(self, (x1, y1, x2, y2)):
+        """Return the range of cell coordinates covered by a bounding box."""
+        size = self.cell_size
+        return (int(floor(x1 / size)), int(floor(y1 / size)),
+                int(floor(x2 / size)), int(floor(y2 / size)))
+
+    def _cells_of(self, bounding_box):
+        """Return the keys of the cells covered by `bounding_box`, or None if
+        there would be more than `max_cells` of them.
+        """
+        i1, j1, i2, j2 = self._cell_range(bounding_box)
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > self.max_cells:
+            return None
+        return [(i, j) for i in xrange(i1, i2 + 1) for j in xrange(j1, j2 + 1)]
+
+    def insert(self, item, bounding_box):
+        """Add `item` to the grid, or update its bounding box if already there."""
+        if item in self._boxes:
+            self.remove(item)
+        self._boxes[item] = bounding_box
+        cells = self._cells_of(bounding_box)
+        if cells is None:
+            self._large.add(item)
+        else:
+            for key in cells:
+                self._cells.setdefault(key, set()).add(item)
+
+    def remove(self, item):
+        """Remove `item` from the grid. Unknown items are ignored."""
+        bounding_box = self._boxes.pop(item, None)
+        if bounding_box is None:
+            return
+        cells = self._cells_of(bounding_box)
+        if cells is None:
+            self._large.discard(item)
+        else:
+            for key in cells:
+                cell = self._cells[key]
+                cell.discard(item)
+                if not cell:
+                    del self._cells[key]
+
+    def clear(self):
+        """Remove all items from the grid."""
+        self._cells.clear()
+        self._large.clear()
+        self._boxes.clear()
+
+    def query_point(self, x, y):
+        """Return the set of items whose bounding box contains (x, y)."""
+        size = self.cell_size
+        key = (int(floor(x / size)), int(floor(y / size)))
+        candidates = self._cells.get(key, set()) | self._large
+        boxes = self._boxes
+        return set(item for item in candidates
+                   if boxes[item][0] <= x <= boxes[item][2] and
+                      boxes[item][1] <= y <= boxes[item][3])
+
+    def query_rect(self, (x1, y1, x2, y2)):
+        """Return the set of items whose bounding box intersects the given
+        rectangle.
+        """
+        i1, j1, i2, j2 = self._cell_range((x1, y1, x2, y2))
+        if (i2 - i1 + 1) * (j2 - j1 + 1) > len(self._cells):
+            # The query covers more cells than there are occupied ones.
+            candidates = set(self._boxes)
+        else:
+            candidates = set(self._large)
+            cells = self._cells
+            for i in xrange(i1, i2 + 1):
+                for j in xrange(j1, j2 + 1):
+                    cell = cells.get((i, j))
+                    if cell:
+                        candidates.update(cell)
+        boxes = self._boxes
+        return set(item for item in candidates
+                   if boxes[item][0] <= x2 and x1 <= boxes[item][2] and
+                      boxes[item][1] <= y2 and y1 <= boxes[item][3])
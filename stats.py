@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# Lightweight performance counters.
+#
+# Counters are plain numbers added up over a frame: event counts, seconds
+# spent in a piece of code, GL calls... When a frame ends, its counters are
+# kept in a short history from which percentiles are computed, and added to
+# running totals which can be dumped to a file.
+
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Number of vertices submitted by GL functions other than glVertex*.
+_VERTICES = {
+    "glRectf": 4,
+    "glRectd": 4,
+    "glRecti": 4,
+}
+_TEXTURE_UPLOADS = ("glTexImage2D", "gluBuild2DMipmaps")
+
+
+class Stats(object):
+
+    """Per-frame counters with a history of recent frames.
+
+    Use `add` and `timer` to accumulate counters for the current frame, and
+    `end_frame` when it is done. `count_gl_calls` makes the GL functions
+    used by some modules add to the "gl_calls", "vertices" and
+    "texture_uploads" counters.
+
+    """
+
+    def __init__(self, history=240):
+        """Create empty counters keeping the last `history` frames."""
+        self.current = {}
+        self.frames = deque(maxlen=history)
+        self.totals = {}
+        self.frame_count = 0
+        self._wrapped = []
+
+    def __repr__(self):
+        return "%s(frames=%s)" % (self.__class__.__name__, self.frame_count)
+
+    def add(self, name, value=1):
+        """Add `value` to the counter `name` of the current frame."""
+        self.current[name] = self.current.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name):
+        """Add the seconds spent in a `with` block to the counter `name`."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, time.time() - start)
+
+    def end_frame(self):
+        """Close the current frame, keeping its counters in the history."""
+        frame, self.current = self.current, {}
+        self.frames.append(frame)
+        for name, value in frame.iteritems():
+            self.totals[name] = self.totals.get(name, 0) + value
+        self.frame_count += 1
+
+    def last(self, name):
+        """Return the counter `name` of the last finished frame."""
+        if not self.frames:
+            return 0
+        return self.frames[-1].get(name, 0)
+
+    def percentile(self, name, percent):
+        """Return the `percent` percentile of the counter `name` over the
+        frames in the history, counting frames without it as 0.
+        """
+        if not self.frames:
+            return 0
+        values = sorted(frame.get(name, 0) for frame in self.frames)
+        index = int(round(percent / 100.0 * (len(values) - 1)))
+        return values[index]
+
+    def summary(self):
+        """Return a dictionary of totals and recent percentiles per counter."""
+        names = set(self.totals)
+        for frame in self.frames:
+            names.update(frame)
+        counters = {}
+        for name in sorted(names):
+            counters[name] = {
+                "total": self.totals.get(name, 0),
+                "p50": self.percentile(name, 50),
+                "p90": self.percentile(name, 90),
+                "p99": self.percentile(name, 99),
+            }
+        return {"frames": self.frame_count, "counters": counters}
+
+    def dump(self, path):
+        """Write `summary` to the file at `path`, as JSON."""
+        output = open(path, "w")
+        try:
+            json.dump(self.summary(), output, indent=2, sort_keys=True)
+        finally:
+            output.close()
+
+    def count_gl_calls(self, modules):
+        """Count calls to the GL and GLU functions the given modules use.
+
+        The functions imported into each module are replaced by counting
+        wrappers until `stop_counting_gl_calls` is called.
+
+        """
+        self.stop_counting_gl_calls()
+        for module in modules:
+            namespace = vars(module)
+            for name, function in namespace.items():
+                if (name.startswith("gl") and not name.startswith("glut") and
+                        callable(function)):
+                    namespace[name] = self._counting(name, function)
+                    self._wrapped.append((namespace, name, function))
+
+    def stop_counting_gl_calls(self):
+        """Restore the functions replaced by `count_gl_calls`."""
+        for namespace, name, function in self._wrapped:
+            namespace[name] = function
+        del self._wrapped[:]
+
+    @property
+    def counting_gl_calls(self):
+        return bool(self._wrapped)
+
+    def _counting(self, name, function):
+        """Return a wrapper of the GL function `name` which counts its calls."""
+        add = self.add
+        if name.startswith("glVertex"):
+            vertices = lambda args: 1
+        elif name == "glDrawArrays":
+            vertices = lambda args: args[2]
+        elif name in _VERTICES:
+            vertices = lambda args: _VERTICES[name]
+        else:
+            vertices = None
+        uploads = name in _TEXTURE_UPLOADS
+
+        def counting(*args):
+            add("gl_calls")
+            if vertices is not None:
+                add("vertices", vertices(args))
+            if uploads:
+                add("texture_uploads")
+            return function(*args)
+        counting.__name__ = name
+        return counting
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+# Export of drawings to SVG.
+#
+# Every drawable becomes a single element, written as soon as it is reached
+# so that exporting takes the same memory whatever the size of the drawing.
+#
+#   Rectangle  <rect>, with the stroke drawn half a unit inside the edges
+#   Ellipse    <ellipse>, likewise
+#   FreeForm   <path> made of relative line commands from rounded
+#              coordinates, with a one pixel wide non-scaling stroke
+#
+# The stroke is the outline drawn by `Drawable.draw` (one unit wide, before
+# `resize_vector` is applied), and `resize_vector` and `translation_vector`
+# become the transform of the element.
+
+from drawables import Rectangle, Ellipse, FreeForm
+
+# Number of decimals kept in coordinates.
+DEFAULT_PRECISION = 2
+
+
+def _number(value, precision):
+    """Format a number as compactly as possible."""
+    text = "%.*f" % (precision, value)
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text == "-0":
+        text = "0"
+    return text
+
+
+def _fixed(value, precision):
+    """Format an integer count of 10 ** -`precision` units as compactly as
+    possible, like `_number` does.
+    """
+    if -1000 < value < 1000 and precision == DEFAULT_PRECISION:
+        return _small_numbers[value]
+    return _number(value / float(10 ** precision), precision)
+
+
+_small_numbers = dict((value, _number(value / 100.0, 2)) for value in xrange(-999, 1000))
+
+
+def css_color(color):
+    """Return a CSS color for a 4-value color tuple."""
+    r, g, b = [int(round(min(max(c, 0.0), 1.0) * 255)) for c in color[:3]]
+    alpha = color[3] if len(color) > 3 else 1.0
+    if alpha >= 1.0:
+        return "#%02x%02x%02x" % (r, g, b)
+    return "rgba(%d,%d,%d,%s)" % (r, g, b, _number(alpha, 3))
+
+
+def _transform(obj, precision):
+    """Return the transform attribute of `obj`, if it needs one."""
+    n = lambda value: _number(value, precision)
+    (t_x, t_y), (r_x, r_y) = obj.translation_vector, obj.resize_vector
+    if (r_x, r_y) == (1, 1):
+        if (t_x, t_y) == (0, 0):
+            return ""
+        return ' transform="translate(%s %s)"' % (n(t_x), n(t_y))
+    return ' transform="matrix(%s 0 0 %s %s %s)"' % (n(r_x), n(r_y), n(t_x), n(t_y))
+
+
+def _path_data(coordinates, precision):
+    """Return path data for a polyline: an absolute move, then relative lines."""
+    scale = 10 ** precision
+    # Work on rounded integers so that rounding errors do not add up.
+    x = int(round(coordinates[0] * scale))
+    y = int(round(coordinates[1] * scale))
+    move = "M%s %s" % (_fixed(x, precision), _fixed(y, precision))
+    lines = []
+    for i in xrange(2, len(coordinates), 2):
+        next_x = int(round(coordinates[i] * scale))
+        next_y = int(round(coordinates[i + 1] * scale))
+        lines.append("%s %s" % (_fixed(next_x - x, precision), _fixed(next_y - y, precision)))
+        x, y = next_x, next_y
+    if not lines:
+        return move
+    return move + "l" + " ".join(lines)
+
+
+def svg_element(obj, precision=DEFAULT_PRECISION):
+    """Return the SVG element for a drawable."""
+    n = lambda value: _number(value, precision)
+    transform = _transform(obj, precision)
+    if isinstance(obj, FreeForm):
+        return ('<path d="%s" fill="none" stroke="%s" stroke-width="1" '
+                'vector-effect="non-scaling-stroke"%s/>' % (
+                    _path_data(obj.coordinates, precision),
+                    css_color(obj.line_color), transform))
+
+    style = 'fill="%s" stroke="%s" stroke-width="1"%s' % (
+        css_color(obj.fill_color), css_color(obj.line_color), transform)
+    x1, y1, x2, y2 = obj.local_bounding_box
+    if isinstance(obj, Ellipse):
+        # Same shape as `Ellipse._draw_ellipse`.
+        d_x, d_y = x2 - x1, y2 - y1
+        radius_x = abs(d_x / 2.0 - 0.5)
+        radius_y = radius_x * d_y / (d_x or 1.0)
+        c_x, c_y = obj.centroid
+        return '<ellipse cx="%s" cy="%s" rx="%s" ry="%s" %s/>' % (
+            n(c_x), n(c_y), n(radius_x), n(radius_y), style)
+    if isinstance(obj, Rectangle):
+        width, height = max(x2 - x1 - 1, 0), max(y2 - y1 - 1, 0)
+        return '<rect x="%s" y="%s" width="%s" height="%s" %s/>' % (
+            n(x1 + 0.5), n(y1 + 0.5), n(width), n(height), style)
+    raise TypeError("cannot export %r to SVG" % (obj,))
+
+
+def _bounds(objects):
+    """Return the (x1, y1, x2, y2) box enclosing all drawables, or None."""
+    bounds = None
+    for obj in objects:
+        x1, y1, x2, y2 = obj.bounding_box
+        if bounds is None:
+            bounds = [x1, y1, x2, y2]
+        else:
+            bounds[0] = min(bounds[0], x1)
+            bounds[1] = min(bounds[1], y1)
+            bounds[2] = max(bounds[2], x2)
+            bounds[3] = max(bounds[3], y2)
+    return bounds
+
+
+def write_svg(objects, fileobj, bounds=None, background=None, precision=DEFAULT_PRECISION):
+    """Write the drawables in `objects` to `fileobj` as an SVG document.
+
+    Optional arguments:
+    bounds -- the (x1, y1, x2, y2) world-space box to show. By default it
+              encloses all drawables, which takes an extra pass over them,
+              unless `objects` is an iterator, which is only read once and
+              then gives an SVG without a view box.
+    background -- color of a rectangle drawn behind the drawables
+    precision -- number of decimals kept in coordinates
+    """
+    n = lambda value: _number(value, precision)
+    if bounds is None and iter(objects) is not objects:
+        bounds = _bounds(objects)
+    if bounds:
+        x1, y1, x2, y2 = bounds
+        size = ' width="%s" height="%s" viewBox="%s %s %s %s"' % (
+            n(x2 - x1), n(y2 - y1), n(x1), n(y1), n(x2 - x1), n(y2 - y1))
+    else:
+        size = ""
+    fileobj.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<svg xmlns="http://www.w3.org/2000/svg" version="1.1"%s>\n' % size)
+    if background is not None and bounds:
+        fileobj.write('<rect x="%s" y="%s" width="%s" height="%s" fill="%s"/>\n' % (
+            n(x1), n(y1), n(x2 - x1), n(y2 - y1), css_color(background)))
+    for obj in objects:
+        fileobj.write(svg_element(obj, precision))
+        fileobj.write("\n")
+    fileobj.write("</svg>\n")
+
+
+def export_svg(objects, path, **options):
+    """Write the drawables in `objects` to an SVG file at `path`.
+
+    Takes the same optional arguments as `write_svg`.
+
+    """
+    output = open(path, "w")
+    try:
+        write_svg(objects, output, **options)
+    finally:
+        output.close()
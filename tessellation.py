@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+# Shared tessellation of circles and disks.
+#
+# Circles are approximated by regular polygons whose number of segments
+# depends on the on-screen radius and is always a power of two between
+# MIN_SEGMENTS and MAX_SEGMENTS, so only a handful of unit circles ever need
+# to be computed. They are computed once and reused by every ellipse and
+# construction guide.
+
+from math import acos, cos, sin, pi
+
+from OpenGL.GL import *
+
+MIN_SEGMENTS = 8
+MAX_SEGMENTS = 128
+
+# Maximum distance, in pixels, between a circle and its polygon.
+TOLERANCE = 0.25
+
+_unit_circles = {}
+_unit_disks = {}
+
+
+def segments_for(radius):
+    """Return the number of segments to use for a circle of `radius` pixels."""
+    radius = abs(radius)
+    if radius <= TOLERANCE:
+        return MIN_SEGMENTS
+    # The sagitta of a segment spanning an angle 2*pi/n is r*(1 - cos(pi/n)).
+    needed = pi / acos(1.0 - TOLERANCE / radius)
+    segments = MIN_SEGMENTS
+    while segments < needed and segments < MAX_SEGMENTS:
+        segments *= 2
+    return segments
+
+
+def unit_circle(segments):
+    """Return a list of `segments` + 1 (x, y) points around the unit circle.
+
+    The last point repeats the first one, closing the circle.
+
+    """
+    if segments not in _unit_circles:
+        step = 2.0 * pi / segments
+        points = [(cos(i * step), sin(i * step)) for i in xrange(segments)]
+        points.append(points[0])
+        _unit_circles[segments] = points
+    return _unit_circles[segments]
+
+
+def _unit_disk(segments):
+    """Return a GLfloat array holding a triangle fan for the unit disk."""
+    if segments not in _unit_disks:
+        vertices = [0.0, 0.0]
+        for x, y in unit_circle(segments):
+            vertices.extend((x, y))
+        _unit_disks[segments] = (GLfloat * len(vertices))(*vertices)
+    return _unit_disks[segments]
+
+
+def draw_unit_disk(segments):
+    """Draw a filled unit disk centered at the origin."""
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, _unit_disk(segments))
+    glDrawArrays(GL_TRIANGLE_FAN, 0, segments + 2)
+    glDisableClientState(GL_VERTEX_ARRAY)
+
+
+def draw_disk(radius_x, radius_y, on_screen_radius=None):
+    """Draw a filled disk/ellipse centered at the origin.
+
+    `on_screen_radius` is the largest radius in pixels, used to choose the
+    number of segments. It defaults to the largest of `radius_x` and
+    `radius_y`.
+
+    """
+    if on_screen_radius is None:
+        on_screen_radius = max(abs(radius_x), abs(radius_y))
+    glPushMatrix()
+    glScale(radius_x, radius_y, 1.0)
+    draw_unit_disk(segments_for(on_screen_radius))
+    glPopMatrix()
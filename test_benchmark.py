@@ -0,0 +1,49 @@
+import unittest
+from benchmark import RecordingGL, compare
+
+
+class RecordingGLTests(unittest.TestCase):
+    def test_counts(self):
+        gl = RecordingGL()
+        glVertex2f, glDrawArrays = gl.function("glVertex2f"), gl.function("glDrawArrays")
+        glVertex2f(0, 0)
+        glVertex2f(1, 1)
+        glDrawArrays(4, 0, 6)
+        self.assertEqual(gl.calls, {"glVertex2f": 2, "glDrawArrays": 1})
+        self.assertEqual((gl.total_calls, gl.vertices), (3, 8))
+        gl.reset()
+        glVertex2f(0, 0)
+        self.assertEqual((gl.total_calls, gl.vertices), (1, 1))
+
+    def test_timers(self):
+        gl = RecordingGL()
+        glutTimerFunc = gl.function("glutTimerFunc")
+        fired = []
+        def callback(value):
+            fired.append(value)
+            if value < 3:
+                glutTimerFunc(10, callback, value + 1)
+        glutTimerFunc(0, callback, 1)
+        gl.run_timers()
+        self.assertEqual(fired, [1, 2, 3])
+
+
+class CompareTests(unittest.TestCase):
+    def test_regressions(self):
+        baseline = {
+            "draw/100": {"seconds": 1.0, "gl_calls": 10},
+            "select/100": {"seconds": 1.0},
+            "gone/100": {"seconds": 1.0},
+        }
+        results = {
+            "draw/100": {"seconds": 1.2, "gl_calls": 12},
+            "select/100": {"seconds": 1.5},
+            "new/100": {"seconds": 9.0},
+        }
+        self.assertEqual([name for name, message in compare(results, baseline, 0.25)],
+                         ["draw/100", "select/100"])
+        self.assertEqual(compare(baseline, baseline), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
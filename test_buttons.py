@@ -0,0 +1,39 @@
+import unittest
+
+import buttons
+
+
+ICONS = ("draw-ellipse", "draw-rectangle", "tool-pointer")
+
+
+class IconAtlasTests(unittest.TestCase):
+    def setUp(self):
+        self.atlas = buttons.IconAtlas(32)
+        for name in ICONS:
+            self.atlas.add(name)
+
+    def test_power_of_two(self):
+        self.assertEqual(self.atlas.texture_size, (128, 64))
+        self.assertEqual(self.atlas._pack().size, (128, 64))
+
+    def test_cells_repeat_their_edges(self):
+        image = self.atlas._pack()
+        width, height = image.size
+        for name in ICONS:
+            u1, v1, u2, v2 = self.atlas.tex_coords(name)
+            left, right = int(round(u1 * width)), int(round(u2 * width))
+            # The image is uploaded bottom row first.
+            top, bottom = height - int(round(v2 * height)), height - int(round(v1 * height))
+            self.assertEqual((right - left, bottom - top), (32, 32))
+            icon = image.crop((left, top, right, bottom))
+            self.assertEqual(list(icon.getdata()), list(self.atlas._images[name].getdata()))
+            for y in range(top, bottom):
+                self.assertEqual(image.getpixel((left - 1, y)), image.getpixel((left, y)))
+                self.assertEqual(image.getpixel((right, y)), image.getpixel((right - 1, y)))
+            for x in range(left, right):
+                self.assertEqual(image.getpixel((x, top - 1)), image.getpixel((x, top)))
+                self.assertEqual(image.getpixel((x, bottom)), image.getpixel((x, bottom - 1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import cPickle as pickle
+import os
+import tempfile
+import time
+import unittest
+from array import array
+from StringIO import StringIO
+
+from document import (DocumentError, DocumentLoader, write_document, iter_document,
+                      iter_any_document, DEFAULT_QUANTUM)
+from drawables import Rectangle, Ellipse, FreeForm
+from geometry import Point
+
+
+BLACK = (0.0, 0.0, 0.0, 1.0)
+YELLOW = (1.0, 1.0, 0.0, 1.0)
+PINK = (0.82, 0.5, 0.7, 0.25)
+
+
+def sample_objects():
+    rectangle = Rectangle(BLACK, YELLOW, (10, 20), (60.5, 80))
+    rectangle.finish()
+    rectangle.move((0, 0), (3, -4))
+    ellipse = Ellipse(PINK, BLACK, (100, 100), (130, 170))
+    ellipse.finish()
+    ellipse.resize((120, 140), (150, 150))
+    free_form = FreeForm(YELLOW, PINK, (5, 5))
+    for x, y in ((7, 9), (20, 3), (21, 30), (-4, 12)):
+        free_form.construct(x, y)
+    free_form.finish()
+    unfinished = Rectangle(BLACK, BLACK, (1, 1), (2, 2))
+    return [rectangle, ellipse, free_form, unfinished]
+
+
+class DocumentTests(unittest.TestCase):
+    def assertSameDrawables(self, loaded, objects):
+        self.assertEqual(len(loaded), len(objects))
+        for new, old in zip(loaded, objects):
+            self.assertEqual(type(new), type(old))
+            self.assertEqual(new.fill_color, old.fill_color)
+            self.assertEqual(new.line_color, old.line_color)
+            self.assertEqual(new.finished, old.finished)
+            self.assertEqual(new.translation_vector, old.translation_vector)
+            self.assertEqual(new.resize_vector, old.resize_vector)
+            if isinstance(old, FreeForm):
+                self.assertEqual(len(new.points), len(old.points))
+                for p, q in zip(new.points, old.points):
+                    self.assertTrue((p - q).hypot <= 1.0 / DEFAULT_QUANTUM)
+            else:
+                self.assertEqual((new.corner1, new.corner2), (old.corner1, old.corner2))
+
+    def roundtrip(self, compress):
+        objects = sample_objects()
+        out = StringIO()
+        write_document(objects, out, compress=compress)
+        self.assertSameDrawables(list(iter_document(StringIO(out.getvalue()))), objects)
+        return out.getvalue()
+
+    def test_roundtrip(self):
+        self.roundtrip(compress=False)
+        self.roundtrip(compress=True)
+
+    def test_empty(self):
+        out = StringIO()
+        write_document([], out)
+        self.assertEqual(list(iter_document(StringIO(out.getvalue()))), [])
+
+    def test_truncated(self):
+        data = self.roundtrip(compress=False)
+        self.assertRaises(DocumentError, list, iter_document(StringIO(data[:-20])))
+        self.assertRaises(DocumentError, list, iter_document(StringIO("nonsense")))
+
+    def test_corrupt(self):
+        objects = [Rectangle(BLACK, YELLOW, (i, i), (i + 5, i + 5)) for i in xrange(500)]
+        out = StringIO()
+        write_document(objects, out, compress=True)
+        data = out.getvalue()
+        middle = len(data) // 2
+        corrupt = data[:middle] + "\xff" * 200 + data[middle + 200:]
+        self.assertRaises(DocumentError, list, iter_document(StringIO(corrupt)))
+
+        out = StringIO()
+        write_document(objects[:1], out, compress=False, quantum=0)
+        self.assertRaises(DocumentError, list, iter_document(StringIO(out.getvalue())))
+
+        empty = FreeForm(BLACK, YELLOW, (0, 0))
+        empty.coordinates = array('d')
+        out = StringIO()
+        write_document([empty], out, compress=False)
+        self.assertRaises(DocumentError, list, iter_document(StringIO(out.getvalue())))
+
+    def test_legacy(self):
+        objects = sample_objects()
+        legacy = StringIO(pickle.dumps(objects))
+        self.assertSameDrawables(list(iter_any_document(legacy)), objects)
+
+    def test_legacy_rejects_other_globals(self):
+        malicious = StringIO("cos\nsystem\n(S'true'\ntR.")
+        self.assertRaises(DocumentError, iter_any_document, malicious)
+
+
+
+class DocumentLoaderTests(unittest.TestCase):
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix=".ryk")
+        os.close(handle)
+        self.objects = [Rectangle(BLACK, YELLOW, (i, i), (i + 5, i + 5)) for i in xrange(3000)]
+        out = StringIO()
+        write_document(self.objects, out, compress=True)
+        self.data = out.getvalue()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def load(self, data):
+        with open(self.path, "wb") as f:
+            f.write(data)
+        loader = DocumentLoader(self.path, batch_size=100)
+        loaded = []
+        deadline = time.time() + 10
+        while not loader.done and time.time() < deadline:
+            loaded.extend(loader.next_batch() or [])
+        self.assertTrue(loader.done)
+        return loader, loaded
+
+    def test_load(self):
+        loader, loaded = self.load(self.data)
+        self.assertTrue(loader.error is None)
+        self.assertEqual(len(loaded), len(self.objects))
+
+    def test_corrupt(self):
+        middle = len(self.data) // 2
+        loader, loaded = self.load(self.data[:middle] + "\xff" * 200 + self.data[middle + 200:])
+        self.assertTrue(isinstance(loader.error, DocumentError))
+        self.assertTrue(len(loaded) < len(self.objects))
+
+        loader, loaded = self.load(self.data[:middle])
+        self.assertTrue(isinstance(loader.error, DocumentError))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import random
+import unittest
+from array import array
+
+from benchmark import RecordingGL
+from drawables import Detail, Drawable, Rectangle, Ellipse, FreeForm
+from geometry import Point
+import drawables
+import tessellation
+
+
+class DisplayListTests(unittest.TestCase):
+    def setUp(self):
+        # Record the GL calls of the modules which draw.
+        self.gl = RecordingGL()
+        self.replaced = []
+        for module in (drawables, tessellation):
+            namespace = vars(module)
+            for name, function in namespace.items():
+                if name.startswith("gl") and callable(function):
+                    self.replaced.append((namespace, name, function))
+                    namespace[name] = self.gl.function(name)
+
+    def tearDown(self):
+        for namespace, name, function in self.replaced:
+            namespace[name] = function
+
+    def draw(self, obj, detail=drawables.DEFAULT_DETAIL):
+        self.gl.reset()
+        obj.draw(detail, display_list=True)
+        return dict(self.gl.calls)
+
+    def test_reused_until_shape_changes(self):
+        rectangle = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        rectangle.finish()
+        self.assertEqual(self.draw(rectangle).get("glNewList"), 1)
+        calls = self.draw(rectangle)
+        self.assertFalse("glNewList" in calls or "glRectf" in calls)
+        self.assertEqual(calls["glCallList"], 1)
+
+        rectangle.move((0, 0), (5, 5))
+        rectangle.resize((15, 10), (30, 20))
+        self.assertFalse("glNewList" in self.draw(rectangle))
+        rectangle.fill_color = (1, 0, 0, 1)
+        self.assertEqual(self.draw(rectangle).get("glNewList"), 1)
+
+    def test_unfinished_objects_are_drawn_directly(self):
+        stroke = FreeForm((0, 0, 0, 1), (1, 1, 1, 1), (0, 0))
+        stroke.construct(10, 10)
+        calls = self.draw(stroke)
+        self.assertFalse("glNewList" in calls)
+        self.assertTrue(self.gl.vertices > 0)
+
+    def test_ellipse_recompiled_for_new_tessellation(self):
+        ellipse = Ellipse((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        ellipse.finish()
+        self.draw(ellipse)
+        vertices = self.gl.vertices
+        self.assertEqual(self.draw(ellipse, Detail(16.0, 1.0)).get("glNewList"), 1)
+        self.assertTrue(self.gl.vertices > vertices)
+
+    def test_release(self):
+        rectangle = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        rectangle.finish()
+        self.draw(rectangle)
+        rectangle.release()
+        rectangle.release()
+        self.gl.reset()
+        Drawable.delete_released_lists()
+        self.assertEqual(self.gl.calls, {"glDeleteLists": 1})
+        self.assertEqual(self.draw(rectangle).get("glGenLists"), 1)
+
+
+def world_contains(obj, (x, y)):
+    """Hit-test of rectangles and ellipses on world-space corners."""
+    corner1, corner2 = obj.denormalized(obj.corner1), obj.denormalized(obj.corner2)
+    if isinstance(obj, Rectangle):
+        return (min(corner1.x, corner2.x) <= x <= max(corner1.x, corner2.x) and
+                min(corner1.y, corner2.y) <= y <= max(corner1.y, corner2.y))
+    a, b = (corner1 - corner2) / 2.0
+    xc, yc = (corner1 + corner2) / 2.0
+    return round((x - xc) ** 2 / a ** 2 + (y - yc) ** 2 / b ** 2 - 1, 2) <= 0.01
+
+
+class HitTestTests(unittest.TestCase):
+    def test_same_as_world_space(self):
+        rng = random.Random(5)
+        for i in xrange(200):
+            cls = Rectangle if i % 2 else Ellipse
+            obj = cls((0, 0, 0, 1), (1, 1, 1, 1), (rng.uniform(0, 50), rng.uniform(0, 50)),
+                      (rng.uniform(60, 100), rng.uniform(60, 100)))
+            obj.finish()
+            obj.resize_vector = Point(rng.choice((-1, 1)) * rng.uniform(0.1, 5),
+                                      rng.choice((-1, 1)) * rng.uniform(0.1, 5))
+            x1, y1, x2, y2 = obj.bounding_box
+            for j in xrange(20):
+                point = (rng.uniform(x1 - 5, x2 + 5), rng.uniform(y1 - 5, y2 + 5))
+                self.assertEqual(point in obj, world_contains(obj, point))
+
+    def test_flat_shapes(self):
+        ellipse = Ellipse((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 0))
+        self.assertTrue((10, 0) in ellipse)
+        self.assertFalse((10, 1) in ellipse)
+        ellipse.corner2 = Point(20, 10)
+        ellipse.finish()
+        ellipse.resize_vector = Point(0, 1)
+        self.assertTrue((ellipse.translation_vector.x, ellipse.translation_vector.y + 4) in ellipse)
+        self.assertFalse((ellipse.translation_vector.x + 1, ellipse.translation_vector.y) in ellipse)
+        rectangle = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        rectangle.resize_vector = Point(1, 0)
+        self.assertTrue((15, 0) in rectangle)
+        self.assertFalse((15, 1) in rectangle)
+
+    def test_free_form_threshold_in_world_space(self):
+        stroke = FreeForm((0, 0, 0, 1), (1, 1, 1, 1), (0, 0))
+        stroke.coordinates = array('d', [0, 0, 10, 0])
+        stroke.resize_vector = Point(1, 0.1)
+        self.assertTrue((5, stroke.threshold - 0.5) in stroke)
+        self.assertFalse((5, stroke.threshold + 0.5) in stroke)
+        stroke = FreeForm((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), threshold=6)
+        stroke.coordinates = array('d', [0, 0, 10, 0])
+        self.assertTrue((5, 5.5) in stroke)
+
+
+if __name__ == "__main__":
+    unittest.main()
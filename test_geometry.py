@@ -1,28 +1,267 @@
-import unittest
-from geometry import Point
-
-
-class PointTests(unittest.TestCase):
-    def test_arithmetic(self):
-        self.assertEqual(Point(4, 5) + Point(1, -3), Point(5, 2))
-        self.assertEqual(Point(4, 5) - Point(1, -3), Point(3, 8))
-        self.assertEqual((Point(4, 5) + Point(1, -3)) / 2.0, Point(2.5, 1.0))
-        self.assertEqual(Point(4, 5) * 2.0, Point(8.0, 10.0))
-
-    def test_comparison(self):
-        self.assertTrue(Point(1, 1) < Point(2, 3))
-        self.assertTrue(Point(10, 1) < Point(5, 9))
-        self.assertTrue(Point(10, 5) > Point(5, 6))
-        self.assertTrue(Point(1, 5) == Point(1, 5))
-        self.assertTrue(Point(2, 5) != Point(1, 5))
-        self.assertTrue(Point(1, 1) <= Point(1, 1))
-        self.assertTrue(Point(0, 1) <= Point(1, 1))
-        self.assertTrue(Point(5, 6) >= Point(5, 6))
-        self.assertTrue(Point(10, 5) >= Point(5, 6))
-
-    def test_aggregation(self):
-        self.assertTrue(Point(4, 6) & Point(2, 3), (4, 6, 2, 3))
-
-
-if __name__ == "__main__":
+import random
+import unittest
+from array import array
+
+import geometry
+from geometry import Point, PointArray, PointView, polyline_near, simplify_polyline, polyline_pyramid
+
+
+class PointTests(unittest.TestCase):
+    def test_arithmetic(self):
+        self.assertEqual(Point(4, 5) + Point(1, -3), Point(5, 2))
+        self.assertEqual(Point(4, 5) - Point(1, -3), Point(3, 8))
+        self.assertEqual((Point(4, 5) + Point(1, -3)) / 2.0, Point(2.5, 1.0))
+        self.assertEqual(Point(4, 5) * 2.0, Point(8.0, 10.0))
+
+    def test_comparison(self):
+        self.assertTrue(Point(1, 1) < Point(2, 3))
+        self.assertTrue(Point(10, 1) < Point(5, 9))
+        self.assertTrue(Point(10, 5) > Point(5, 6))
+        self.assertTrue(Point(1, 5) == Point(1, 5))
+        self.assertTrue(Point(2, 5) != Point(1, 5))
+        self.assertTrue(Point(1, 1) <= Point(1, 1))
+        self.assertTrue(Point(0, 1) <= Point(1, 1))
+        self.assertTrue(Point(5, 6) >= Point(5, 6))
+        self.assertTrue(Point(10, 5) >= Point(5, 6))
+
+    def test_aggregation(self):
+        self.assertTrue(Point(4, 6) & Point(2, 3), (4, 6, 2, 3))
+
+
+class PointViewTests(unittest.TestCase):
+    def test_sequence(self):
+        view = PointView(array('d', [1, 2, 3, 4, 5, 6]))
+        self.assertEqual(len(view), 3)
+        self.assertEqual(view[0], Point(1, 2))
+        self.assertEqual(view[-1], Point(5, 6))
+        self.assertEqual(view[1:], [Point(3, 4), Point(5, 6)])
+        self.assertEqual(list(view), [Point(1, 2), Point(3, 4), Point(5, 6)])
+        self.assertEqual(view, [Point(1, 2), Point(3, 4), Point(5, 6)])
+        self.assertRaises(IndexError, lambda: view[3])
+
+    def test_follows_storage(self):
+        coordinates = array('d', [1, 2])
+        view = PointView(coordinates)
+        coordinates.extend((3, 4))
+        self.assertEqual(view[-1], Point(3, 4))
+
+
+class PointArrayTests(unittest.TestCase):
+    def corpus(self):
+        """Yield lists of points, short ones handled in pure Python and long
+        ones with NumPy if it is installed.
+        """
+        rng = random.Random(3)
+        for n in (1, 2, 5, geometry.VECTORIZE_MIN_POINTS, 300):
+            points = [Point(rng.uniform(-100, 100), rng.uniform(-100, 100)) for i in xrange(n)]
+            # Coincident points make segments of length 0.
+            points[n // 2:n // 2] = [points[n // 2 - 1]] if n > 1 else []
+            yield points
+
+    def check(self, points):
+        array = PointArray.from_points(points)
+        self.assertEqual(list(array), points)
+        self.assertEqual(list(array.copy().translate(Point(2.5, -1))),
+                         [p + Point(2.5, -1) for p in points])
+        self.assertEqual(list(array.copy().scale((2, -0.5))),
+                         [Point(p.x * 2, p.y * -0.5) for p in points])
+        self.assertEqual(list(array.copy().scale(3)), [p * 3 for p in points])
+        centroid = reduce(Point.__add__, points) / float(len(points))
+        self.assertAlmostEqual(array.centroid.x, centroid.x)
+        self.assertAlmostEqual(array.centroid.y, centroid.y)
+        self.assertEqual(array.bounding_box,
+                         (min(p.x for p in points), min(p.y for p in points),
+                          max(p.x for p in points), max(p.y for p in points)))
+        q = Point(3, 4)
+        for distance, p in zip(array.hypot(q), points):
+            self.assertAlmostEqual(distance, (p - q).hypot)
+        distances = array.segment_distances(q)
+        self.assertEqual(len(distances), len(points) - 1)
+        for distance, p1, p2 in zip(distances, points, points[1:]):
+            self.assertEqual(reference_polyline_near([p1, p2], q, distance + 1e-9), True)
+            self.assertEqual(reference_polyline_near([p1, p2], q, distance - 1e-6), False)
+
+    def test_operations(self):
+        for points in self.corpus():
+            self.check(points)
+
+    @unittest.skipIf(geometry.numpy is None, "NumPy is not installed")
+    def test_operations_without_numpy(self):
+        numpy = geometry.numpy
+        geometry.numpy = None
+        try:
+            for points in self.corpus():
+                self.check(points)
+        finally:
+            geometry.numpy = numpy
+
+    def test_shares_storage(self):
+        coordinates = array('d', [1, 2, 3, 4])
+        points = PointArray(coordinates)
+        points.translate((1, 1))
+        points[0] = Point(0, 0)
+        points.append((7, 8))
+        self.assertEqual(list(coordinates), [0, 0, 4, 5, 7, 8])
+        self.assertRaises(ValueError, lambda: PointArray().centroid)
+
+
+def reference_polyline_near(points, q, threshold):
+    """Point-by-point implementation the optimized ones must agree with."""
+    for p1, p2 in zip(points, points[1:]):
+        if p1 == p2:
+            distance = (q - p1).hypot
+        else:
+            u = (((q.x - p1.x) * (p2.x - p1.x) + (q.y - p1.y) * (p2.y - p1.y)) /
+                 ((p2 - p1).hypot ** 2.0))
+            if 0 <= u <= 1:
+                p = Point(p1.x + u * (p2.x - p1.x), p1.y + u * (p2.y - p1.y))
+                distance = (p - q).hypot
+            else:
+                distance = min((p1 - q).hypot, (p2 - q).hypot)
+        if distance <= threshold:
+            return True
+    return False
+
+
+class PolylineNearTests(unittest.TestCase):
+    def setUp(self):
+        # Make the vectorized implementation go through several chunks.
+        self.chunk = geometry.VECTORIZE_CHUNK
+        geometry.VECTORIZE_CHUNK = 64
+
+    def tearDown(self):
+        geometry.VECTORIZE_CHUNK = self.chunk
+
+    def corpus(self):
+        """Yield (coordinates, scale, offset, query) cases."""
+        rng = random.Random(7)
+        for n in (1, 2, 3, 10, 100, 500):
+            coordinates = array('d')
+            x, y = rng.uniform(-50, 50), rng.uniform(-50, 50)
+            for i in xrange(n):
+                # Include repeated points and sharp turns.
+                if rng.random() > 0.1:
+                    x += rng.uniform(-8, 8)
+                    y += rng.uniform(-8, 8)
+                coordinates.extend((x, y))
+            for scale, offset in (((1.0, 1.0), (0.0, 0.0)),
+                                  ((2.5, 0.5), (100.0, -30.0)),
+                                  ((-1.0, 3.0), (7.0, 7.0))):
+                for i in xrange(40):
+                    query = Point(rng.uniform(-150, 250), rng.uniform(-150, 250))
+                    yield coordinates, scale, offset, query
+
+    def expected(self, coordinates, scale, offset, query):
+        points = [Point(coordinates[i] * scale[0] + offset[0],
+                        coordinates[i + 1] * scale[1] + offset[1])
+                  for i in xrange(0, len(coordinates), 2)]
+        return reference_polyline_near(points, query, 3)
+
+    def near(self, implementation, coordinates, scale, offset, query):
+        query = geometry._local_query(query.x, query.y, 3, scale, offset)
+        return query is not None and implementation(coordinates, *query)
+
+    def test_python(self):
+        for coordinates, scale, offset, query in self.corpus():
+            self.assertEqual(
+                self.near(geometry._polyline_near_python, coordinates, scale, offset, query),
+                self.expected(coordinates, scale, offset, query))
+
+    @unittest.skipIf(geometry.numpy is None, "NumPy is not installed")
+    def test_numpy(self):
+        for coordinates, scale, offset, query in self.corpus():
+            if len(coordinates) < 4:
+                continue
+            self.assertEqual(
+                self.near(geometry._polyline_near_numpy, coordinates, scale, offset, query),
+                self.expected(coordinates, scale, offset, query))
+
+    def test_hits(self):
+        coordinates = array('d', [0, 0, 10, 0] * 40)
+        self.assertTrue(polyline_near(coordinates, 5, 2, 3))
+        self.assertFalse(polyline_near(coordinates, 5, 4, 3))
+        self.assertTrue(polyline_near(coordinates, 25, 2, 3, (3, 1), (0, 0)))
+
+    def test_anisotropic_scale(self):
+        # The threshold is measured after scaling, along each axis.
+        coordinates = array('d', [0, 0, 1, 0] * 40)
+        for count in (4, len(coordinates)):
+            segment = coordinates[:count]
+            self.assertTrue(polyline_near(segment, 5, 2.5, 3, (10, 0.1), (0, 0)))
+            self.assertFalse(polyline_near(segment, 5, 3.5, 3, (10, 0.1), (0, 0)))
+            self.assertTrue(polyline_near(segment, 12.5, 0, 3, (10, 0.1), (0, 0)))
+            self.assertFalse(polyline_near(segment, 13.5, 0, 3, (10, 0.1), (0, 0)))
+
+    def test_zero_scale(self):
+        coordinates = array('d', [0, 0, 10, 5] * 40)
+        for count in (4, len(coordinates)):
+            segment = coordinates[:count]
+            # Squashed onto the vertical line x = 1, from y = 2 to y = 7.
+            self.assertTrue(polyline_near(segment, 3.5, 5, 3, (0, 1), (1, 2)))
+            self.assertFalse(polyline_near(segment, 4.5, 5, 3, (0, 1), (1, 2)))
+            self.assertFalse(polyline_near(segment, 1, 10.5, 3, (0, 1), (1, 2)))
+            # Squashed onto the point (1, 2).
+            self.assertTrue(polyline_near(segment, 3, 3, 3, (0, 0), (1, 2)))
+            self.assertFalse(polyline_near(segment, 4, 4, 3, (0, 0), (1, 2)))
+
+
+class SimplifyPolylineTests(unittest.TestCase):
+    def stroke(self):
+        rng = random.Random(11)
+        coordinates = array('d')
+        x = y = 0.0
+        for i in xrange(2000):
+            x += rng.choice((0, 1, 1, 2))
+            y += rng.choice((-1, 0, 0, 1))
+            coordinates.extend((x, y))
+        return coordinates
+
+    def check_bound(self, original, simplified, tolerance):
+        for i in xrange(0, len(original), 2):
+            self.assertTrue(polyline_near(simplified, original[i], original[i + 1],
+                                          tolerance + 1e-9))
+
+    def test_collinear(self):
+        coordinates = array('d', [0, 0, 1, 1, 2, 2, 3, 3, 4, 0])
+        self.assertEqual(simplify_polyline(coordinates, 0.1),
+                         array('d', [0, 0, 3, 3, 4, 0]))
+
+    def test_short_and_disabled(self):
+        self.assertEqual(simplify_polyline(array('d', [0, 0, 5, 5]), 1),
+                         array('d', [0, 0, 5, 5]))
+        stroke = self.stroke()
+        self.assertEqual(simplify_polyline(stroke, 0), stroke)
+
+    def test_bound(self):
+        stroke = self.stroke()
+        simplified = simplify_polyline(stroke, 1.0)
+        self.assertTrue(len(simplified) < len(stroke) / 3)
+        self.assertEqual(simplified[:2], stroke[:2])
+        self.assertEqual(simplified[-2:], stroke[-2:])
+        self.check_bound(stroke, simplified, 1.0)
+
+    def test_python_fallback(self):
+        stroke = self.stroke()
+        numpy = geometry.numpy
+        geometry.numpy = None
+        try:
+            simplified = simplify_polyline(stroke, 1.0)
+        finally:
+            geometry.numpy = numpy
+        self.assertEqual(simplified, simplify_polyline(stroke, 1.0))
+
+    def test_pyramid(self):
+        stroke = self.stroke()
+        pyramid = polyline_pyramid(stroke, 0.5)
+        self.assertEqual(len(pyramid[-1][1]), 4)
+        previous_error, previous = 0.0, stroke
+        for error, simplified in pyramid:
+            self.assertTrue(error > previous_error)
+            self.assertTrue(len(simplified) < len(previous))
+            self.check_bound(stroke, simplified, error)
+            previous_error, previous = error, simplified
+        self.assertEqual(polyline_pyramid(array('d', [0, 0, 5, 5]), 0.5), [])
+
+
+if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
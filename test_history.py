@@ -0,0 +1,101 @@
+import unittest
+
+from drawables import Rectangle, FreeForm
+from geometry import Point
+from history import History, Batch, Create, Delete, Move, Resize
+
+
+class Objects(list):
+    """Minimal stand-in for rysunek.ObjectList."""
+
+    selected = None
+
+    def update(self, obj):
+        pass
+
+
+def rectangle(x):
+    obj = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (x, x), (x + 10, x + 10))
+    obj.finish()
+    return obj
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.objects = Objects([rectangle(0), rectangle(20)])
+        self.history = History(budget=10000)
+
+    def test_create_and_delete(self):
+        created = rectangle(40)
+        self.objects.append(created)
+        self.history.push(Create(created, 2))
+        deleted = self.objects.pop(0)
+        self.history.push(Delete(deleted, 0))
+
+        self.assertTrue(self.history.undo(self.objects))
+        self.assertTrue(self.objects[0] is deleted)
+        self.assertTrue(self.history.undo(self.objects))
+        self.assertEqual(len(self.objects), 2)
+        self.assertFalse(self.history.undo(self.objects))
+
+        self.assertTrue(self.history.redo(self.objects))
+        self.assertTrue(self.objects[-1] is created)
+        self.assertTrue(self.history.redo(self.objects))
+        self.assertEqual(self.objects[:], [self.objects[0], created])
+        self.assertFalse(self.history.redo(self.objects))
+
+    def test_move_and_resize(self):
+        obj = self.objects[1]
+        translation, resize_vector = obj.translation_vector, obj.resize_vector
+        obj.move((0, 0), (5, 7))
+        self.history.push(Move(obj, 5, 7))
+        obj.resize_vector = Point(2, 3)
+        self.history.push(Resize(obj, resize_vector, obj.resize_vector))
+
+        self.history.undo(self.objects)
+        self.history.undo(self.objects)
+        self.assertEqual(obj.translation_vector, translation)
+        self.assertEqual(obj.resize_vector, resize_vector)
+        self.history.redo(self.objects)
+        self.history.redo(self.objects)
+        self.assertEqual(obj.translation_vector, translation + Point(5, 7))
+        self.assertEqual(obj.resize_vector, Point(2, 3))
+
+    def test_batch(self):
+        first, second = self.objects
+        first.move((0, 0), (5, 0))
+        second.move((0, 0), (5, 0))
+        self.history.push(Batch([Move(first, 5, 0), Move(second, 5, 0)]))
+
+        self.assertTrue(self.history.undo(self.objects))
+        self.assertEqual(first.translation_vector, Point(5, 5))
+        self.assertEqual(second.translation_vector, Point(25, 25))
+        self.assertFalse(self.history.can_undo)
+        self.history.redo(self.objects)
+        self.assertEqual(first.translation_vector, Point(10, 5))
+        self.assertEqual(second.translation_vector, Point(30, 25))
+
+    def test_push_clears_redo(self):
+        obj = self.objects[0]
+        self.history.push(Move(obj, 1, 1))
+        self.history.undo(self.objects)
+        self.history.push(Move(obj, 2, 2))
+        self.assertFalse(self.history.can_redo)
+
+    def test_budget(self):
+        history = History(budget=3000)
+        stroke = FreeForm((0, 0, 0, 1), (1, 1, 1, 1), (0, 0))
+        for i in xrange(100):
+            stroke.construct(i * 2, i % 2)
+        for i in xrange(50):
+            history.push(Move(self.objects[0], 1, 0))
+        history.push(Delete(stroke, 0))
+        self.assertTrue(history.size <= 3000)
+        self.assertTrue(history.can_undo)
+        # The most recent commands are kept.
+        history.undo(self.objects)
+        self.assertTrue(self.objects[0] is stroke)
+
+
+if __name__ == "__main__":
+    unittest.main()
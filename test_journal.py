@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from benchmark import RecordingGL
+from config import Config, default
+from document import write_document, iter_document
+from drawables import Rectangle
+from geometry import Point
+from journal import Journal
+import buttons
+import drawables
+import overlay
+import renderer
+import rysunek
+import tessellation
+import toolbar
+
+
+def rectangle(x):
+    obj = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (x, x), (x + 10, x + 10))
+    obj.finish()
+    return obj
+
+
+def write(path, objects):
+    with open(path, "wb") as f:
+        write_document(objects, f)
+
+
+class JournalTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.directory, "drawing.ryk")
+        self.journal_path = self.checkpoint + ".journal"
+        self.journals = []
+
+    def tearDown(self):
+        for journal in self.journals:
+            journal.close()
+        shutil.rmtree(self.directory)
+
+    def journal(self, compact_every=1000):
+        journal = Journal(self.checkpoint, self.journal_path, compact_every)
+        self.journals.append(journal)
+        return journal
+
+    def attached(self, compact_every=1000):
+        objects = rysunek.ObjectList()
+        journal = self.journal(compact_every)
+        journal.attach(objects, recovered=False)
+        return objects, journal
+
+    def test_round_trip(self):
+        objects, journal = self.attached()
+        for x in (0, 20, 40):
+            objects.append(rectangle(x))
+        objects[1].move((0, 0), (5, 7))
+        objects.update(objects[1])
+        objects.pop(0)
+        journal.flush()
+
+        recovered = self.journal().recover()
+        self.assertEqual([obj.translation_vector for obj in recovered],
+                         [Point(30, 32), Point(45, 45)])
+
+    def test_frames_reach_the_disk(self):
+        objects, journal = self.attached()
+        for x in xrange(5):
+            objects.append(rectangle(x))
+        # No flush: the frames must be written once the writer is idle.
+        deadline = time.time() + 5
+        while time.time() < deadline and len(self.journal().recover()) < 5:
+            time.sleep(0.01)
+        self.assertEqual(len(self.journal().recover()), 5)
+
+    def test_stale_journal(self):
+        objects, journal = self.attached()
+        objects.append(rectangle(0))
+        journal.flush()
+        journal.close()
+        # The checkpoint is replaced behind the journal's back.
+        write(self.checkpoint, [rectangle(50), rectangle(60)])
+
+        journal = self.journal()
+        recovered = rysunek.ObjectList(journal.recover())
+        self.assertEqual(len(recovered), 2)
+        # Attaching restarts the journal for the new checkpoint.
+        journal.attach(recovered)
+        recovered.append(rectangle(70))
+        journal.flush()
+        self.assertEqual(len(self.journal().recover()), 3)
+
+    def test_compaction(self):
+        objects, journal = self.attached(compact_every=3)
+        for x in xrange(7):
+            objects.append(rectangle(x))
+        journal.flush()
+        with open(self.checkpoint, "rb") as f:
+            self.assertEqual(len(list(iter_document(f))), 6)
+        journal = self.journal()
+        recovered = journal.recover()
+        self.assertEqual(len(recovered), 7)
+        self.assertEqual(journal.replay(recovered[:6]), 1)
+
+    def test_torn_final_frame(self):
+        objects, journal = self.attached()
+        for x in xrange(3):
+            objects.append(rectangle(x))
+        journal.flush()
+        journal.close()
+        with open(self.journal_path, "rb") as f:
+            data = f.read()
+
+        with open(self.journal_path, "wb") as f:
+            f.write(data[:-5])
+        self.assertEqual(len(self.journal().recover()), 2)
+
+        with open(self.journal_path, "wb") as f:
+            f.write(data[:-5] + chr(ord(data[-5]) ^ 0xff) + data[-4:])
+        self.assertEqual(len(self.journal().recover()), 2)
+
+
+class AppStartupTests(unittest.TestCase):
+    def setUp(self):
+        # Let the app run without a display.
+        self.gl = RecordingGL()
+        self.replaced = []
+        for module in (rysunek, toolbar, buttons, overlay, drawables, renderer, tessellation):
+            namespace = vars(module)
+            for name, function in namespace.items():
+                if name.startswith("gl") and callable(function):
+                    self.replaced.append((namespace, name, function))
+                    namespace[name] = self.gl.function(name)
+        self.directory = tempfile.mkdtemp()
+        self.config = Config(default,
+                             temp_file=os.path.join(self.directory, "tmp.ryk"),
+                             journal_file=os.path.join(self.directory, "tmp.ryk.journal"))
+        self.app = None
+
+    def tearDown(self):
+        if self.app and self.app.journal:
+            self.app.journal.close()
+        for namespace, name, function in self.replaced:
+            namespace[name] = function
+        shutil.rmtree(self.directory)
+
+    def start(self, **options):
+        self.app = rysunek.App(Config(self.config, **options))
+        self.gl.run_timers()
+        return self.app
+
+    def test_default_config(self):
+        write(self.config.temp_file, [rectangle(x) for x in xrange(10)])
+        app = self.start()
+        self.assertEqual(len(app.context.objects), 10)
+        app.context.objects.append(rectangle(100))
+        app.journal.flush()
+        self.assertEqual(len(app.journal.recover()), 11)
+
+    def test_no_load_keeps_document(self):
+        write(self.config.temp_file, [rectangle(x) for x in xrange(10)])
+        with open(self.config.temp_file, "rb") as f:
+            saved = f.read()
+        app = self.start(auto_load_on_start=False)
+        app.context.objects.append(rectangle(100))
+        app.journal.flush()
+        with open(self.config.temp_file, "rb") as f:
+            self.assertEqual(f.read(), saved)
+
+        # An explicit save replaces it.
+        app.save()
+        app.journal.flush()
+        self.assertEqual(len(app.journal.recover()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from drawables import Rectangle, Ellipse, FreeForm
+from geometry import Point
+import raster
+from raster import SoftwareRenderer, export_png, export_png_tiles
+
+RED, GREEN, BLUE, WHITE = (1, 0, 0, 1), (0, 1, 0, 1), (0, 0, 1, 1), (1, 1, 1, 1)
+
+
+def scene():
+    rectangle = Rectangle(RED, GREEN, (10, 10), (30, 20))
+    rectangle.finish()
+    ellipse = Ellipse(BLUE, GREEN, (40, 0), (60, 40))
+    ellipse.finish()
+    # Drawn at twice its size, 50 units to the right.
+    ellipse.resize_vector = Point(2, 1)
+    ellipse.translation_vector += Point(50, 0)
+    ellipse.changed()
+    stroke = FreeForm(WHITE, RED, (0, 50))
+    stroke.construct(100, 50)
+    stroke.finish()
+    return [rectangle, ellipse, stroke]
+
+
+@unittest.skipIf(raster.numpy is None, "NumPy is not available")
+class SoftwareRendererTests(unittest.TestCase):
+    def color(self, pixels, x, y):
+        return tuple(pixels[y, x])
+
+    def test_shapes(self):
+        pixels = SoftwareRenderer(scene()).render(0, 0, 200, 60)
+        # Outline, then fill one unit inside.
+        self.assertEqual(self.color(pixels, 10, 10), (0, 255, 0))
+        self.assertEqual(self.color(pixels, 20, 15), (255, 0, 0))
+        self.assertEqual(self.color(pixels, 9, 15), (255, 255, 255))
+        # The ellipse is centered at (100, 20) with radii 20 and 20, and is
+        # filled within 18 and 18 (one unit inside, before the resize).
+        self.assertEqual(self.color(pixels, 100, 20), (0, 0, 255))
+        self.assertEqual(self.color(pixels, 117, 20), (0, 0, 255))
+        self.assertEqual(self.color(pixels, 119, 20), (0, 255, 0))
+        self.assertEqual(self.color(pixels, 100, 3), (0, 0, 255))
+        self.assertEqual(self.color(pixels, 122, 20), (255, 255, 255))
+        self.assertEqual(self.color(pixels, 131, 20), (255, 255, 255))
+        # The stroke is a one pixel line.
+        for x in (0, 37, 99):
+            self.assertEqual(self.color(pixels, x, 50), (255, 0, 0))
+        self.assertEqual(self.color(pixels, 50, 49), (255, 255, 255))
+        self.assertEqual(self.color(pixels, 150, 50), (255, 255, 255))
+
+    def test_scale_and_origin(self):
+        pixels = SoftwareRenderer(scene()).render(0, 0, 100, 60, origin=(0, 25), scale=2.0)
+        # World (20, 50) is on the stroke.
+        self.assertEqual(self.color(pixels, 40, 49), (255, 255, 255))
+        self.assertEqual(self.color(pixels, 40, 50), (255, 0, 0))
+
+    def test_tiles_match_whole_image(self):
+        renderer = SoftwareRenderer(scene())
+        whole = renderer.render(0, 0, 150, 70, scale=1.5)
+        for x, y, pixels in renderer.tiles(150, 70, scale=1.5, tile_size=32):
+            self.assertTrue((whole[y:y + pixels.shape[0], x:x + pixels.shape[1]] == pixels).all())
+
+    @unittest.skipIf(raster.Image is None, "PIL is not available")
+    def test_export(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "drawing.png")
+            export_png(scene(), path, width=64)
+            width, height = raster.Image.open(path).size
+            self.assertEqual(width, 64)
+            paths = export_png_tiles(scene(), os.path.join(directory, "tiles"), tile_size=64)
+            # The drawing is about 127 x 57 units.
+            self.assertEqual(sorted(map(os.path.basename, paths)), ["0_0.png", "0_1.png"])
+        finally:
+            shutil.rmtree(directory)
+
+    @unittest.skipIf(raster.Image is None, "PIL is not available")
+    def test_export_by_bands(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "drawing.png")
+            # Bands of 16 rows, the last one shorter, of tiles of which the
+            # last in each row is narrower.
+            export_png(scene(), path, width=150, height=70, scale=1.5, origin=(0, 0), tile_size=16)
+            image = raster.Image.open(path)
+            self.assertEqual((image.mode, image.size), ("RGB", (150, 70)))
+            pixels = SoftwareRenderer(scene()).render(0, 0, 150, 70, scale=1.5)
+            self.assertEqual(list(image.getdata()), [tuple(p) for p in pixels.reshape(-1, 3)])
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import gc
+import unittest
+
+from benchmark import RecordingGL, make_scene
+from drawables import Ellipse
+import renderer
+
+
+@unittest.skipIf(renderer.numpy is None, "NumPy is not installed")
+class BatchRendererTests(unittest.TestCase):
+    def setUp(self):
+        self.gl = RecordingGL()
+        self.replaced = []
+        namespace = vars(renderer)
+        for name, function in namespace.items():
+            if name.startswith("gl") and callable(function):
+                self.replaced.append((name, function))
+                namespace[name] = self.gl.function(name)
+        self.objects = make_scene(60)[0]
+        self.renderer = renderer.BatchRenderer()
+
+    def tearDown(self):
+        for name, function in self.replaced:
+            vars(renderer)[name] = function
+
+    def draw(self, objects):
+        self.gl.reset()
+        self.renderer.draw(objects)
+        return self.gl.uploaded // renderer.BatchRenderer.STRIDE
+
+    def vertex_count(self, objects):
+        return sum(len(self.renderer._vertices(obj)[1]) for obj in objects)
+
+    def assertBufferHolds(self, objects):
+        for obj in objects:
+            vertex_range = self.renderer._ranges[obj]
+            first = vertex_range.first
+            stored = self.renderer._data[first:first + vertex_range.count]
+            self.assertEqual(stored.tolist(), self.renderer._vertices(obj)[1].tolist())
+
+    def test_only_changes_are_uploaded(self):
+        self.draw(self.objects)
+        self.assertEqual(self.draw(self.objects), 0)
+        self.assertEqual(self.gl.vertices, self.vertex_count(self.objects))
+
+        moved = self.objects[7]
+        moved.move((0, 0), (5, 5))
+        self.assertEqual(self.draw(self.objects), self.vertex_count([moved]))
+        self.assertBufferHolds(self.objects)
+
+    def test_pan(self):
+        self.draw(self.objects[:30])
+        # Only the objects coming into view for the first time are uploaded.
+        self.assertEqual(self.draw(self.objects[10:40]), self.vertex_count(self.objects[30:40]))
+        self.assertEqual(self.gl.vertices, self.vertex_count(self.objects[10:40]))
+        self.assertEqual(self.draw(self.objects[:30]), 0)
+        # Successive objects are drawn together.
+        self.assertTrue(self.gl.calls["glMultiDrawArrays"] < 30)
+
+    def test_growth_and_repacking(self):
+        self.draw(self.objects)
+        ellipses = [obj for obj in self.objects if isinstance(obj, Ellipse)]
+        for obj in ellipses:
+            # More segments than its range has room for.
+            obj.resize_vector *= 8
+            obj.changed(transform_only=True)
+        self.draw(self.objects)
+        self.assertBufferHolds(self.objects)
+
+        del self.objects[::2]
+        gc.collect()
+        for i in xrange(12):
+            for obj in ellipses:
+                obj.resize_vector *= 1.5
+                obj.changed(transform_only=True)
+            self.draw(self.objects)
+        self.assertBufferHolds(self.objects)
+        self.assertEqual(self.gl.vertices, self.vertex_count(self.objects))
+
+
+if __name__ == "__main__":
+    unittest.main()
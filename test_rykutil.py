@@ -0,0 +1,115 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import cPickle as pickle
+
+from document import write_document, iter_document
+from drawables import Rectangle, FreeForm
+import rykutil
+
+
+def make_objects():
+    rectangle = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+    rectangle.finish()
+    stroke = FreeForm((0, 0, 0, 1), (1, 0, 0, 1), (5, 5))
+    stroke.finish()
+    # Finishing simplifies the stroke, so give it its points afterwards.
+    stroke.coordinates = [value for i in xrange(50) for value in (i, (i % 2) * 0.01)]
+    return [rectangle, stroke]
+
+
+class RykUtilTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.document = os.path.join(self.directory, "drawing.ryk")
+        output = open(self.document, "wb")
+        write_document(make_objects(), output)
+        output.close()
+        self.legacy = os.path.join(self.directory, "legacy.pickle")
+        output = open(self.legacy, "wb")
+        pickle.dump(make_objects(), output, 2)
+        output.close()
+        self.output_dir = os.path.join(self.directory, "out")
+        os.mkdir(self.output_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def options(self, **options):
+        defaults = {"output_dir": self.output_dir, "compress": True, "quantum": 8,
+                    "tolerance": 1.0, "format": "svg", "width": None,
+                    "height": None, "scale": None}
+        defaults.update(options)
+        return defaults
+
+    def test_inspect(self):
+        for path, format in ((self.document, "ryk"), (self.legacy, "pickle")):
+            report = rykutil.run_task(("inspect", path, None))
+            self.assertTrue(report["ok"])
+            self.assertEqual(report["format"], format)
+            self.assertEqual(report["objects"], 2)
+            self.assertEqual(report["finished"], 2)
+            self.assertEqual(report["types"], {"Rectangle": 1, "FreeForm": 1})
+            self.assertEqual(report["points"], 50)
+            self.assertEqual(report["extent"][:2], [0, 0])
+
+    def test_convert_legacy(self):
+        report = rykutil.run_task(("convert", self.legacy, self.options()))
+        self.assertTrue(report["ok"], report)
+        self.assertEqual(report["objects"], 2)
+        converted = open(report["output"], "rb")
+        objects = list(iter_document(converted))
+        converted.close()
+        self.assertEqual([obj.__class__ for obj in objects], [Rectangle, FreeForm])
+
+    def test_simplify(self):
+        report = rykutil.run_task(("simplify", self.document, self.options()))
+        self.assertTrue(report["ok"], report)
+        self.assertEqual(report["points_before"], 50)
+        self.assertEqual(report["points_after"], 2)
+
+    def test_refuses_to_overwrite_input(self):
+        report = rykutil.run_task(("convert", self.document, self.options(output_dir=self.directory)))
+        self.assertFalse(report["ok"])
+        self.assertTrue("overwrite" in report["error"])
+
+    def test_failures_are_reported(self):
+        broken = os.path.join(self.directory, "broken.ryk")
+        output = open(broken, "wb")
+        output.write("RYK\0garbage")
+        output.close()
+        report = rykutil.run_task(("convert", broken, self.options()))
+        self.assertFalse(report["ok"])
+        self.assertTrue(report["error"])
+        self.assertFalse(os.path.exists(os.path.join(self.output_dir, "broken.ryk")))
+
+    def test_main_in_parallel(self):
+        report_path = os.path.join(self.directory, "report.json")
+        missing = os.path.join(self.directory, "missing.ryk")
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            status = rykutil.main(["export", "--format", "svg", "-j", "2",
+                                   "-o", self.output_dir, "--report", report_path,
+                                   self.document, self.legacy, missing])
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        self.assertEqual(status, 1)
+        reports = json.load(open(report_path))
+        self.assertEqual([report["ok"] for report in reports], [True, True, False])
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "drawing.svg")))
+
+    def test_does_not_import_glut(self):
+        code = "import sys, rykutil; print 'OpenGL.GLUT' in sys.modules"
+        output = subprocess.check_output([sys.executable, "-c", code],
+                                         cwd=os.path.dirname(os.path.abspath(rykutil.__file__)))
+        self.assertEqual(output.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
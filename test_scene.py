@@ -0,0 +1,113 @@
+import random
+import unittest
+from StringIO import StringIO
+
+from document import iter_document, write_document
+from drawables import Rectangle, Ellipse
+from geometry import Point
+from scene import SceneStore
+
+
+def make_shapes(count, colors=4, seed=0):
+    rng = random.Random(seed)
+    palette = [(rng.random(), rng.random(), rng.random(), 1.0) for i in xrange(colors)]
+    shapes = []
+    for i in xrange(count):
+        cls = Rectangle if i % 2 else Ellipse
+        x, y = rng.uniform(0, 500), rng.uniform(0, 500)
+        obj = cls(rng.choice(palette), rng.choice(palette), (x, y),
+                  (x + rng.uniform(-50, 50), y + rng.uniform(-50, 50)))
+        obj.finish()
+        if i % 3 == 0:
+            obj.resize((x, y), (x + rng.uniform(-20, 20), y + rng.uniform(-20, 20)))
+        shapes.append(obj)
+    return shapes
+
+
+class SceneStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.shapes = make_shapes(300)
+        self.store = SceneStore(capacity=16)
+        self.store.extend(self.shapes)
+
+    def test_proxies_behave_like_the_shapes(self):
+        self.assertEqual(len(self.store), len(self.shapes))
+        for proxy, shape in zip(self.store, self.shapes):
+            self.assertEqual(type(proxy).__bases__[1], type(shape))
+            self.assertEqual(proxy.fill_color, shape.fill_color)
+            self.assertEqual(proxy.bounding_box, shape.bounding_box)
+            self.assertTrue(proxy.finished)
+            self.assertEqual(proxy.detach().translation_vector, shape.translation_vector)
+
+    def test_proxies_write_through(self):
+        proxy = self.store[5]
+        before = proxy.revision
+        proxy.move((0, 0), (10, -3))
+        self.assertEqual(self.store[5].translation_vector,
+                         self.shapes[5].translation_vector + Point(10, -3))
+        self.assertEqual(self.store[5].revision, before + 1)
+        self.assertEqual(tuple(self.store.bounding_boxes()[5]), self.store[5].bounding_box)
+        proxy.selected = True
+        self.assertTrue(self.store[5].selected)
+        self.assertEqual(self.store[5], proxy)
+        self.assertEqual(len(set([proxy, self.store[5]])), 1)
+
+    def test_query_rect(self):
+        rect = (100, 120, 260, 300)
+        expected = [i for i, shape in enumerate(self.shapes)
+                    if shape.bounding_box[0] <= rect[2] and shape.bounding_box[2] >= rect[0] and
+                    shape.bounding_box[1] <= rect[3] and shape.bounding_box[3] >= rect[1]]
+        self.assertEqual(list(self.store.query_rect(rect)), expected)
+
+    def test_hit_test(self):
+        rng = random.Random(1)
+        for i in xrange(300):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 500)
+            expected = None
+            for row, shape in enumerate(self.shapes):
+                if (x, y) in shape:
+                    expected = row
+            self.assertEqual(self.store.hit_test(x, y), expected)
+
+    def test_remove_and_restore(self):
+        row = 10
+        self.store.remove(row)
+        self.assertEqual(len(self.store), len(self.shapes) - 1)
+        self.assertFalse(row in self.store.query_rect((-1e9, -1e9, 1e9, 1e9)))
+        self.assertRaises(IndexError, self.store.__getitem__, row)
+        self.store.restore(row)
+        self.assertEqual(list(self.store.order()), range(len(self.shapes)))
+        self.store.raise_to_top(0)
+        self.assertEqual(self.store.order()[-1], 0)
+
+    def assertWritesLikeDocument(self, store, shapes):
+        out = StringIO()
+        store.write(out)
+        out.seek(0)
+        loaded = list(iter_document(out))
+        self.assertEqual(len(loaded), len(shapes))
+        for new, old in zip(loaded, shapes):
+            self.assertEqual(type(new), type(old))
+            self.assertEqual((new.fill_color, new.line_color), (old.fill_color, old.line_color))
+            self.assertEqual((new.corner1, new.corner2), (old.corner1, old.corner2))
+            self.assertEqual((new.translation_vector, new.resize_vector),
+                             (old.translation_vector, old.resize_vector))
+            self.assertEqual(new.finished, old.finished)
+
+    def test_write(self):
+        self.assertWritesLikeDocument(self.store, self.shapes)
+
+    def test_write_large_palette(self):
+        shapes = make_shapes(200, colors=400)
+        store = SceneStore()
+        store.extend(shapes)
+        self.assertTrue(len(store.palette) > 0x7f)
+        self.assertWritesLikeDocument(store, shapes)
+
+    def test_rejects_other_drawables(self):
+        from drawables import FreeForm
+        self.assertRaises(TypeError, self.store.add, FreeForm((0, 0, 0, 1), (0, 0, 0, 1), (0, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
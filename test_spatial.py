@@ -0,0 +1,37 @@
+import unittest
+from spatial import SpatialGrid
+
+
+class SpatialGridTests(unittest.TestCase):
+    def setUp(self):
+        self.grid = SpatialGrid(cell_size=10, max_cells=16)
+        self.grid.insert("small", (1, 1, 5, 5))
+        self.grid.insert("wide", (-20, 0, 25, 8))
+        self.grid.insert("huge", (-1000, -1000, 1000, 1000))
+
+    def test_query_point(self):
+        self.assertEqual(self.grid.query_point(3, 3), set(["small", "wide", "huge"]))
+        self.assertEqual(self.grid.query_point(-15, 4), set(["wide", "huge"]))
+        self.assertEqual(self.grid.query_point(500, 500), set(["huge"]))
+        self.assertEqual(self.grid.query_point(2000, 0), set())
+
+    def test_query_rect(self):
+        self.assertEqual(self.grid.query_rect((4, 4, 6, 6)), set(["small", "wide", "huge"]))
+        self.assertEqual(self.grid.query_rect((6, 6, 30, 30)), set(["wide", "huge"]))
+        self.assertEqual(self.grid.query_rect((-5000, -5000, 5000, 5000)),
+                         set(["small", "wide", "huge"]))
+
+    def test_update_and_remove(self):
+        self.grid.insert("small", (100, 100, 105, 105))
+        self.assertEqual(self.grid.query_point(3, 3), set(["wide", "huge"]))
+        self.assertEqual(self.grid.query_point(101, 101), set(["small", "huge"]))
+        self.grid.remove("huge")
+        self.grid.remove("unknown")
+        self.assertEqual(self.grid.query_point(101, 101), set(["small"]))
+        self.assertEqual(len(self.grid), 2)
+        self.grid.clear()
+        self.assertEqual(len(self.grid), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import types
+import unittest
+from stats import Stats
+
+
+class StatsTests(unittest.TestCase):
+    def test_frames(self):
+        stats = Stats(history=3)
+        for frame in xrange(5):
+            stats.add("frame", frame)
+            stats.add("events")
+            stats.add("events")
+            stats.end_frame()
+        self.assertEqual(stats.last("frame"), 4)
+        self.assertEqual(stats.last("unknown"), 0)
+        self.assertEqual(list(stats.frames), [{"frame": f, "events": 2} for f in (2, 3, 4)])
+        self.assertEqual(stats.percentile("frame", 50), 3)
+        self.assertEqual(stats.percentile("frame", 99), 4)
+        self.assertEqual(stats.totals, {"frame": 10, "events": 10})
+
+    def test_timer(self):
+        stats = Stats()
+        with stats.timer("work"):
+            pass
+        self.assertTrue(stats.current["work"] >= 0)
+
+    def test_count_gl_calls(self):
+        stats = Stats()
+        module = types.ModuleType("fake")
+        module.glVertex2f = lambda x, y: None
+        module.glDrawArrays = lambda mode, first, count: "drawn"
+        module.gluBuild2DMipmaps = lambda *args: None
+        module.glutSwapBuffers = swap = lambda: None
+        stats.count_gl_calls([module])
+        self.assertTrue(stats.counting_gl_calls)
+        module.glVertex2f(0, 0)
+        self.assertEqual(module.glDrawArrays(0, 0, 6), "drawn")
+        module.gluBuild2DMipmaps()
+        module.glutSwapBuffers()
+        self.assertEqual(stats.current, {"gl_calls": 3, "vertices": 7, "texture_uploads": 1})
+        stats.stop_counting_gl_calls()
+        self.assertFalse(stats.counting_gl_calls)
+        module.glVertex2f(0, 0)
+        self.assertEqual(stats.current["gl_calls"], 3)
+        self.assertTrue(module.glutSwapBuffers is swap)
+
+    def test_dump(self):
+        stats = Stats()
+        stats.add("frame", 0.5)
+        stats.end_frame()
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            stats.dump(path)
+            summary = json.load(open(path))
+        finally:
+            os.remove(path)
+        self.assertEqual(summary["frames"], 1)
+        self.assertEqual(summary["counters"]["frame"]["p50"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
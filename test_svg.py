@@ -0,0 +1,58 @@
+import unittest
+from StringIO import StringIO
+from xml.dom import minidom
+
+from drawables import Rectangle, Ellipse, FreeForm
+from geometry import Point
+from svg import css_color, svg_element, write_svg
+
+
+class SVGTests(unittest.TestCase):
+    def test_css_color(self):
+        self.assertEqual(css_color((1.0, 0.5, 0.0, 1.0)), "#ff8000")
+        self.assertEqual(css_color((0.0, 0.0, 1.0, 0.25)), "rgba(0,0,255,0.25)")
+
+    def test_free_form_path(self):
+        stroke = FreeForm((0, 0, 0, 1), (1, 0, 0, 1), (0, 0))
+        stroke.coordinates.extend((1.004, 0.333, 2.008, 0.666, 2.0, -1.0))
+        self.assertEqual(
+            svg_element(stroke),
+            '<path d="M0 0l1 0.33 1.01 0.34 -0.01 -1.67" fill="none" stroke="#ff0000" '
+            'stroke-width="1" vector-effect="non-scaling-stroke"/>')
+
+    def test_transform(self):
+        rectangle = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        rectangle.finish()
+        self.assertEqual(
+            svg_element(rectangle),
+            '<rect x="-9.5" y="-4.5" width="19" height="9" fill="#000000" stroke="#ffffff" '
+            'stroke-width="1" transform="translate(10 5)"/>')
+        rectangle.resize_vector = Point(2, -1)
+        self.assertTrue(svg_element(rectangle).endswith('transform="matrix(2 0 0 -1 10 5)"/>'))
+
+    def test_document(self):
+        ellipse = Ellipse((0, 0, 0, 1), (1, 1, 1, 1), (0, 0), (20, 10))
+        ellipse.finish()
+        stroke = FreeForm((0, 0, 0, 1), (1, 0, 0, 1), (5, 5))
+        stroke.construct(50, 5)
+        stroke.finish()
+        objects = [ellipse, stroke]
+
+        output = StringIO()
+        write_svg(objects, output, background=(1, 1, 1, 1))
+        document = minidom.parseString(output.getvalue()).documentElement
+        self.assertEqual(document.getAttribute("viewBox"), "-0.1 -0.05 53.1 10.1")
+        self.assertEqual([node.tagName for node in document.childNodes
+                          if node.nodeType == node.ELEMENT_NODE],
+                         ["rect", "ellipse", "path"])
+
+        # Iterators are read once, and give no view box.
+        output = StringIO()
+        write_svg(iter(objects), output)
+        document = minidom.parseString(output.getvalue()).documentElement
+        self.assertEqual(document.getAttribute("viewBox"), "")
+        self.assertEqual(len(document.getElementsByTagName("path")), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+import unittest
+
+from drawables import Rectangle, FreeForm
+from geometry import Point
+from history import History, Batch, Move
+from rysunek import Context, ObjectList
+from tools import SelectionTool, MoveTool, ResizeTool, DeleteTool, FreeFormTool
+
+
+def rectangle(x):
+    obj = Rectangle((0, 0, 0, 1), (1, 1, 1, 1), (x, x), (x + 10, x + 10))
+    obj.finish()
+    return obj
+
+
+class SelectionTests(unittest.TestCase):
+    def setUp(self):
+        self.objects = ObjectList([rectangle(x) for x in (0, 20, 40, 60)])
+        self.context = Context(objects=self.objects, history=History(10000))
+
+    def drag(self, tool, start, end):
+        tool.mouse_down(start[0], start[1], self.context)
+        tool.mouse_move(end[0], end[1], self.context)
+        tool.mouse_up(end[0], end[1], self.context)
+
+    def test_click(self):
+        self.drag(SelectionTool(), (25, 25), (26, 25))
+        self.assertEqual(self.objects.selection, set([self.objects[1]]))
+        self.assertTrue(self.objects.selected is self.objects[1])
+        self.drag(SelectionTool(), (100, 100), (100, 100))
+        self.assertEqual(self.objects.selection, set())
+
+    def test_marquee(self):
+        self.drag(SelectionTool(), (45, 45), (15, 15))
+        self.assertEqual(self.objects.selected_in_order(), self.objects[1:3])
+        self.assertTrue(self.objects.selected is None)
+        self.assertTrue(all(obj.selected for obj in self.objects[1:3]))
+        self.assertFalse(self.context.marquee)
+
+        self.drag(SelectionTool(), (-5, -5), (100, 100))
+        self.assertEqual(len(self.objects.selection), 4)
+        self.objects.select_none()
+        self.assertFalse(any(obj.selected for obj in self.objects))
+
+    def test_move_selection(self):
+        self.drag(SelectionTool(), (15, 15), (45, 45))
+        self.drag(MoveTool(), (25, 25), (30, 35))
+        self.assertEqual(self.objects[1].translation_vector, Point(30, 35))
+        self.assertEqual(self.objects[2].translation_vector, Point(50, 55))
+        self.assertEqual(self.objects[0].translation_vector, Point(5, 5))
+
+        self.assertTrue(self.context.history.undo(self.objects))
+        self.assertEqual(self.objects[1].translation_vector, Point(25, 25))
+        self.assertEqual(self.objects[2].translation_vector, Point(45, 45))
+        self.assertFalse(self.context.history.can_undo)
+
+    def test_drag_into_view(self):
+        view = (100, 100, 200, 200)
+        self.drag(SelectionTool(), (15, 15), (45, 45))
+        tool = MoveTool()
+        tool.mouse_down(25, 25, self.context)
+        tool.mouse_move(125, 125, self.context)
+        # Still dragging: the index must already know where they are.
+        self.assertEqual(self.objects.visible(view), self.objects[1:3])
+        tool.mouse_up(125, 125, self.context)
+        self.assertEqual(self.objects.visible(view), self.objects[1:3])
+
+    def test_resize_selection(self):
+        self.drag(SelectionTool(), (15, 15), (45, 45))
+        self.drag(ResizeTool(), (55, 55), (75, 75))
+        for obj in self.objects[1:3]:
+            self.assertAlmostEqual(obj.resize_vector.x, 2.0, 3)
+            self.assertAlmostEqual(obj.resize_vector.y, 2.0, 3)
+        self.assertEqual(self.objects[0].resize_vector, Point(1, 1))
+        # The selection grows as a whole, about the center of its box.
+        for obj, expected in zip(self.objects[1:3], (15, 55)):
+            self.assertAlmostEqual(obj.translation_vector.x, expected, 2)
+            self.assertAlmostEqual(obj.translation_vector.y, expected, 2)
+        x1, y1, x2, y2 = self.objects[1].bounding_box
+        self.assertTrue(x2 < self.objects[2].bounding_box[0])
+
+        self.context.history.undo(self.objects)
+        for obj, expected in zip(self.objects[1:3], (25, 45)):
+            self.assertEqual(obj.resize_vector, Point(1, 1))
+            self.assertAlmostEqual(obj.translation_vector.x, expected)
+            self.assertAlmostEqual(obj.translation_vector.y, expected)
+        self.assertFalse(self.context.history.can_undo)
+
+    def test_resize_one(self):
+        self.drag(SelectionTool(), (25, 25), (25, 25))
+        self.drag(ResizeTool(), (35, 35), (45, 45))
+        obj = self.objects[1]
+        self.assertEqual(obj.translation_vector, Point(25, 25))
+        self.assertAlmostEqual(obj.resize_vector.x, 2.0, 3)
+
+    def test_selected_on_insert(self):
+        objects = [rectangle(0), rectangle(20)]
+        objects[0].selected = True
+        self.objects = self.context.objects = ObjectList(objects)
+        self.assertEqual(self.objects.selection, set([objects[0]]))
+        added = rectangle(40)
+        added.selected = True
+        self.objects.append(added)
+        self.drag(SelectionTool(), (100, 100), (100, 100))
+        self.assertFalse(any(obj.selected for obj in self.objects))
+
+    def test_delete_deselects(self):
+        self.drag(SelectionTool(), (15, 15), (45, 45))
+        self.drag(DeleteTool(), (25, 25), (25, 25))
+        self.assertEqual(len(self.objects), 3)
+        self.assertEqual(self.objects.selection, set())
+        self.assertTrue(self.objects.selected is None)
+
+
+
+class ColorPicker(object):
+    current_fill_color = (0, 0, 0, 1)
+    current_line_color = (1, 1, 1, 1)
+
+
+class FreeFormToolTests(unittest.TestCase):
+    def draw(self, context):
+        tool = FreeFormTool()
+        tool.mouse_down(0, 0, context)
+        for x in xrange(1, 10):
+            tool.mouse_move(x * 0.5, 0, context)
+        tool.mouse_up(5, 0, context)
+        return context.objects[-1]
+
+    def test_options(self):
+        context = Context(objects=ObjectList(), color_picker=ColorPicker())
+        self.assertEqual(len(self.draw(context).coordinates), 4)
+        context.free_form_options = dict(simplify_tolerance=0, min_sample_distance=0)
+        stroke = self.draw(context)
+        self.assertEqual(len(stroke.coordinates), 20)
+        self.assertEqual(FreeForm.min_sample_distance, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from geometry import Point
+from viewport import Viewport
+
+
+class ViewportTests(unittest.TestCase):
+    def setUp(self):
+        self.view = Viewport(800, 500, min_zoom=0.25, max_zoom=4.0)
+
+    def test_identity(self):
+        self.assertEqual(self.view.to_world(10, 20), Point(10, 20))
+        self.assertEqual(self.view.visible_rect, (0, 0, 800, 500))
+
+    def test_pan(self):
+        self.view.pan(100, -50)
+        self.assertEqual(self.view.to_world(100, 0), Point(0, 50))
+        self.assertEqual(self.view.to_window(0, 50), Point(100, 0))
+        self.assertEqual(self.view.visible_rect, (-100, 50, 700, 550))
+
+    def test_zoom_at_keeps_anchor(self):
+        self.view.pan(30, 40)
+        anchor = self.view.to_world(200, 100)
+        self.view.zoom_at(2.0, 200, 100)
+        self.assertEqual(self.view.zoom, 2.0)
+        self.assertEqual(self.view.to_world(200, 100), anchor)
+        x1, y1, x2, y2 = self.view.visible_rect
+        self.assertEqual((x2 - x1, y2 - y1), (400, 250))
+
+    def test_zoom_is_clamped(self):
+        self.view.zoom_at(100.0, 0, 0)
+        self.assertEqual(self.view.zoom, 4.0)
+        self.view.zoom_at(0.001, 0, 0)
+        self.assertEqual(self.view.zoom, 0.25)
+        self.view.reset()
+        self.assertEqual(self.view.zoom, 1.0)
+        self.assertEqual(self.view.origin, Point(0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
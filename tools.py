@@ -1,123 +1,209 @@
-# -*- coding: utf-8 -*-
-
-from drawables import *
-
-
-class Tool(object):
-
-    """An abstraction of a tool which responds to mouse events."""
-
-    def __repr__(self):
-        return "<%s>" % self.__class__.__name__
-
-    def mouse_down(self, x, y, context):
-        pass
-
-    def mouse_up(self, x, y, context):
-        pass
-
-    def mouse_move(self, x, y, context):
-        pass
-
-
-class SelectionTool(Tool):
-    def mouse_up(self, x, y, context):
-        context.objects.select(x, y)
-
-
-class RectangleTool(Tool):
-    def mouse_down(self, x, y, context):
-        fill_color = context.color_picker.current_fill_color
-        line_color = context.color_picker.current_line_color
-        context.objects.append(Rectangle(fill_color, line_color, (x, y), (x, y)))
-
-    def mouse_up(self, x, y, context):
-        if context.objects:
-            # Mark last object as finished
-            context.objects[-1].finish()
-
-    def mouse_move(self, x, y, context):
-        if context.objects:
-            # update last object
-            context.objects[-1].construct(x, y)
-
-
-class EllipseTool(Tool):
-    def mouse_down(self, x, y, context):
-        fill_color = context.color_picker.current_fill_color
-        line_color = context.color_picker.current_line_color
-        context.objects.append(Ellipse(fill_color, line_color, (x, y), (x, y)))
-
-    def mouse_up(self, x, y, context):
-        if context.objects:
-            # Mark last object as finished
-            context.objects[-1].finish()
-
-    def mouse_move(self, x, y, context):
-        if context.objects:
-            # update last object
-            context.objects[-1].construct(x, y)
-
-
-class FreeFormTool(Tool):
-    def mouse_down(self, x, y, context):
-        fill_color = context.color_picker.current_fill_color
-        line_color = context.color_picker.current_line_color
-        context.objects.append(FreeForm(fill_color, line_color, (x, y)))
-
-    def mouse_up(self, x, y, context):
-        if context.objects:
-            # Mark last object as finished
-            context.objects[-1].finish()
-
-    def mouse_move(self, x, y, context):
-        if context.objects:
-            # update last object
-            context.objects[-1].construct(x, y)
-
-
-class ResizeTool(Tool):
-    def mouse_down(self, x, y, context):
-        # select object under cursor if there is no selection
-        if not context.objects.selected:
-            context.objects.select(x, y)
-        # set initial position (x, y)
-        context.resize_from = (x, y)
-
-    def mouse_up(self, x, y, context):
-        # clear initial position
-        del context.resize_from
-
-    def mouse_move(self, x, y, context):
-        # scale object by (initial x, initial y) -> (x, y)
-        if context.objects.selected and context.resize_from:
-            context.objects.selected.resize(context.resize_from, (x, y))
-            context.resize_from = (x, y)
-
-
-class MoveTool(Tool):
-    def mouse_down(self, x, y, context):
-        # select object under cursor if there is no selection
-        if not context.objects.selected:
-            context.objects.select(x, y)
-        # set initial position (x, y)
-        context.move_from = (x, y)
-
-    def mouse_up(self, x, y, context):
-        # clear initial position
-        del context.move_from
-
-    def mouse_move(self, x, y, context):
-        # translate object by (initial x, initial y) -> (x, y)
-        if context.objects.selected and context.move_from:
-            context.objects.selected.move(context.move_from, (x, y))
-            context.move_from = (x, y)
-
-
-class DeleteTool(Tool):
-    def mouse_up(self, x, y, context):
-        # delete object under current position
-        context.objects.select(x, y)
-        if context.objects.selected:
-            context.objects.remove(context.objects.selected)
-            context.objects.selected = None
+# -*- coding: utf-8 -*-
+
+from math import hypot
+
+from drawables import *
+import history
+
+
+class Tool(object):
+
+    """An abstraction of a tool which responds to mouse events."""
+
+    def __repr__(self):
+        return "<%s>" % self.__class__.__name__
+
+    def mouse_down(self, x, y, context):
+        pass
+
+    def mouse_up(self, x, y, context):
+        pass
+
+    def mouse_move(self, x, y, context):
+        pass
+
+    def record(self, context, command):
+        """Add a command to the undo history, if there is one."""
+        if context.history is not None:
+            context.history.push(command)
+
+    def record_all(self, context, commands):
+        """Add commands to the undo history as a single step."""
+        if len(commands) == 1:
+            self.record(context, commands[0])
+        elif commands:
+            self.record(context, history.Batch(commands))
+
+
+class SelectionTool(Tool):
+
+    """Select the object under a click, or the objects in a dragged box."""
+
+    # Drags shorter than this, in pixels, are clicks.
+    min_drag = 3
+
+    def mouse_down(self, x, y, context):
+        context.marquee_from = (x, y)
+        context.marquee = None
+
+    def mouse_up(self, x, y, context):
+        start = context.pop("marquee_from", None)
+        context.pop("marquee", None)
+        if start is None or hypot(x - start[0], y - start[1]) * (context.pixel_scale or 1.0) < self.min_drag:
+            context.objects.select(x, y)
+        else:
+            x1, y1 = start
+            context.objects.select_rect((min(x1, x), min(y1, y), max(x1, x), max(y1, y)))
+
+    def mouse_move(self, x, y, context):
+        # the box is drawn by the app
+        if context.marquee_from:
+            x1, y1 = context.marquee_from
+            context.marquee = (min(x1, x), min(y1, y), max(x1, x), max(y1, y))
+
+
+class RectangleTool(Tool):
+    def mouse_down(self, x, y, context):
+        fill_color = context.color_picker.current_fill_color
+        line_color = context.color_picker.current_line_color
+        context.objects.append(Rectangle(fill_color, line_color, (x, y), (x, y)))
+
+    def mouse_up(self, x, y, context):
+        if context.objects and not context.objects[-1].finished:
+            # Mark last object as finished
+            obj = context.objects[-1]
+            obj.finish()
+            context.objects.update(obj)
+            self.record(context, history.Create(obj, len(context.objects) - 1))
+
+    def mouse_move(self, x, y, context):
+        if context.objects:
+            # update last object
+            context.objects[-1].construct(x, y)
+
+
+class EllipseTool(Tool):
+    def mouse_down(self, x, y, context):
+        fill_color = context.color_picker.current_fill_color
+        line_color = context.color_picker.current_line_color
+        context.objects.append(Ellipse(fill_color, line_color, (x, y), (x, y)))
+
+    def mouse_up(self, x, y, context):
+        if context.objects and not context.objects[-1].finished:
+            # Mark last object as finished
+            obj = context.objects[-1]
+            obj.finish()
+            context.objects.update(obj)
+            self.record(context, history.Create(obj, len(context.objects) - 1))
+
+    def mouse_move(self, x, y, context):
+        if context.objects:
+            # update last object
+            context.objects[-1].construct(x, y)
+
+
+class FreeFormTool(Tool):
+    def mouse_down(self, x, y, context):
+        fill_color = context.color_picker.current_fill_color
+        line_color = context.color_picker.current_line_color
+        context.objects.append(FreeForm(fill_color, line_color, (x, y),
+                                        **(context.free_form_options or {})))
+
+    def mouse_up(self, x, y, context):
+        if context.objects and not context.objects[-1].finished:
+            # Mark last object as finished
+            obj = context.objects[-1]
+            obj.finish()
+            context.objects.update(obj)
+            self.record(context, history.Create(obj, len(context.objects) - 1))
+
+    def mouse_move(self, x, y, context):
+        if context.objects:
+            # update last object
+            context.objects[-1].construct(x, y)
+
+
+class ResizeTool(Tool):
+    def mouse_down(self, x, y, context):
+        # select object under cursor if there is no selection
+        if not context.objects.selection:
+            context.objects.select(x, y)
+        # set initial position (x, y)
+        context.resize_from = (x, y)
+        selection = context.objects.selected_in_order()
+        context.resize_before = [(obj, obj.resize_vector, obj.translation_vector)
+                                 for obj in selection]
+        # A single object is resized around its center, several as a whole
+        # around the center of the box enclosing them all.
+        if len(selection) > 1:
+            boxes = [obj.bounding_box for obj in selection]
+            context.resize_center = Point(
+                (min(box[0] for box in boxes) + max(box[2] for box in boxes)) / 2.0,
+                (min(box[1] for box in boxes) + max(box[3] for box in boxes)) / 2.0)
+        else:
+            context.resize_center = None
+
+    def mouse_up(self, x, y, context):
+        # clear initial position
+        del context.resize_from
+        context.pop("resize_center", None)
+        commands = []
+        for obj, before, position in context.pop("resize_before", None) or []:
+            context.objects.update(obj)
+            # Record the whole drag as a single step.
+            if before != obj.resize_vector:
+                commands.append(history.Resize(obj, before, obj.resize_vector))
+            if position != obj.translation_vector:
+                dx, dy = obj.translation_vector - position
+                commands.append(history.Move(obj, dx, dy))
+        self.record_all(context, commands)
+
+    def mouse_move(self, x, y, context):
+        # scale objects by (initial x, initial y) -> (x, y)
+        if context.resize_from:
+            for obj, before, position in context.resize_before or []:
+                obj.resize(context.resize_from, (x, y), context.resize_center)
+                context.objects.reindex(obj)
+            context.resize_from = (x, y)
+
+
+class MoveTool(Tool):
+    def mouse_down(self, x, y, context):
+        # select object under cursor if there is no selection
+        if not context.objects.selection:
+            context.objects.select(x, y)
+        # set initial position (x, y)
+        context.move_from = (x, y)
+        context.move_before = [(obj, obj.translation_vector)
+                               for obj in context.objects.selected_in_order()]
+
+    def mouse_up(self, x, y, context):
+        # clear initial position
+        del context.move_from
+        commands = []
+        for obj, before in context.pop("move_before", None) or []:
+            context.objects.update(obj)
+            # Record the whole drag as a single step.
+            if before != obj.translation_vector:
+                dx, dy = obj.translation_vector - before
+                commands.append(history.Move(obj, dx, dy))
+        self.record_all(context, commands)
+
+    def mouse_move(self, x, y, context):
+        # translate objects by (initial x, initial y) -> (x, y)
+        if context.move_from:
+            for obj, before in context.move_before or []:
+                obj.move(context.move_from, (x, y))
+                context.objects.reindex(obj)
+            context.move_from = (x, y)
+
+
+class DeleteTool(Tool):
+    def mouse_up(self, x, y, context):
+        # delete object under current position
+        context.objects.select(x, y)
+        obj = context.objects.selected
+        if obj:
+            index = context.objects.index(obj)
+            context.objects.pop(index)
+            self.record(context, history.Delete(obj, index))
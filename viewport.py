@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from geometry import Point
+
+
+class Viewport(object):
+
+    """A pannable and zoomable view of the drawing.
+
+    Window coordinates are pixels from the top-left corner of the window.
+    World coordinates are those of the drawables. The window point (x, y)
+    shows the world point `origin` + (x, y) / `zoom`.
+
+    """
+
+    def __init__(self, width, height, min_zoom=1.0 / 64, max_zoom=64.0):
+        """Create a view of a `width` x `height` window, unzoomed at the origin.
+
+        Optional arguments:
+        min_zoom -- smallest allowed number of pixels per world unit
+        max_zoom -- largest allowed number of pixels per world unit
+        """
+        self.width, self.height = width, height
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.reset()
+
+    def __repr__(self):
+        return "%s(origin=%s, zoom=%s)" % (self.__class__.__name__, self.origin, self.zoom)
+
+    def reset(self):
+        """Go back to the unzoomed view of the origin."""
+        self.origin = Point(0, 0)
+        self.zoom = 1.0
+
+    def resize(self, width, height):
+        """Follow a change of the window size. The top-left corner stays put."""
+        self.width, self.height = width, height
+
+    def to_world(self, x, y):
+        """Return the world point shown at window point (x, y)."""
+        return Point(self.origin.x + x / self.zoom, self.origin.y + y / self.zoom)
+
+    def to_window(self, x, y):
+        """Return the window point where world point (x, y) is shown."""
+        return Point((x - self.origin.x) * self.zoom, (y - self.origin.y) * self.zoom)
+
+    @property
+    def visible_rect(self):
+        """Return the (x1, y1, x2, y2) world-space rectangle shown in the window."""
+        x1, y1 = self.origin
+        x2, y2 = self.to_world(self.width, self.height)
+        return (x1, y1, x2, y2)
+
+    def pan(self, dx, dy):
+        """Drag the drawing by (dx, dy) pixels."""
+        self.origin -= Point(dx / self.zoom, dy / self.zoom)
+
+    def zoom_at(self, factor, x, y):
+        """Multiply the zoom by `factor`, keeping window point (x, y) in place.
+
+        The zoom is clamped between `min_zoom` and `max_zoom`.
+
+        """
+        anchor = self.to_world(x, y)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.origin = Point(anchor.x - x / self.zoom, anchor.y - y / self.zoom)